@@ -26,6 +26,15 @@ class User(AbstractUser):
         'Фамилия',
         max_length=150,
     )
+    recipes_count = models.PositiveIntegerField(
+        'Рецепты', default=0, editable=False
+    )
+    followers_count = models.PositiveIntegerField(
+        'Подписчики', default=0, editable=False
+    )
+    following_count = models.PositiveIntegerField(
+        'Подписки', default=0, editable=False
+    )
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']
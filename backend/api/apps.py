@@ -4,4 +4,7 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
-    verbose_name = 'API' 
\ No newline at end of file
+    verbose_name = 'API'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,172 @@
+"""Асинхронные представления горячих путей чтения для запуска под ASGI.
+
+ORM в Django 3.2 синхронный, поэтому вьюсеты выполняются в собственном
+пуле из ASYNC_VIEW_THREADS потоков, а цикл событий не ждёт ответа базы.
+Закешированные ответы анонимным пользователям, поиск по готовому индексу
+продуктов и переходы по проверенным коротким ссылкам отдаются прямо из
+цикла событий, без переключения в поток.
+"""
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+from django.http import Http404, HttpResponse
+from foodgram.metrics import count_queries
+from recipes import short_links
+from recipes.ingredient_index import ingredient_index
+from recipes.views import recipe_redirect
+from rest_framework.renderers import JSONRenderer
+
+from .cache import (
+    INGREDIENTS, RECIPES, get_generation_modified, make_cache_key
+)
+from .conditional import make_conditional_response
+from .views import IngredientViewSet, RecipeViewSet
+
+SAFE_METHODS = ('GET', 'HEAD')
+
+# Пул по умолчанию у цикла событий рассчитан на вычисления (cpu + 4
+# потока), а представления большую часть времени ждут базу.
+_executor = ThreadPoolExecutor(
+    max_workers=settings.ASYNC_VIEW_THREADS, thread_name_prefix='async-view'
+)
+
+
+def _run_view(view, request, *args, **kwargs):
+    # Соединения с базой у каждого потока пула свои, поэтому они
+    # закрываются здесь, а не сигналами начала и конца запроса.
+    close_old_connections()
+    try:
+        with count_queries():
+            response = view(request, *args, **kwargs)
+            if hasattr(response, 'render'):
+                response.render()
+            return response
+    finally:
+        close_old_connections()
+
+
+def _run_query(func, *args):
+    close_old_connections()
+    try:
+        with count_queries():
+            return func(*args)
+    finally:
+        close_old_connections()
+
+
+async def _in_thread(func, *args, **kwargs):
+    # Контекст копируется, чтобы в потоке были видны счётчик запросов
+    # метрик и выбор реплики.
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(
+        _executor, partial(context.run, func, *args, **kwargs)
+    )
+
+
+def _accepts_json(request):
+    """Ответит ли вьюсет JSON-рендерером, а не браузерным API."""
+    return (
+        'format' not in request.GET
+        and 'text/html' not in request.META.get('HTTP_ACCEPT', '')
+    )
+
+
+def _is_anonymous(request):
+    # Аутентификация в API только по токену.
+    return 'HTTP_AUTHORIZATION' not in request.META
+
+
+def _json_response(data):
+    response = HttpResponse(
+        JSONRenderer().render(data), content_type='application/json'
+    )
+    response['Vary'] = 'Accept'
+    return response
+
+
+def async_view(viewset, actions, fast_path=None):
+    """Асинхронная обёртка над действиями вьюсета.
+
+    fast_path(request) может вернуть готовый ответ без обращения к базе;
+    если он вернул None, запрос обрабатывает вьюсет в пуле потоков.
+    """
+    run = partial(_in_thread, _run_view, viewset.as_view(actions))
+
+    async def view(request, *args, **kwargs):
+        if fast_path is not None and request.method in SAFE_METHODS:
+            response = fast_path(request)
+            if response is not None:
+                return response
+        return await run(request, *args, **kwargs)
+
+    # Как и у вьюсетов: CSRF не проверяется, а класс и действия нужны
+    # роутеру реплик и ограничению нагрузки.
+    view.csrf_exempt = True
+    view.cls = viewset
+    view.actions = actions
+    return view
+
+
+def cached_for_anonymous(name):
+    def fast_path(request):
+        if not (_is_anonymous(request) and _accepts_json(request)):
+            return None
+        cached = cache.get(make_cache_key(name, request))
+        if cached is None:
+            return None
+        data, validators = cached
+        return make_conditional_response(
+            request, validators, partial(_json_response, data), 'json'
+        )
+    return fast_path
+
+
+def search_ingredients(request):
+    if not (ingredient_index.is_fresh() and _accepts_json(request)):
+        return None
+    # Версия та же, что у IngredientViewSet.get_validators.
+    validators = (
+        ingredient_index.version(), get_generation_modified(INGREDIENTS)
+    )
+    return make_conditional_response(
+        request, validators,
+        lambda: _json_response(
+            ingredient_index.search(request.GET.get('name', ''))
+        ),
+        'json'
+    )
+
+
+recipe_list = async_view(
+    RecipeViewSet, {'get': 'list', 'post': 'create'},
+    cached_for_anonymous(RECIPES)
+)
+recipe_detail = async_view(
+    RecipeViewSet,
+    {
+        'get': 'retrieve', 'put': 'update',
+        'patch': 'partial_update', 'delete': 'destroy',
+    },
+    cached_for_anonymous(RECIPES)
+)
+ingredient_list = async_view(
+    IngredientViewSet, {'get': 'list'}, search_ingredients
+)
+ingredient_detail = async_view(
+    IngredientViewSet, {'get': 'retrieve'}, cached_for_anonymous(INGREDIENTS)
+)
+
+
+async def short_link_redirect(request, code):
+    pk = short_links.decode(code)
+    if pk is None or not (
+        short_links.link_cache.get(pk)
+        or await _in_thread(_run_query, short_links.recipe_exists, pk)
+    ):
+        raise Http404(f'Короткая ссылка {code} не найдена.')
+    return recipe_redirect(pk)
@@ -0,0 +1,123 @@
+import contextlib
+import hashlib
+import time
+import uuid
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from foodgram.db_router import read_from_primary
+from rest_framework.response import Response
+
+from .conditional import make_conditional_response
+
+RECIPES = 'recipes'
+INGREDIENTS = 'ingredients'
+TAGS = 'tags'
+# Версия формата закешированных ответов входит в ключ, чтобы после
+# выкладки не читать записи, сохранённые прежним кодом.
+RESPONSE_FORMAT = 2
+
+
+def get_generation(name):
+    return cache.get_or_set(f'generation:{name}', uuid.uuid4().hex, None)
+
+
+def get_generation_modified(name):
+    """Время последней смены поколения name, для Last-Modified.
+
+    Если отметка потерялась, считается, что поколение сменилось сейчас:
+    лишний ответ 200 безопаснее ошибочного 304.
+    """
+    return cache.get_or_set(f'generation:{name}:modified', time.time, None)
+
+
+def bump_generation(name):
+    """Делает недействительными все закешированные ответы группы name.
+
+    Вместо инкремента записывается новое случайное значение: так смена
+    поколения не зависит от атомарности incr в выбранном бэкенде.
+    """
+    cache.set_many({
+        f'generation:{name}': uuid.uuid4().hex,
+        f'generation:{name}:modified': time.time(),
+    }, None)
+
+
+def bump_generation_on_commit(*names):
+    # До коммита параллельный запрос может закешировать старые данные
+    # уже под новым поколением, поэтому сброс откладывается.
+    transaction.on_commit(lambda: [bump_generation(name) for name in names])
+
+
+def primary_reads_after_bump(*names):
+    """Читает с основной базы, пока реплики догоняют смену поколений.
+
+    Реплика может отставать до REPLICA_STICKY_SECONDS секунд, и данные,
+    прочитанные с неё сразу после сброса, сохранились бы в кеше уже под
+    новым поколением.
+    """
+    if settings.DATABASE_REPLICAS and any(
+        time.time() - get_generation_modified(name)
+        < settings.REPLICA_STICKY_SECONDS
+        for name in names
+    ):
+        return read_from_primary()
+    return contextlib.nullcontext()
+
+
+def make_cache_key(name, request):
+    # request.GET есть и у HttpRequest, и у Request из DRF, поэтому ключ
+    # совпадает у асинхронных представлений и у вьюсетов.
+    params = sorted(
+        (key, value)
+        for key, values in request.GET.lists()
+        for value in values
+        if value != ''
+    )
+    digest = hashlib.md5(
+        f'{request.get_host()}{request.path}?{params}'.encode('utf-8')
+    ).hexdigest()
+    return (
+        f'response:{RESPONSE_FORMAT}:{name}:{get_generation(name)}:{digest}'
+    )
+
+
+class AnonymousCacheMixin:
+    """Кеширует ответы list и retrieve для анонимных пользователей.
+
+    Ключ строится из пути, нормализованных параметров запроса и текущего
+    поколения группы cache_generation, которое сбрасывается сигналами.
+    Вместе с данными хранятся validators из ConditionalGetMixin, так что
+    условный запрос к закешированному ответу не обращается к базе.
+    """
+    cache_generation = None
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return handler(request, *args, **kwargs)
+        key = make_cache_key(self.cache_generation, request)
+        cached = cache.get(key)
+        if cached is not None:
+            data, validators = cached
+            return make_conditional_response(
+                request, validators, partial(Response, data),
+                request.accepted_renderer.format
+            )
+        with primary_reads_after_bump(self.cache_generation):
+            response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(
+                key, (response.data, getattr(self, 'validators', None)),
+                settings.RESPONSE_CACHE_TIMEOUT
+            )
+        return response
@@ -0,0 +1,80 @@
+"""Условные GET-запросы по ETag и Last-Modified.
+
+Состояние ресурса описывается парой validators: версией — строкой,
+которая меняется вместе с содержимым, — и временем изменения в секундах
+или None. Пара вычисляется до выборки и сериализации, поэтому на
+совпавший If-None-Match ответ 304 отдаётся без этой работы. ETag зависит
+ещё и от формата рендерера: JSON и браузерный API — разные представления
+одного ресурса.
+"""
+import hashlib
+from functools import partial
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
+def validator_headers(validators, renderer_format):
+    version, last_modified = validators
+    digest = hashlib.md5(
+        f'{version}:{renderer_format}'.encode('utf-8')
+    ).hexdigest()
+    headers = {'ETag': quote_etag(digest)}
+    if last_modified is not None:
+        headers['Last-Modified'] = http_date(last_modified)
+    return headers
+
+
+def make_conditional_response(request, validators, get_response,
+                              renderer_format):
+    """Ответ 304 по validators, если условия запроса совпали.
+
+    Иначе возвращает get_response() с заголовками ETag и Last-Modified.
+    """
+    if validators is None:
+        return get_response()
+    headers = validator_headers(validators, renderer_format)
+    last_modified = validators[1]
+    response = get_conditional_response(
+        request,
+        etag=headers['ETag'],
+        last_modified=None if last_modified is None else int(last_modified)
+    )
+    if response is None:
+        response = get_response()
+        if response.status_code != 200:
+            return response
+    for header, value in headers.items():
+        response[header] = value
+    return response
+
+
+class ConditionalGetMixin:
+    """Отвечает 304 на условные list и retrieve до работы сериализаторов.
+
+    Вьюсет переопределяет get_validators(); если он вернул None, запрос
+    обрабатывается как обычно. Вычисленная пара остаётся в
+    self.validators, чтобы её мог сохранить кеш ответов.
+    """
+    validators = None
+
+    def get_validators(self):
+        return None
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().list, request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+    def conditional_response(self, handler, request, *args, **kwargs):
+        self.validators = self.get_validators()
+        return make_conditional_response(
+            request, self.validators,
+            partial(handler, request, *args, **kwargs),
+            request.accepted_renderer.format
+        )
@@ -0,0 +1,198 @@
+"""Выгрузки списка покупок, закешированные в хранилище.
+
+Файл выгрузки называется по хешу содержимого корзины: id рецептов и
+времени их изменения, поколения справочника продуктов и текущей даты,
+которая печатается в заголовке. Пока корзина не меняется, повторные
+скачивания отдаются из хранилища. Любое изменение корзины даёт новое имя,
+а прежние файлы пользователя удаляются после коммита; файл того же
+формата с прошлой датой удаляется при сохранении нового.
+
+Хранилище — каталог SHOPPING_LIST_EXPORT_ROOT вне MEDIA_ROOT: у файлов нет
+публичного адреса, их отдаёт только вьюха скачивания.
+
+PDF для больших корзин собирается в фоне: запрос получает 202 и
+повторяет тот же URL, пока файл не будет готов.
+"""
+import hashlib
+import logging
+import tempfile
+from datetime import date
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.db import close_old_connections, transaction
+from django.utils.functional import LazyObject
+from foodgram.background import BackgroundExecutor
+from recipes.models import ShoppingList
+
+from .cache import (
+    INGREDIENTS, RECIPES, get_generation, primary_reads_after_bump
+)
+from .shopping_list import EXPORT_FORMATS, get_shopping_list_totals
+
+logger = logging.getLogger(__name__)
+
+EXPORT_DIR = 'shopping_lists'
+# Форматы, которые для больших корзин собираются в фоне.
+BACKGROUND_FORMATS = {'pdf'}
+
+# Сколько раз собирать синхронную выгрузку, если корзина меняется
+# прямо во время сборки.
+BUILD_ATTEMPTS = 3
+
+PENDING = 'pending'
+FAILED = 'failed'
+
+
+class ExportStorage(LazyObject):
+    def _setup(self):
+        self._wrapped = FileSystemStorage(
+            location=settings.SHOPPING_LIST_EXPORT_ROOT, base_url=None
+        )
+
+
+export_storage = ExportStorage()
+
+executor = BackgroundExecutor(
+    'shopping-list-exports', 'SHOPPING_LIST_EXPORT_WORKERS'
+)
+
+
+def cart_state(user_id):
+    """Хеш содержимого корзины и число рецептов в ней, одним запросом."""
+    rows = list(
+        ShoppingList.objects
+        .filter(user_id=user_id)
+        .order_by('recipe_id')
+        .values_list('recipe_id', 'recipe__updated_at')
+    )
+    digest = hashlib.md5(repr((
+        rows, get_generation(INGREDIENTS), date.today().isoformat()
+    )).encode('utf-8')).hexdigest()
+    return digest, len(rows)
+
+
+def export_path(user_id, digest, export_format):
+    return f'{EXPORT_DIR}/{user_id}/{digest}.{export_format}'
+
+
+def _job_key(path):
+    return f'shopping_list_export:{path}'
+
+
+def build_export(user_id, digest, export_format):
+    """Собирает выгрузку и сохраняет её в хранилище.
+
+    Если корзина изменилась, пока шла сборка, файл не сохраняется:
+    под старым хешем не должно оказаться нового содержимого.
+    """
+    render, _ = EXPORT_FORMATS[export_format]
+    path = export_path(user_id, digest, export_format)
+    items = get_shopping_list_totals(user_id).iterator()
+    with tempfile.SpooledTemporaryFile(max_size=1024 * 1024) as f:
+        for chunk in render(items):
+            f.write(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+        if cart_state(user_id)[0] != digest:
+            return None
+        f.seek(0)
+        name = export_storage.save(path, File(f))
+    # Параллельная сборка того же файла сохраняется под другим именем.
+    if name != path:
+        export_storage.delete(name)
+    _discard_stale(user_id, path)
+    return path
+
+
+def _discard_stale(user_id, path):
+    """Удаляет прежние выгрузки пользователя в том же формате."""
+    directory, _, current = path.rpartition('/')
+    extension = current.rpartition('.')[2]
+    for name in _list_exports(user_id):
+        if name != current and name.endswith(f'.{extension}'):
+            export_storage.delete(f'{directory}/{name}')
+
+
+def _list_exports(user_id):
+    try:
+        return export_storage.listdir(f'{EXPORT_DIR}/{user_id}')[1]
+    except FileNotFoundError:
+        return []
+
+
+def _build_in_background(user_id, digest, export_format):
+    path = export_path(user_id, digest, export_format)
+    try:
+        build_export(user_id, digest, export_format)
+    except Exception:
+        logger.exception('Не удалось собрать выгрузку %s', path)
+        cache.set(
+            _job_key(path), FAILED, settings.SHOPPING_LIST_EXPORT_RETRY
+        )
+    else:
+        cache.delete(_job_key(path))
+    finally:
+        close_old_connections()
+
+
+def get_export(user_id, export_format):
+    """Открытая готовая выгрузка либо состояние фоновой сборки.
+
+    Возвращает пару (file, None), если файл готов, или (None, PENDING)
+    и (None, FAILED) для фоновой сборки. FAILED возвращается и тогда,
+    когда корзина менялась или файл удалялся во время каждой из
+    BUILD_ATTEMPTS попыток.
+    """
+    # Хеш включает поколение продуктов и время правки рецептов: по
+    # отставшей реплике под новым хешем сохранился бы старый файл.
+    with primary_reads_after_bump(INGREDIENTS, RECIPES):
+        return _get_export(user_id, export_format)
+
+
+def _get_export(user_id, export_format):
+    for _ in range(BUILD_ATTEMPTS):
+        digest, recipes_count = cart_state(user_id)
+        path = export_path(user_id, digest, export_format)
+        # Файл открывается сразу, без проверки exists(): параллельное
+        # изменение корзины может удалить его в любой момент.
+        try:
+            return export_storage.open(path), None
+        except FileNotFoundError:
+            pass
+        if (
+            export_format in BACKGROUND_FORMATS
+            and recipes_count > settings.SHOPPING_LIST_SYNC_RECIPES
+        ):
+            return None, _build_later(user_id, digest, export_format)
+        if build_export(user_id, digest, export_format) is None:
+            continue
+        try:
+            return export_storage.open(path), None
+        except FileNotFoundError:
+            pass
+    logger.warning(
+        'Корзина пользователя %s менялась во время сборки выгрузки', user_id
+    )
+    return None, FAILED
+
+
+def _build_later(user_id, digest, export_format):
+    key = _job_key(export_path(user_id, digest, export_format))
+    # add() атомарен: сборку ставит в очередь только один запрос.
+    if cache.add(key, PENDING, settings.SHOPPING_LIST_EXPORT_TIMEOUT):
+        executor.submit(
+            _build_in_background, user_id, digest, export_format
+        )
+        return PENDING
+    return cache.get(key, PENDING)
+
+
+def discard_exports(user_id):
+    """Удаляет все выгрузки пользователя."""
+    for name in _list_exports(user_id):
+        export_storage.delete(f'{EXPORT_DIR}/{user_id}/{name}')
+
+
+def discard_exports_on_commit(user_id):
+    transaction.on_commit(lambda: discard_exports(user_id))
@@ -0,0 +1,75 @@
+import base64
+import binascii
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from drf_extra_fields.fields import Base64ImageField
+from rest_framework.fields import ImageField
+
+
+class LimitedBase64ImageField(Base64ImageField):
+    """Base64ImageField с ограничением размера и потоковым декодированием.
+
+    Размер проверяется по длине строки ещё до декодирования, а сама
+    строка декодируется частями во временный файл, так что в памяти
+    не держится вторая полная копия изображения.
+    """
+    CHUNK_SIZE = 64 * 1024
+    TOO_LARGE_MESSAGE = (
+        'Размер изображения не должен превышать {max_size} байт.'
+    )
+
+    def __init__(self, *args, max_size=None, **kwargs):
+        self.max_size = max_size
+        super().__init__(*args, **kwargs)
+
+    def to_internal_value(self, base64_data):
+        if base64_data in self.EMPTY_VALUES:
+            return None
+        if not isinstance(base64_data, str):
+            raise ValidationError(self.INVALID_FILE_MESSAGE)
+
+        header, separator, payload = base64_data.partition(';base64,')
+        if not separator:
+            header, payload = '', base64_data
+        max_size = self.max_size or settings.RECIPE_IMAGE_MAX_SIZE
+        if len(payload) // 4 * 3 > max_size + 2:
+            raise ValidationError(
+                self.TOO_LARGE_MESSAGE.format(max_size=max_size)
+            )
+
+        content_type = None
+        if self.trust_provided_content_type:
+            content_type = header.replace('data:', '') or None
+        upload = TemporaryUploadedFile(
+            'image', content_type, 0, None
+        )
+        head = b''
+        try:
+            for start in range(0, len(payload), self.CHUNK_SIZE):
+                chunk = base64.b64decode(
+                    payload[start:start + self.CHUNK_SIZE]
+                )
+                if not head:
+                    head = chunk[:512]
+                upload.write(chunk)
+        except (TypeError, binascii.Error, ValueError):
+            upload.close()
+            raise ValidationError(self.INVALID_FILE_MESSAGE)
+        upload.size = upload.tell()
+        if upload.size > max_size:
+            upload.close()
+            raise ValidationError(
+                self.TOO_LARGE_MESSAGE.format(max_size=max_size)
+            )
+
+        file_name = self.get_file_name(head)
+        file_extension = self.get_file_extension(file_name, head)
+        if file_extension not in self.ALLOWED_TYPES:
+            upload.close()
+            raise ValidationError(self.INVALID_TYPE_MESSAGE)
+        upload.name = f'{file_name}.{file_extension}'
+        upload.flush()
+        upload.seek(0)
+        return ImageField.to_internal_value(self, upload)
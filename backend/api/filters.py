@@ -1,10 +1,18 @@
+from django.db.models import Exists, OuterRef
 from django_filters import rest_framework as filters
 from recipes.models import Recipe
+from recipes.tags import get_slug_map
+from rest_framework.filters import BaseFilterBackend
 
 
 class RecipeFilter(filters.FilterSet):
     """Фильтр для рецептов."""
-    tags = filters.AllValuesMultipleFilter(field_name='tags__slug')
+    # Варианты берутся из закешированного словаря слагов, а не из
+    # SELECT DISTINCT по всем значениям на каждый запрос.
+    tags = filters.MultipleChoiceFilter(
+        choices=lambda: [(slug, slug) for slug in get_slug_map()],
+        method='filter_tags'
+    )
     is_favorited = filters.BooleanFilter(method='filter_is_favorited')
     is_in_shopping_cart = filters.BooleanFilter(method='filter_is_in_shopping_cart')
     author = filters.NumberFilter(field_name='author__id')
@@ -13,12 +21,33 @@ class RecipeFilter(filters.FilterSet):
         model = Recipe
         fields = ('tags', 'author', 'is_favorited', 'is_in_shopping_cart')
 
+    def filter_tags(self, queryset, name, value):
+        """Рецепты хотя бы с одним из тегов, одним подзапросом EXISTS."""
+        if not value:
+            return queryset
+        slug_map = get_slug_map()
+        return queryset.filter(Exists(Recipe.tags.through.objects.filter(
+            recipe_id=OuterRef('pk'),
+            tag_id__in=[slug_map[slug] for slug in value]
+        )))
+
     def filter_is_favorited(self, queryset, name, value):
         if value and self.request.user.is_authenticated:
-            return queryset.filter(favorite_user_relations__user=self.request.user)
+            return queryset.filter(is_favorited=True)
         return queryset
 
     def filter_is_in_shopping_cart(self, queryset, name, value):
         if value and self.request.user.is_authenticated:
-            return queryset.filter(shoppinglist_user_relations__user=self.request.user)
+            return queryset.filter(is_in_shopping_cart=True)
         return queryset
+
+
+class RecipeSearchFilter(BaseFilterBackend):
+    """Полнотекстовый поиск по названию и описанию (?search=)."""
+    search_param = 'search'
+
+    def filter_queryset(self, request, queryset, view):
+        value = request.query_params.get(self.search_param, '').strip()
+        if not value:
+            return queryset
+        return queryset.search(value)
@@ -0,0 +1,282 @@
+import json
+import math
+import os
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import (
+    CaptureQueriesContext, setup_test_environment, teardown_test_environment
+)
+from django.urls import reverse
+from recipes.models import Ingredient, Recipe, Tag
+from rest_framework.authtoken.models import Token
+
+from api.urls import router
+
+User = get_user_model()
+
+# (название, метод, имя маршрута, параметры запроса, нужна авторизация).
+# Для POST-сценариев сразу выполняется парный DELETE, возвращающий
+# данные в исходное состояние; он замеряется отдельно. Тела POST и DELETE
+# отправляются в JSON, зависящие от данных тела — в prepare_fixtures.
+SCENARIOS = (
+    ('tag-list', 'get', 'tag-list', {}, False),
+    ('tag-detail', 'get', 'tag-detail', {}, False),
+    ('ingredient-list', 'get', 'ingredient-list', {'name': 'со'}, False),
+    ('ingredient-detail', 'get', 'ingredient-detail', {}, False),
+    ('recipe-list:anonymous', 'get', 'recipe-list', {'limit': 24}, False),
+    ('recipe-list', 'get', 'recipe-list', {'limit': 24}, True),
+    ('recipe-list:cursor', 'get', 'recipe-list',
+     {'limit': 24, 'cursor': ''}, True),
+    ('recipe-list:search', 'get', 'recipe-list',
+     {'limit': 24, 'search': 'рецепт 1'}, True),
+    ('recipe-feed', 'get', 'recipe-feed', {'limit': 24}, True),
+    ('recipe-detail', 'get', 'recipe-detail', {}, True),
+    ('recipe-get-link', 'get', 'recipe-get-link', {}, False),
+    ('recipe-download-shopping-cart', 'get',
+     'recipe-download-shopping-cart', {}, True),
+    ('recipe-favorite', 'post', 'recipe-favorite', {}, True),
+    ('recipe-shopping-cart', 'post', 'recipe-shopping-cart', {}, True),
+    ('recipe-favorite-bulk', 'post', 'recipe-favorite-bulk', {}, True),
+    ('recipe-shopping-cart-bulk', 'post', 'recipe-shopping-cart-bulk', {},
+     True),
+    ('user-list', 'get', 'user-list', {}, True),
+    ('user-detail', 'get', 'user-detail', {}, True),
+    ('user-me', 'get', 'user-me', {}, True),
+    ('user-subscriptions', 'get', 'user-subscriptions',
+     {'recipes_limit': 3}, True),
+    ('user-subscribe', 'post', 'user-subscribe', {}, True),
+)
+
+
+# Сколько рецептов добавляется и удаляется в сценариях массовых операций.
+BULK_SIZE = 20
+
+
+def percentile(values, percent):
+    ordered = sorted(values)
+    return ordered[max(math.ceil(percent / 100 * len(ordered)) - 1, 0)]
+
+
+class Command(BaseCommand):
+    help = (
+        'Замер числа запросов и задержек p50/p95 для эндпоинтов API '
+        'со сравнением с сохранённым базовым уровнем'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=30)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument(
+            '--baseline',
+            default=os.path.join(settings.BASE_DIR, 'bench_baseline.json'),
+            help='Путь к JSON-файлу с базовым уровнем'
+        )
+        parser.add_argument(
+            '--save', action='store_true',
+            help='Сохранить результаты как новый базовый уровень'
+        )
+        parser.add_argument(
+            '--tolerance', type=float, default=0.25,
+            help='Допустимый относительный рост p95'
+        )
+        parser.add_argument(
+            '--min-delta-ms', type=float, default=1.0,
+            help='Рост p95 меньше этого порога не считается регрессией'
+        )
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        try:
+            self.prepare_fixtures()
+            results = self.run_scenarios(
+                options['iterations'], options['warmup']
+            )
+        finally:
+            teardown_test_environment()
+        self.report(results)
+        failed = self.failed(results)
+
+        if options['save']:
+            # Ошибка отвечает быстрее настоящего ответа: с таким базовым
+            # уровнем регрессии эндпоинта не были бы видны.
+            if failed:
+                raise CommandError(
+                    'Базовый уровень не сохранён, эндпоинты вернули '
+                    'ошибку:\n' + '\n'.join(failed)
+                )
+            with open(options['baseline'], 'w', encoding='utf-8') as f:
+                json.dump(results, f, indent=2, ensure_ascii=False)
+            self.stdout.write(self.style.SUCCESS(
+                f'Базовый уровень сохранён в {options["baseline"]}.'
+            ))
+            return
+        if not os.path.exists(options['baseline']):
+            self.stdout.write(self.style.WARNING(
+                'Базовый уровень не найден, сравнение пропущено.'
+            ))
+            return
+        with open(options['baseline'], encoding='utf-8') as f:
+            baseline = json.load(f)
+        broken = self.failed(baseline)
+        if broken:
+            self.stdout.write(self.style.WARNING(
+                'В базовом уровне ответы с ошибкой, сохраните его '
+                'заново:\n' + '\n'.join(broken)
+            ))
+        regressions = self.compare(
+            baseline, results, options['tolerance'], options['min_delta_ms']
+        )
+        if regressions or failed:
+            raise CommandError(
+                'Регрессии:\n' + '\n'.join(regressions + failed)
+            )
+        self.stdout.write(self.style.SUCCESS('Регрессий не найдено.'))
+
+    def prepare_fixtures(self):
+        self.user = User.objects.order_by('-following_count', 'id').first()
+        if (
+            self.user is None
+            or not Recipe.objects.exists()
+            or not Tag.objects.exists()
+        ):
+            raise CommandError(
+                'Нет данных для замеров, сначала выполните seed_bench.'
+            )
+        self.token = Token.objects.get_or_create(user=self.user)[0].key
+        self.recipe = (
+            Recipe.objects
+            .exclude(favorite_recipe_relations__user=self.user)
+            .exclude(shoppinglist_recipe_relations__user=self.user)
+            .order_by('-favorites_count', 'id')
+            .first()
+        )
+        self.author = (
+            User.objects.exclude(pk=self.user.pk)
+            .exclude(authors__user=self.user)
+            .order_by('-recipes_count', 'id')
+            .first()
+        )
+        self.ingredient = Ingredient.objects.order_by('id').first()
+        self.tag = Tag.objects.order_by('id').first()
+        self.url_kwargs = {
+            'tag-detail': {'pk': self.tag.pk},
+            'ingredient-detail': {'pk': self.ingredient.pk},
+            'recipe-detail': {'pk': self.recipe.pk},
+            'recipe-favorite': {'pk': self.recipe.pk},
+            'recipe-shopping-cart': {'pk': self.recipe.pk},
+            # С настройкой djoser HIDE_USERS по умолчанию чужой профиль
+            # отдаёт 404, поэтому замеряется собственный.
+            'user-detail': {'id': self.user.pk},
+            'user-subscribe': {'id': self.author.pk},
+            'recipe-get-link': {'pk': self.recipe.pk},
+        }
+        bulk = {'recipes': list(
+            Recipe.objects
+            .exclude(favorite_recipe_relations__user=self.user)
+            .exclude(shoppinglist_recipe_relations__user=self.user)
+            .order_by('id')
+            .values_list('id', flat=True)[:BULK_SIZE]
+        )}
+        self.request_data = {
+            'recipe-favorite-bulk': bulk,
+            'recipe-shopping-cart-bulk': bulk,
+        }
+
+    def measure(self, client, method, url, params, headers):
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            if method == 'get':
+                response = client.get(url, params, **headers)
+            else:
+                response = getattr(client, method)(
+                    url, params, content_type='application/json', **headers
+                )
+            if response.streaming:
+                b''.join(response.streaming_content)
+            elapsed = time.perf_counter() - started
+        return response.status_code, len(queries), elapsed * 1000
+
+    def run_scenarios(self, iterations, warmup):
+        client = Client(raise_request_exception=False)
+        results = {}
+        for name, method, url_name, params, authenticated in SCENARIOS:
+            url = reverse(
+                f'api:{url_name}', kwargs=self.url_kwargs.get(url_name)
+            )
+            params = {**params, **self.request_data.get(url_name, {})}
+            headers = {}
+            if authenticated:
+                headers['HTTP_AUTHORIZATION'] = f'Token {self.token}'
+            methods = [method] if method == 'get' else [method, 'delete']
+            samples = {method: [] for method in methods}
+            for i in range(warmup + iterations):
+                for method in methods:
+                    sample = self.measure(client, method, url, params, headers)
+                    if i >= warmup:
+                        samples[method].append(sample)
+            for method, values in samples.items():
+                key = name if method == 'get' else f'{name}:{method}'
+                latencies = [value[2] for value in values]
+                results[key] = {
+                    'status': values[-1][0],
+                    'queries': max(value[1] for value in values),
+                    'p50_ms': round(percentile(latencies, 50), 3),
+                    'p95_ms': round(percentile(latencies, 95), 3),
+                }
+        return results
+
+    def report(self, results):
+        self.stdout.write(
+            f'{"endpoint":<40}{"status":>8}{"queries":>9}'
+            f'{"p50, мс":>10}{"p95, мс":>10}'
+        )
+        for name, result in results.items():
+            self.stdout.write(
+                f'{name:<40}{result["status"]:>8}{result["queries"]:>9}'
+                f'{result["p50_ms"]:>10.2f}{result["p95_ms"]:>10.2f}'
+            )
+        covered = {scenario[2] for scenario in SCENARIOS}
+        skipped = sorted(
+            {url.name for url in router.urls} - covered - {'api-root'}
+        )
+        if skipped:
+            self.stdout.write('Без сценария: ' + ', '.join(skipped))
+
+    def failed(self, results):
+        """Сценарии, последний ответ которых — ошибка клиента или сервера."""
+        return [
+            f'{name}: статус {result["status"]}'
+            for name, result in results.items()
+            if result['status'] >= 400
+        ]
+
+    def compare(self, baseline, results, tolerance, min_delta_ms):
+        regressions = []
+        for name, result in results.items():
+            base = baseline.get(name)
+            if base is None:
+                continue
+            if base['status'] < 400 <= result['status']:
+                regressions.append(
+                    f'{name}: статус {base["status"]} -> {result["status"]}'
+                )
+            if result['queries'] > base['queries']:
+                regressions.append(
+                    f'{name}: запросов {base["queries"]} -> '
+                    f'{result["queries"]}'
+                )
+            limit = max(
+                base['p95_ms'] * (1 + tolerance),
+                base['p95_ms'] + min_delta_ms
+            )
+            if result['p95_ms'] > limit:
+                regressions.append(
+                    f'{name}: p95 {base["p95_ms"]:.2f} -> '
+                    f'{result["p95_ms"]:.2f} мс'
+                )
+        return regressions
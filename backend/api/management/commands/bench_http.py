@@ -0,0 +1,125 @@
+import http.client
+import json
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote, urlsplit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+DEFAULT_PATHS = (
+    '/api/recipes/?limit=24',
+    '/api/recipes/?limit=24&search=рецепт',
+    '/api/ingredients/?name=со',
+)
+
+
+def percentile(values, percent):
+    ordered = sorted(values)
+    return ordered[max(math.ceil(percent / 100 * len(ordered)) - 1, 0)]
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный замер запущенного сервера при высокой конкурентности; '
+        'результаты разных запусков (WSGI, ASGI) выводятся рядом'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000')
+        parser.add_argument(
+            '--path', action='append', dest='paths',
+            help='Путь для замера, можно указать несколько раз'
+        )
+        parser.add_argument('--concurrency', type=int, default=64)
+        parser.add_argument(
+            '--requests', type=int, default=2000,
+            help='Число запросов на каждый путь'
+        )
+        parser.add_argument('--token', help='Токен для авторизованных замеров')
+        parser.add_argument(
+            '--label',
+            help='Сохранить результаты под этим именем для сравнения'
+        )
+        parser.add_argument(
+            '--results',
+            default=os.path.join(settings.BASE_DIR, 'bench_http.json'),
+            help='Путь к JSON-файлу с сохранёнными запусками'
+        )
+
+    def handle(self, *args, **options):
+        target = urlsplit(options['url'])
+        self.host, self.port = target.hostname, target.port or 80
+        self.headers = {'Accept': 'application/json'}
+        if options['token']:
+            self.headers['Authorization'] = f'Token {options["token"]}'
+        self.local = threading.local()
+
+        runs = {}
+        if os.path.exists(options['results']):
+            with open(options['results'], encoding='utf-8') as f:
+                runs = json.load(f)
+        results = {}
+        for path in options['paths'] or DEFAULT_PATHS:
+            results[path] = self.load(
+                path, options['concurrency'], options['requests']
+            )
+        label = options['label'] or 'текущий'
+        runs[label] = results
+        if options['label']:
+            with open(options['results'], 'w', encoding='utf-8') as f:
+                json.dump(runs, f, ensure_ascii=False, indent=2)
+        self.report(runs)
+
+    def request(self, path):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = self.local.connection = http.client.HTTPConnection(
+                self.host, self.port, timeout=30
+            )
+        started = time.perf_counter()
+        try:
+            connection.request('GET', path, headers=self.headers)
+            response = connection.getresponse()
+            response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            self.local.connection = None
+            status = 0
+        return status, (time.perf_counter() - started) * 1000
+
+    def load(self, path, concurrency, total):
+        path = quote(path, safe='/?&=%')
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            # Прогрев: соединения и кеши до начала замера.
+            list(executor.map(self.request, [path] * concurrency))
+            started = time.perf_counter()
+            samples = list(executor.map(self.request, [path] * total))
+            elapsed = time.perf_counter() - started
+        latencies = [ms for status, ms in samples if 200 <= status < 300]
+        if not latencies:
+            raise CommandError(f'{path}: нет ни одного успешного ответа.')
+        return {
+            'rps': round(len(latencies) / elapsed, 1),
+            'p50_ms': round(percentile(latencies, 50), 2),
+            'p95_ms': round(percentile(latencies, 95), 2),
+            'errors': len(samples) - len(latencies),
+        }
+
+    def report(self, runs):
+        for label, results in runs.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(label))
+            self.stdout.write(
+                f'{"path":<48}{"rps":>10}{"p50, мс":>10}'
+                f'{"p95, мс":>10}{"ошибок":>8}'
+            )
+            for path, result in results.items():
+                self.stdout.write(
+                    f'{path:<48}{result["rps"]:>10.1f}'
+                    f'{result["p50_ms"]:>10.2f}{result["p95_ms"]:>10.2f}'
+                    f'{result["errors"]:>8}'
+                )
@@ -1,150 +0,0 @@
-# Generated by Django 3.2.3 on 2025-05-15 18:14
-
-from django.conf import settings
-import django.core.validators
-from django.db import migrations, models
-import django.db.models.deletion
-
-
-class Migration(migrations.Migration):
-
-    initial = True
-
-    dependencies = [
-        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
-    ]
-
-    operations = [
-        migrations.CreateModel(
-            name='Dish',
-            fields=[
-                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
-                ('name', models.CharField(max_length=200, verbose_name='Название')),
-                ('image', models.ImageField(upload_to='dishes/', verbose_name='Картинка')),
-                ('text', models.TextField(verbose_name='Описание')),
-                ('cooking_time', models.PositiveSmallIntegerField(validators=[django.core.validators.MinValueValidator(1)], verbose_name='Время приготовления (в минутах)')),
-                ('pub_date', models.DateTimeField(auto_now_add=True, verbose_name='Дата публикации')),
-            ],
-            options={
-                'verbose_name': 'Рецепт',
-                'verbose_name_plural': 'Рецепты',
-                'ordering': ['-pub_date'],
-            },
-        ),
-        migrations.CreateModel(
-            name='DishIngredient',
-            fields=[
-                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
-                ('amount', models.PositiveSmallIntegerField(validators=[django.core.validators.MinValueValidator(1)], verbose_name='Количество')),
-            ],
-            options={
-                'verbose_name': 'Ингредиент рецепта',
-                'verbose_name_plural': 'Ингредиенты рецепта',
-            },
-        ),
-        migrations.CreateModel(
-            name='Favorite',
-            fields=[
-                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
-            ],
-            options={
-                'verbose_name': 'Избранное',
-                'verbose_name_plural': 'Избранное',
-            },
-        ),
-        migrations.CreateModel(
-            name='Follow',
-            fields=[
-                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
-            ],
-            options={
-                'verbose_name': 'Подписка',
-                'verbose_name_plural': 'Подписки',
-            },
-        ),
-        migrations.CreateModel(
-            name='FoodItem',
-            fields=[
-                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
-                ('name', models.CharField(max_length=200, verbose_name='Название')),
-                ('measurement_unit', models.CharField(max_length=200, verbose_name='Единица измерения')),
-            ],
-            options={
-                'verbose_name': 'Ингредиент',
-                'verbose_name_plural': 'Ингредиенты',
-                'ordering': ['name'],
-            },
-        ),
-        migrations.CreateModel(
-            name='ShoppingList',
-            fields=[
-                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
-                ('dish', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_list', to='api.dish', verbose_name='Рецепт')),
-                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_list', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
-            ],
-            options={
-                'verbose_name': 'Список покупок',
-                'verbose_name_plural': 'Списки покупок',
-            },
-        ),
-        migrations.AddConstraint(
-            model_name='fooditem',
-            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='unique_ingredient'),
-        ),
-        migrations.AddField(
-            model_name='follow',
-            name='author',
-            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='following', to=settings.AUTH_USER_MODEL, verbose_name='Автор'),
-        ),
-        migrations.AddField(
-            model_name='follow',
-            name='user',
-            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='follower', to=settings.AUTH_USER_MODEL, verbose_name='Подписчик'),
-        ),
-        migrations.AddField(
-            model_name='favorite',
-            name='dish',
-            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='favorites', to='api.dish', verbose_name='Рецепт'),
-        ),
-        migrations.AddField(
-            model_name='favorite',
-            name='user',
-            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='favorites', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь'),
-        ),
-        migrations.AddField(
-            model_name='dishingredient',
-            name='dish',
-            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.dish', verbose_name='Рецепт'),
-        ),
-        migrations.AddField(
-            model_name='dishingredient',
-            name='ingredient',
-            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.fooditem', verbose_name='Ингредиент'),
-        ),
-        migrations.AddField(
-            model_name='dish',
-            name='author',
-            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='api_authors', to=settings.AUTH_USER_MODEL, verbose_name='Автор'),
-        ),
-        migrations.AddField(
-            model_name='dish',
-            name='ingredients',
-            field=models.ManyToManyField(through='api.DishIngredient', to='api.FoodItem', verbose_name='Ингредиенты'),
-        ),
-        migrations.AddConstraint(
-            model_name='shoppinglist',
-            constraint=models.UniqueConstraint(fields=('user', 'dish'), name='unique_shopping_list'),
-        ),
-        migrations.AddConstraint(
-            model_name='follow',
-            constraint=models.UniqueConstraint(fields=('user', 'author'), name='unique_follow'),
-        ),
-        migrations.AddConstraint(
-            model_name='favorite',
-            constraint=models.UniqueConstraint(fields=('user', 'dish'), name='unique_favorite'),
-        ),
-        migrations.AddConstraint(
-            model_name='dishingredient',
-            constraint=models.UniqueConstraint(fields=('dish', 'ingredient'), name='unique_ingredient_in_dish'),
-        ),
-    ]
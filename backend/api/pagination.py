@@ -1,7 +1,139 @@
+import base64
+import binascii
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
 
 class RecipePagination(PageNumberPagination):
     """Пагинация для рецептов."""
     page_size = 6
     page_size_query_param = 'limit'
-    max_page_size = 100 
\ No newline at end of file
+    max_page_size = 100
+
+
+class RecipeFeedPagination(RecipePagination):
+    """Пагинация ленты рецептов с курсорным режимом.
+
+    Без параметра cursor работает как обычная постраничная пагинация.
+    С ?cursor= страница выбирается по ключу (pub_date, id) последнего
+    показанного рецепта, без COUNT(*) и OFFSET. Курсор задаёт порядок
+    сам, поэтому с другой сортировкой и с поиском, упорядоченным по
+    релевантности, он не сочетается: такой запрос получает 400.
+    """
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Неверный курсор.'
+    cursor_only = False
+    # Параметры, меняющие порядок выдачи, и их значения, совместимые с
+    # порядком курсора.
+    ordering_params = {'ordering': {'-pub_date'}, 'search': set()}
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_mode = (
+            self.cursor_only
+            or self.cursor_query_param in request.query_params
+        )
+        if not self.cursor_mode:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        self.check_ordering(request)
+        page_size = self.get_page_size(request)
+        queryset = queryset.order_by('-pub_date', '-id')
+        position = self.decode_cursor(
+            request.query_params.get(self.cursor_query_param, '')
+        )
+        if position is not None:
+            pub_date, pk = position
+            queryset = queryset.filter(pub_date__lte=pub_date).filter(
+                Q(pub_date__lt=pub_date) | Q(id__lt=pk)
+            )
+        page = list(queryset[:page_size + 1])
+        self.has_next = len(page) > page_size
+        self.page = page[:page_size]
+        return self.page
+
+    def paginate_ids(self, get_ids, queryset, request):
+        """Курсорная страница по готовому списку id.
+
+        get_ids(position, limit) возвращает id рецептов страницы в порядке
+        (pub_date, id) по убыванию; сами рецепты выбираются из queryset
+        одним запросом по этим id.
+        """
+        self.cursor_mode = True
+        self.request = request
+        page_size = self.get_page_size(request)
+        ids = get_ids(
+            self.decode_cursor(
+                request.query_params.get(self.cursor_query_param, '')
+            ),
+            page_size + 1
+        )
+        self.has_next = len(ids) > page_size
+        recipes = queryset.in_bulk(ids[:page_size])
+        self.page = [recipes[pk] for pk in ids[:page_size] if pk in recipes]
+        return self.page
+
+    def check_ordering(self, request):
+        conflicting = sorted(
+            param for param, allowed in self.ordering_params.items()
+            if request.query_params.get(param, '').strip() not in (
+                allowed | {''}
+            )
+        )
+        if conflicting:
+            raise ValidationError({
+                self.cursor_query_param: [
+                    'Курсор упорядочивает рецепты по дате публикации и '
+                    'не сочетается с параметрами: '
+                    + ', '.join(conflicting) + '.'
+                ]
+            })
+
+    def decode_cursor(self, cursor):
+        if not cursor:
+            return None
+        try:
+            pub_date, pk = base64.urlsafe_b64decode(
+                cursor.encode('ascii')
+            ).decode('ascii').split('|')
+            pub_date = parse_datetime(pub_date)
+            pk = int(pk)
+        except (binascii.Error, UnicodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if pub_date is None:
+            raise NotFound(self.invalid_cursor_message)
+        return pub_date, pk
+
+    def encode_cursor(self, recipe):
+        value = f'{recipe.pub_date.isoformat()}|{recipe.id}'
+        return base64.urlsafe_b64encode(value.encode('ascii')).decode('ascii')
+
+    def get_next_link(self):
+        if not self.cursor_mode:
+            return super().get_next_link()
+        if not self.has_next:
+            return None
+        url = remove_query_param(
+            self.request.build_absolute_uri(), self.page_query_param
+        )
+        return replace_query_param(
+            url, self.cursor_query_param, self.encode_cursor(self.page[-1])
+        )
+
+    def get_paginated_response(self, data):
+        if not self.cursor_mode:
+            return super().get_paginated_response(data)
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+
+class RecipeCursorPagination(RecipeFeedPagination):
+    """Только курсорная пагинация, для лент без постраничного режима."""
+    cursor_only = True
@@ -0,0 +1,34 @@
+from rest_framework.renderers import BaseRenderer
+
+
+class PlainTextRenderer(BaseRenderer):
+    """Рендерер текстовых выгрузок (?format=txt)."""
+    media_type = 'text/plain'
+    format = 'txt'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, dict):
+            data = '\n'.join(str(value) for value in data.values())
+        return str(data).encode(self.charset)
+
+
+class CSVRenderer(PlainTextRenderer):
+    """Рендерер CSV-выгрузок (?format=csv)."""
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+class PDFRenderer(BaseRenderer):
+    """Рендерер PDF-выгрузок (?format=pdf).
+
+    Документ собирает shopping_list.render_pdf, сюда попадают только
+    ответы с ошибками, которые отдаются текстом.
+    """
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return PlainTextRenderer().render(data)
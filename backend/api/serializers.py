@@ -1,77 +1,196 @@
 from rest_framework import serializers
-from recipes.models import Ingredient, Recipe, RecipeIngredient, Favorite, ShoppingList
+from recipes.models import (
+    Ingredient, Recipe, RecipeIngredient, Favorite, ShoppingList, Tag,
+    ingredients_prefetch
+)
 from accounts.models import Follow
 from django.contrib.auth import get_user_model
-from drf_extra_fields.fields import Base64ImageField
-from djoser.serializers import UserSerializer as DjoserUserSerializer 
+from django.db import transaction
+from django.db.models import prefetch_related_objects
+from recipes.cart import apply_recipe_changes, lock_composition
+from recipes.images import (
+    IMAGE_VARIANTS, discard_image_variants, schedule_image_variants
+)
+from djoser.serializers import UserSerializer as DjoserUserSerializer
+
+from .fields import LimitedBase64ImageField
 
 User = get_user_model()
 
+
 class IngredientSerializer(serializers.ModelSerializer):
     class Meta:
         model = Ingredient
         fields = ('id', 'name', 'measurement_unit')
 
+
+class TagSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Tag
+        fields = ('id', 'name', 'slug')
+
+
 class RecipeIngredientSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(
-        queryset=Ingredient.objects.all(), source='ingredient'
-    )
+    # Существование продуктов проверяется одним запросом
+    # в RecipeWriteSerializer.validate_ingredients.
+    id = serializers.IntegerField(min_value=1, source='ingredient')
     amount = serializers.IntegerField(min_value=1)
 
     class Meta:
         model = RecipeIngredient
         fields = ('id', 'amount')
 
+
+class RecipeIngredientReadSerializer(serializers.ModelSerializer):
+    id = serializers.IntegerField(source='ingredient.id')
+    name = serializers.CharField(source='ingredient.name')
+    measurement_unit = serializers.CharField(
+        source='ingredient.measurement_unit'
+    )
+
+    class Meta:
+        model = RecipeIngredient
+        fields = ('id', 'name', 'measurement_unit', 'amount')
+
+
 class RecipeReadSerializer(serializers.ModelSerializer):
     author = serializers.StringRelatedField(read_only=True)
-    ingredients = RecipeIngredientSerializer(many=True, read_only=True)
+    tags = TagSerializer(many=True, read_only=True)
+    ingredients = RecipeIngredientReadSerializer(
+        source='recipe_ingredients', many=True, read_only=True
+    )
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
+    image_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
         fields = (
-            'id', 'author', 'name', 'image', 'text',
-            'ingredients', 'cooking_time', 'is_favorited', 'is_in_shopping_cart'
+            'id', 'tags', 'author', 'name', 'image', 'image_variants', 'text',
+            'ingredients', 'cooking_time', 'is_favorited',
+            'is_in_shopping_cart'
         )
         read_only_fields = fields
 
-    def get_is_favorited(self, recipe):
+    def get_image_variants(self, recipe):
+        """Ссылки на уменьшенные копии; до их готовности — на оригинал."""
+        if not recipe.image:
+            return {}
+        request = self.context.get('request')
+        storage = recipe.image.storage
+        return {
+            name: request.build_absolute_uri(storage.url(
+                recipe.image_variants.get(name, recipe.image.name)
+            ))
+            for name in IMAGE_VARIANTS
+        }
+
+    def _get_user_flag(self, recipe, flag, model):
+        if hasattr(recipe, flag):
+            return getattr(recipe, flag)
         user = self.context.get('request').user
-        return not user.is_anonymous and Favorite.objects.filter(
+        return not user.is_anonymous and model.objects.filter(
             user=user, recipe=recipe
         ).exists()
 
+    def get_is_favorited(self, recipe):
+        return self._get_user_flag(recipe, 'is_favorited', Favorite)
+
     def get_is_in_shopping_cart(self, recipe):
-        user = self.context.get('request').user
-        return not user.is_anonymous and ShoppingList.objects.filter(
-            user=user, recipe=recipe
-        ).exists()
+        return self._get_user_flag(
+            recipe, 'is_in_shopping_cart', ShoppingList
+        )
+
 
 class RecipeWriteSerializer(serializers.ModelSerializer):
     ingredients = RecipeIngredientSerializer(many=True)
-    image = Base64ImageField()
+    # Как и продукты, теги проверяются одним запросом в validate_tags.
+    tags = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), required=False
+    )
+    image = LimitedBase64ImageField()
 
     class Meta:
         model = Recipe
         fields = (
-            'id', 'name', 'image', 'text',
+            'id', 'tags', 'name', 'image', 'text',
             'ingredients', 'cooking_time'
         )
 
+    def save(self, **kwargs):
+        try:
+            return super().save(**kwargs)
+        finally:
+            # Хранилище перемещает временный файл картинки, поэтому его
+            # нужно закрыть явно, не дожидаясь сборщика мусора.
+            image = self.validated_data.get('image')
+            if image is not None:
+                image.close()
+
+    def validate_ingredients(self, value):
+        if not value:
+            raise serializers.ValidationError(
+                'Нужно указать хотя бы один продукт.'
+            )
+        ids = [item['ingredient'] for item in value]
+        if len(set(ids)) != len(ids):
+            raise serializers.ValidationError(
+                'Продукты не должны повторяться.'
+            )
+        ingredients = Ingredient.objects.in_bulk(ids)
+        missing = [pk for pk in ids if pk not in ingredients]
+        if missing:
+            raise serializers.ValidationError(
+                f'Продукты не найдены: {", ".join(map(str, missing))}.'
+            )
+        return [
+            {'ingredient': ingredients[item['ingredient']],
+             'amount': item['amount']}
+            for item in value
+        ]
+
+    def validate_tags(self, value):
+        if len(set(value)) != len(value):
+            raise serializers.ValidationError('Теги не должны повторяться.')
+        tags = Tag.objects.in_bulk(value)
+        missing = [pk for pk in value if pk not in tags]
+        if missing:
+            raise serializers.ValidationError(
+                f'Теги не найдены: {", ".join(map(str, missing))}.'
+            )
+        return [tags[pk] for pk in value]
+
+    @transaction.atomic
     def create(self, validated_data):
         ingredients = validated_data.pop('ingredients')
         recipe = super().create(validated_data)
         self._save_ingredients(recipe, ingredients)
+        schedule_image_variants(recipe)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        ingredients = validated_data.pop('ingredients')
+        ingredients = validated_data.pop('ingredients', None)
+        image_changed = 'image' in validated_data
+        if image_changed:
+            # Варианты читаются под блокировкой: фоновая нарезка могла
+            # сохранить их уже после загрузки instance.
+            current = Recipe.objects.select_for_update().filter(
+                pk=instance.pk
+            ).values_list('image_variants', flat=True).first()
+            discard_image_variants(current or {})
+            validated_data['image_variants'] = {}
         instance = super().update(instance, validated_data)
-        instance.ingredients.clear()
-        self._save_ingredients(instance, ingredients)
+        if ingredients is not None:
+            self._update_ingredients(instance, ingredients)
+        if image_changed:
+            schedule_image_variants(instance)
         return instance
 
+    def to_representation(self, instance):
+        prefetch_related_objects([instance], ingredients_prefetch(), 'tags')
+        return RecipeReadSerializer(instance, context=self.context).data
+
     def _save_ingredients(self, recipe, ingredients):
         recipe_ingredients = [
             RecipeIngredient(
@@ -83,41 +202,89 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
         ]
         RecipeIngredient.objects.bulk_create(recipe_ingredients)
 
+    def _update_ingredients(self, recipe, ingredients):
+        """Изменяет только те строки состава, которые поменялись."""
+        # Не prefetch-кеш экземпляра: он мог устареть до начала транзакции.
+        current = lock_composition(recipe.pk)
+        # Изменения состава переносятся в итоги корзин с этим рецептом.
+        deltas = {pk: -item.amount for pk, item in current.items()}
+        to_create = []
+        to_update = []
+        for item in ingredients:
+            pk = item['ingredient'].id
+            deltas[pk] = deltas.get(pk, 0) + item['amount']
+            existing = current.pop(pk, None)
+            if existing is None:
+                to_create.append(item)
+            elif existing.amount != item['amount']:
+                existing.amount = item['amount']
+                to_update.append(existing)
+        if current:
+            RecipeIngredient.objects.filter(
+                pk__in=[item.pk for item in current.values()]
+            ).delete()
+        if to_update:
+            RecipeIngredient.objects.bulk_update(to_update, ['amount'])
+        if to_create:
+            self._save_ingredients(recipe, to_create)
+        apply_recipe_changes(recipe.pk, deltas)
+
+
+class RecipeIdsSerializer(serializers.Serializer):
+    """Список id рецептов для массового добавления и удаления."""
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=100
+    )
+
+    def validate_recipes(self, value):
+        return list(dict.fromkeys(value))
+
+
 class UserSerializer(DjoserUserSerializer):
     is_subscribed = serializers.SerializerMethodField(read_only=True)
 
     class Meta(DjoserUserSerializer.Meta):
-        fields = DjoserUserSerializer.Meta.fields + ('is_subscribed', 'avatar')
+        fields = DjoserUserSerializer.Meta.fields + ('is_subscribed',)
         read_only_fields = fields
 
     def get_is_subscribed(self, author):
+        if hasattr(author, 'is_subscribed'):
+            return author.is_subscribed
         user = self.context.get('request').user
         return not user.is_anonymous and Follow.objects.filter(
             user=user, author=author
         ).exists()
 
+
 class SubscriptionRecipeSerializer(serializers.ModelSerializer):
     class Meta:
         model = Recipe
         fields = ('id', 'name', 'image', 'cooking_time')
 
+
 class SubscriptionSerializer(UserSerializer):
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
+    recipes_count = serializers.ReadOnlyField()
 
     class Meta(UserSerializer.Meta):
         fields = UserSerializer.Meta.fields + ('recipes', 'recipes_count')
 
     def get_recipes(self, author):
-        request = self.context.get('request')
-        recipes_limit = request.query_params.get('recipes_limit')
-        recipes = author.recipes.all()
-        if recipes_limit:
-            recipes = recipes[:int(recipes_limit)]
-        return SubscriptionRecipeSerializer(recipes, many=True).data
+        recipes_by_author = self.context.get('recipes_by_author')
+        if recipes_by_author is not None:
+            recipes = recipes_by_author.get(author.id, [])
+        else:
+            request = self.context.get('request')
+            recipes_limit = request.query_params.get('recipes_limit')
+            recipes = author.recipes.all()
+            if recipes_limit:
+                recipes = recipes[:int(recipes_limit)]
+        return SubscriptionRecipeSerializer(
+            recipes, many=True, context=self.context
+        ).data
 
-    def get_recipes_count(self, author):
-        return author.recipes.count()
 
 class UserProfileSerializer(UserSerializer):
     recipes = serializers.SerializerMethodField()
@@ -127,5 +294,7 @@ class UserProfileSerializer(UserSerializer):
 
     def get_recipes(self, author):
         request = self.context.get('request')
-        recipes = author.recipes.all()
-        return RecipeReadSerializer(recipes, many=True, context={'request': request}).data
+        recipes = author.recipes.with_related().with_user_flags(request.user)
+        return RecipeReadSerializer(
+            recipes, many=True, context={'request': request}
+        ).data
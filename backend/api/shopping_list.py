@@ -0,0 +1,113 @@
+import csv
+import json
+from datetime import datetime
+from io import BytesIO
+
+from django.conf import settings
+from django.db.models import F
+from recipes.models import CartItem
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import mm
+from reportlab.lib.utils import simpleSplit
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+PDF_FONT = 'ShoppingListFont'
+
+
+def get_shopping_list_totals(user):
+    """Суммарное количество каждого продукта из списка покупок.
+
+    Итоги поддерживаются в CartItem при изменении корзины, поэтому
+    чтение не зависит от числа рецептов в ней.
+    """
+    return (
+        CartItem.objects
+        .filter(user=user)
+        .values(
+            name=F('ingredient__name'),
+            measurement_unit=F('ingredient__measurement_unit'),
+            amount=F('total_amount'),
+        )
+        .order_by('name', 'measurement_unit')
+    )
+
+
+class _Echo:
+    """Псевдо-файл для csv.writer, возвращающий записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+def _title():
+    return f'Список покупок на {datetime.now().strftime("%d.%m.%Y")}'
+
+
+def _item_line(number, item):
+    return (
+        f'{number}. {item["name"].title()} '
+        f'({item["measurement_unit"]}) — {item["amount"]}'
+    )
+
+
+def render_txt(items):
+    yield f'{_title()}\n\nИнгредиенты:\n'
+    for i, item in enumerate(items, 1):
+        yield _item_line(i, item) + '\n'
+
+
+def render_csv(items):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(('Ингредиент', 'Единица измерения', 'Количество'))
+    for item in items:
+        yield writer.writerow(
+            (item['name'], item['measurement_unit'], item['amount'])
+        )
+
+
+def render_json(items):
+    yield '['
+    for i, item in enumerate(items):
+        yield (',' if i else '') + json.dumps(item, ensure_ascii=False)
+    yield ']'
+
+
+def render_pdf(items):
+    """PDF формата A4; шрифт с кириллицей задаёт SHOPPING_LIST_PDF_FONT."""
+    if PDF_FONT not in pdfmetrics.getRegisteredFontNames():
+        pdfmetrics.registerFont(
+            TTFont(PDF_FONT, settings.SHOPPING_LIST_PDF_FONT)
+        )
+    width, height = A4
+    margin = 20 * mm
+    buffer = BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=A4)
+    pdf.setTitle(_title())
+    y = height - margin
+
+    def write(text, size):
+        nonlocal y
+        for line in simpleSplit(text, PDF_FONT, size, width - 2 * margin):
+            if y < margin:
+                pdf.showPage()
+                y = height - margin
+            pdf.setFont(PDF_FONT, size)
+            pdf.drawString(margin, y, line)
+            y -= size * 1.5
+
+    write(_title(), 16)
+    write('Ингредиенты:', 12)
+    for i, item in enumerate(items, 1):
+        write(_item_line(i, item), 11)
+    pdf.save()
+    yield buffer.getvalue()
+
+
+EXPORT_FORMATS = {
+    'txt': (render_txt, 'text/plain; charset=utf-8'),
+    'csv': (render_csv, 'text/csv; charset=utf-8'),
+    'json': (render_json, 'application/json; charset=utf-8'),
+    'pdf': (render_pdf, 'application/pdf'),
+}
@@ -0,0 +1,48 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from recipes.models import (
+    Ingredient, Recipe, RecipeIngredient, ShoppingList, Tag
+)
+
+from .cache import INGREDIENTS, RECIPES, TAGS, bump_generation_on_commit
+from .exports import discard_exports_on_commit
+
+User = get_user_model()
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+def invalidate_recipes_cache(**kwargs):
+    bump_generation_on_commit(RECIPES)
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_ingredients_cache(**kwargs):
+    bump_generation_on_commit(INGREDIENTS, RECIPES)
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def invalidate_tags_cache(**kwargs):
+    bump_generation_on_commit(TAGS, RECIPES)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_recipe_tags_cache(action, **kwargs):
+    if action.startswith('post_'):
+        bump_generation_on_commit(RECIPES)
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_recipes_cache(update_fields=None, created=False,
+                                    **kwargs):
+    # Имя автора входит в закешированные рецепты.
+    if created:
+        return
+    if update_fields is None or 'username' in update_fields:
+        bump_generation_on_commit(RECIPES)
+
+
+@receiver((post_save, post_delete), sender=ShoppingList)
+def discard_shopping_list_exports(instance, **kwargs):
+    discard_exports_on_commit(instance.user_id)
@@ -0,0 +1,784 @@
+import json
+import os
+from datetime import timedelta
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from asgiref.sync import async_to_sync
+from django.http import Http404
+from django.test import (
+    AsyncRequestFactory, TestCase, TransactionTestCase, override_settings
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from accounts.models import Follow
+from api import async_views, exports
+from api.serializers import RecipeWriteSerializer
+from recipes import cart, short_links, timeline
+from recipes.ingredient_index import ingredient_index
+from recipes.models import (
+    Favorite, Ingredient, Recipe, RecipeIngredient, ShoppingList, Tag,
+    TimelineEntry
+)
+
+User = get_user_model()
+
+
+def create_user(username):
+    return User.objects.create_user(
+        username=username, email=f'{username}@example.com',
+        password='password', first_name=username, last_name=username
+    )
+
+
+def create_recipe(author, name='Рецепт'):
+    return Recipe.objects.create(
+        author=author, name=name, text='Описание', cooking_time=10,
+        image='recipes/image.png'
+    )
+
+
+class APITestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user('user')
+        self.client = APIClient()
+        # Токен, а не force_authenticate: его поиск входит в число запросов.
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+    def count_queries(self, method, url, params=None):
+        kwargs = {} if method == 'get' else {'format': 'json'}
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url, params, **kwargs)
+        return response, len(queries)
+
+
+class RecipeReadQueriesTests(APITestCase):
+    """Число запросов чтения рецептов не зависит от размера страницы."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = create_user('author')
+        tags = [
+            Tag.objects.create(name=f'Тег {number}', slug=f'tag{number}')
+            for number in range(3)
+        ]
+        ingredients = [
+            Ingredient.objects.create(
+                name=f'Продукт {number}', measurement_unit='г'
+            )
+            for number in range(5)
+        ]
+        cls.recipes = []
+        for number in range(30):
+            recipe = create_recipe(author, f'Рецепт {number}')
+            recipe.tags.set(tags[:2])
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(
+                    recipe=recipe, ingredient=ingredient, amount=number + 1
+                )
+                for ingredient in ingredients[:2]
+            )
+            cls.recipes.append(recipe)
+
+    def setUp(self):
+        super().setUp()
+        for recipe in self.recipes[::3]:
+            Favorite.objects.create(user=self.user, recipe=recipe)
+            ShoppingList.objects.create(user=self.user, recipe=recipe)
+
+    def test_list_query_count_does_not_depend_on_limit(self):
+        url = reverse('api:recipe-list')
+        for limit in (1, 100):
+            with self.subTest(limit=limit), self.assertNumQueries(5):
+                response = self.client.get(url, {'limit': limit})
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 30)
+        favorited = [
+            recipe['is_favorited'] for recipe in response.data['results']
+        ]
+        self.assertEqual(favorited.count(True), 10)
+
+    def test_retrieve_query_count(self):
+        recipe = self.recipes[0]
+        url = reverse('api:recipe-detail', args=[recipe.pk])
+        with self.assertNumQueries(5):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['ingredients']), 2)
+        self.assertEqual(len(response.data['tags']), 2)
+        self.assertTrue(response.data['is_favorited'])
+        self.assertTrue(response.data['is_in_shopping_cart'])
+
+
+class SubscriptionsTests(APITestCase):
+    url = reverse('api:user-subscriptions')
+
+    def follow_authors(self, count, recipes_per_author=3):
+        start = Follow.objects.filter(user=self.user).count()
+        for number in range(start, start + count):
+            author = create_user(f'author{number}')
+            for _ in range(recipes_per_author):
+                create_recipe(author)
+            Follow.objects.create(user=self.user, author=author)
+
+    def test_query_count_does_not_grow_with_authors(self):
+        self.follow_authors(1)
+        response, few = self.count_queries(
+            'get', self.url, {'recipes_limit': 2}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.follow_authors(5)
+        response, many = self.count_queries(
+            'get', self.url, {'recipes_limit': 2, 'limit': 6}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 6)
+        self.assertEqual(few, many)
+
+    def test_recipes_limit(self):
+        self.follow_authors(2)
+        response = self.client.get(self.url, {'recipes_limit': 2})
+        for author in response.data['results']:
+            self.assertTrue(author['is_subscribed'])
+            self.assertEqual(len(author['recipes']), 2)
+            self.assertEqual(author['recipes_count'], 3)
+
+    def test_subscribe_and_unsubscribe(self):
+        author = create_user('author')
+        url = reverse('api:user-subscribe', args=[author.pk])
+        self.assertEqual(self.client.post(url).status_code, 201)
+        self.assertEqual(self.client.post(url).status_code, 400)
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertEqual(self.client.delete(url).status_code, 404)
+
+
+@override_settings(TIMELINE_FANOUT_LIMIT=1)
+class FeedTests(APITestCase):
+    """Лента сливает разосланные рецепты с рецептами авторов без рассылки."""
+    url = reverse('api:recipe-feed')
+
+    def setUp(self):
+        super().setUp()
+        fanout_author = create_user('fanout')
+        pulled_author = create_user('pulled')
+        Follow.objects.create(user=self.user, author=fanout_author)
+        Follow.objects.create(user=self.user, author=pulled_author)
+        User.objects.filter(pk=pulled_author.pk).update(followers_count=2)
+        now = timezone.now()
+        self.expected = []
+        for number in range(7):
+            author = fanout_author if number % 3 else pulled_author
+            recipe = create_recipe(author, f'Рецепт {number}')
+            pub_date = now - timedelta(minutes=number // 2)
+            Recipe.objects.filter(pk=recipe.pk).update(pub_date=pub_date)
+            if author == fanout_author:
+                TimelineEntry.objects.create(
+                    user=self.user, recipe=recipe, pub_date=pub_date
+                )
+            self.expected.append((pub_date, recipe.pk))
+        # Чужие рецепты и чужие ленты в выдачу не попадают.
+        create_recipe(create_user('stranger'))
+        self.expected = [pk for _, pk in sorted(self.expected, reverse=True)]
+
+    def test_cursor_pages_merge_timeline_and_pulled_authors(self):
+        ids, url, queries = [], f'{self.url}?limit=3', set()
+        while url:
+            response, count = self.count_queries('get', url)
+            self.assertEqual(response.status_code, 200)
+            ids += [recipe['id'] for recipe in response.data['results']]
+            queries.add(count)
+            url = response.data['next']
+        self.assertEqual(ids, self.expected)
+        self.assertEqual(len(queries), 1)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(self.url, {'cursor': 'не курсор'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_late_backfill_after_unfollow_is_skipped(self):
+        author = create_user('late')
+        recipe = create_recipe(author)
+        Follow.objects.create(user=self.user, author=author)
+        Follow.objects.filter(user=self.user, author=author).delete()
+        # Фоновое заполнение ленты выполняется уже после отписки.
+        timeline.add_author(self.user.pk, author.pk)
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.user, recipe=recipe)
+        )
+        response = self.client.get(self.url)
+        self.assertNotIn(
+            recipe.pk, [item['id'] for item in response.data['results']]
+        )
+
+    def test_backfill_adds_followed_author(self):
+        author = create_user('late')
+        recipe = create_recipe(author)
+        Follow.objects.create(user=self.user, author=author)
+        timeline.add_author(self.user.pk, author.pk)
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=self.user, recipe=recipe)
+        )
+
+
+class RelationTests(APITestCase):
+    """Ответ на добавление в избранное и корзину отражает новое состояние."""
+
+    def setUp(self):
+        super().setUp()
+        self.recipe = create_recipe(create_user('author'))
+
+    def test_add_responses_have_flag_set(self):
+        for url_name, flag in (
+            ('api:recipe-favorite', 'is_favorited'),
+            ('api:recipe-shopping-cart', 'is_in_shopping_cart'),
+        ):
+            url = reverse(url_name, args=[self.recipe.pk])
+            with self.subTest(flag=flag):
+                response = self.client.post(url)
+                self.assertEqual(response.status_code, 201)
+                self.assertIs(response.data[flag], True)
+                self.assertEqual(self.client.post(url).status_code, 400)
+                self.assertEqual(self.client.delete(url).status_code, 204)
+
+
+class BulkRelationTests(APITestCase):
+    """Массовые изменения поддерживают счётчики и итоги корзины."""
+
+    def setUp(self):
+        super().setUp()
+        author = create_user('author')
+        self.ingredient = Ingredient.objects.create(
+            name='Мука', measurement_unit='г'
+        )
+        self.recipes = []
+        for number in range(3):
+            recipe = create_recipe(author, f'Рецепт {number}')
+            RecipeIngredient.objects.create(
+                recipe=recipe, ingredient=self.ingredient, amount=10
+            )
+            self.recipes.append(recipe)
+        self.ids = [recipe.pk for recipe in self.recipes]
+
+    def counts(self, field):
+        return list(
+            Recipe.objects.filter(pk__in=self.ids).order_by('pk')
+            .values_list(field, flat=True)
+        )
+
+    def test_favorite_bulk(self):
+        url = reverse('api:recipe-favorite-bulk')
+        response = self.client.post(
+            url, {'recipes': self.ids + [10 ** 6]}, format='json'
+        )
+        self.assertEqual(
+            [item['status'] for item in response.data['results']],
+            ['added', 'added', 'added', 'not_found']
+        )
+        self.assertEqual(self.counts('favorites_count'), [1, 1, 1])
+        response = self.client.delete(
+            url, {'recipes': self.ids[:2]}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.counts('favorites_count'), [0, 0, 1])
+        self.assertEqual(
+            list(Favorite.objects.values_list('recipe_id', flat=True)),
+            self.ids[2:]
+        )
+
+    def test_query_count_does_not_depend_on_batch_size(self):
+        author = self.recipes[0].author
+        many = self.ids + [
+            create_recipe(author, f'Ещё {number}').pk for number in range(17)
+        ]
+        for url_name in ('favorite-bulk', 'shopping-cart-bulk'):
+            url = reverse(f'api:recipe-{url_name}')
+            for method in ('post', 'delete'):
+                counts = []
+                for ids in (many[:2], many[2:]):
+                    response, count = self.count_queries(
+                        method, url, {'recipes': ids}
+                    )
+                    self.assertEqual(response.status_code, 200)
+                    counts.append(count)
+                with self.subTest(url=url_name, method=method):
+                    self.assertEqual(counts[0], counts[1])
+
+    def test_repeated_add_is_counted_once(self):
+        url = reverse('api:recipe-shopping-cart-bulk')
+        self.client.post(url, {'recipes': self.ids[:2]}, format='json')
+        response = self.client.post(url, {'recipes': self.ids}, format='json')
+        self.assertEqual(
+            [item['status'] for item in response.data['results']],
+            ['exists', 'exists', 'added']
+        )
+        self.assertEqual(self.counts('shopping_carts_count'), [1, 1, 1])
+        self.assertEqual(self.client.get(url).data[0]['amount'], 30)
+        self.assertEqual(cart.find_drift(), [])
+
+    def test_shopping_cart_bulk_keeps_totals(self):
+        url = reverse('api:recipe-shopping-cart-bulk')
+        self.client.post(url, {'recipes': self.ids}, format='json')
+        self.assertEqual(self.counts('shopping_carts_count'), [1, 1, 1])
+        self.assertEqual(self.client.get(url).data[0]['amount'], 30)
+        response = self.client.delete(
+            url, {'recipes': self.ids[1:]}, format='json'
+        )
+        self.assertEqual(
+            [item['status'] for item in response.data['results']],
+            ['removed', 'removed']
+        )
+        self.assertEqual(self.counts('shopping_carts_count'), [1, 0, 0])
+        self.assertEqual(self.client.get(url).data[0]['amount'], 10)
+        response = self.client.delete(
+            url, {'recipes': self.ids[1:]}, format='json'
+        )
+        self.assertEqual(
+            [item['status'] for item in response.data['results']],
+            ['absent', 'absent']
+        )
+        self.assertEqual(self.client.get(url).data[0]['amount'], 10)
+
+
+class ShoppingListExportTests(APITestCase):
+    """Выгрузки хранятся вне MEDIA_ROOT и не накапливаются."""
+    url = reverse('api:recipe-download-shopping-cart')
+
+    def setUp(self):
+        super().setUp()
+        author = create_user('author')
+        ingredient = Ingredient.objects.create(
+            name='Мука', measurement_unit='г'
+        )
+        self.recipes = []
+        for number in range(2):
+            recipe = create_recipe(author, f'Рецепт {number}')
+            RecipeIngredient.objects.create(
+                recipe=recipe, ingredient=ingredient, amount=100
+            )
+            self.recipes.append(recipe)
+        ShoppingList.objects.create(user=self.user, recipe=self.recipes[0])
+
+    def tearDown(self):
+        exports.discard_exports(self.user.pk)
+
+    def stored(self):
+        return sorted(exports._list_exports(self.user.pk))
+
+    def download(self, export_format='txt'):
+        return self.client.get(self.url, {'format': export_format})
+
+    def test_export_is_served_from_private_storage(self):
+        response = self.download()
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Мука', b''.join(response.streaming_content).decode())
+        (name,) = self.stored()
+        path = exports.export_storage.path(
+            f'{exports.EXPORT_DIR}/{self.user.pk}/{name}'
+        )
+        self.assertFalse(path.startswith(os.path.abspath(
+            settings.MEDIA_ROOT
+        )))
+
+    def test_export_discarded_before_open_is_rebuilt(self):
+        self.assertEqual(self.download().status_code, 200)
+        storage = exports.export_storage._wrapped
+        real_open = storage.open
+
+        def discard_then_open(name, *args, **kwargs):
+            # Параллельный запрос успел удалить файл после его поиска.
+            if open_mock.call_count == 1:
+                exports.discard_exports(self.user.pk)
+            return real_open(name, *args, **kwargs)
+
+        with mock.patch.object(
+            storage, 'open', side_effect=discard_then_open
+        ) as open_mock:
+            response = self.download()
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Мука', b''.join(response.streaming_content).decode())
+        self.assertEqual(len(self.stored()), 1)
+
+    def test_new_export_replaces_stale_one(self):
+        self.download()
+        self.download('csv')
+        with mock.patch.object(exports, 'date') as today:
+            today.today.return_value = timezone.now().date() + timedelta(1)
+            self.download()
+        self.assertEqual(len(self.stored()), 2)
+        self.assertEqual(
+            sorted(name.rpartition('.')[2] for name in self.stored()),
+            ['csv', 'txt']
+        )
+
+    def test_cart_change_discards_exports(self):
+        self.download()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse('api:recipe-shopping-cart', args=[self.recipes[1].pk])
+            )
+        self.assertEqual(self.stored(), [])
+
+    def test_cart_changing_during_every_build_gives_up(self):
+        states = iter(range(100))
+        with mock.patch.object(
+            exports, 'cart_state',
+            side_effect=lambda user_id: (str(next(states)), 1)
+        ):
+            response = self.download()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(next(states), exports.BUILD_ATTEMPTS * 2)
+        self.assertEqual(self.stored(), [])
+
+    @override_settings(SHOPPING_LIST_SYNC_RECIPES=0)
+    def test_failed_background_build_is_retryable(self):
+        digest, _ = exports.cart_state(self.user.pk)
+        path = exports.export_path(self.user.pk, digest, 'pdf')
+        cache.set(exports._job_key(path), exports.FAILED)
+        response = self.download('pdf')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(
+            response['Retry-After'],
+            str(settings.SHOPPING_LIST_EXPORT_RETRY)
+        )
+
+
+class RecipeSearchTests(APITestCase):
+    """?search= на SQLite идёт через FTS5, который ведут триггеры."""
+    url = reverse('api:recipe-list')
+
+    def setUp(self):
+        super().setUp()
+        self.author = create_user('author')
+
+    def search(self, value):
+        response = self.client.get(self.url, {'search': value})
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.data['results']]
+
+    def test_uses_fts5_index(self):
+        self.assertEqual(connection.vendor, 'sqlite')
+        with CaptureQueriesContext(connection) as queries:
+            self.search('борщ')
+        self.assertTrue(any(
+            'recipes_recipe_fts MATCH' in query['sql']
+            for query in queries
+        ))
+
+    def test_words_match_as_prefixes(self):
+        borscht = create_recipe(self.author, 'Борщ украинский')
+        create_recipe(self.author, 'Солянка')
+        self.assertEqual(self.search('бор'), [borscht.pk])
+        self.assertEqual(self.search('укр бор'), [borscht.pk])
+        self.assertEqual(self.search('бор солянка'), [])
+        self.assertEqual(self.search('"'), [])
+
+    def test_name_match_ranks_above_text_match(self):
+        in_name = create_recipe(self.author, 'Щи')
+        in_text = create_recipe(self.author, 'Суп')
+        Recipe.objects.filter(pk=in_text.pk).update(text='Почти щи')
+        # Совпадение в названии выше, хотя рецепт опубликован раньше.
+        self.assertEqual(self.search('щи'), [in_name.pk, in_text.pk])
+
+    def test_triggers_follow_changes(self):
+        recipe = create_recipe(self.author, 'Окрошка')
+        self.assertEqual(self.search('окрошка'), [recipe.pk])
+        recipe.name = 'Гаспачо'
+        recipe.save()
+        self.assertEqual(self.search('окрошка'), [])
+        self.assertEqual(self.search('гаспачо'), [recipe.pk])
+        Recipe.objects.filter(pk=recipe.pk).update(text='Холодный суп')
+        self.assertEqual(self.search('холодный'), [recipe.pk])
+        recipe.delete()
+        # Запрос к самому индексу: поиск через API соединяет его с
+        # таблицей рецептов и не увидел бы оставшихся записей.
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT rowid FROM recipes_recipe_fts '
+                'WHERE recipes_recipe_fts MATCH %s', ['гаспачо OR холодный']
+            )
+            self.assertEqual(cursor.fetchall(), [])
+
+
+class RecipeCursorTests(APITestCase):
+    url = reverse('api:recipe-list')
+
+    def setUp(self):
+        super().setUp()
+        author = create_user('author')
+        self.ids = [
+            create_recipe(author, f'Рецепт {number}').pk
+            for number in range(5)
+        ][::-1]
+
+    def test_cursor_pages(self):
+        ids, url = [], f'{self.url}?limit=2&cursor=&ordering=-pub_date'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('count', response.data)
+            ids += [recipe['id'] for recipe in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(ids, self.ids)
+
+    def test_cursor_rejects_other_ordering(self):
+        for params in (
+            {'ordering': '-favorites_count'},
+            {'ordering': 'pub_date'},
+            {'search': 'рецепт'},
+        ):
+            with self.subTest(**params):
+                response = self.client.get(
+                    self.url, {'cursor': '', **params}
+                )
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('cursor', response.data)
+
+
+class RecipeTagsTests(APITestCase):
+    """Фильтр ?tags= и проверка тегов при записи рецепта."""
+    url = reverse('api:recipe-list')
+
+    def setUp(self):
+        super().setUp()
+        self.breakfast, self.lunch, self.dinner = (
+            Tag.objects.create(name=name, slug=slug)
+            for name, slug in (
+                ('Завтрак', 'breakfast'), ('Обед', 'lunch'),
+                ('Ужин', 'dinner'),
+            )
+        )
+        author = create_user('author')
+        self.morning = create_recipe(author, 'Каша')
+        self.morning.tags.set([self.breakfast])
+        self.all_day = create_recipe(author, 'Бутерброд')
+        self.all_day.tags.set([self.breakfast, self.lunch])
+        self.evening = create_recipe(author, 'Рагу')
+        self.evening.tags.set([self.dinner])
+        create_recipe(author, 'Без тегов')
+
+    def filter_by(self, *slugs):
+        response = self.client.get(self.url, {'tags': slugs})
+        self.assertEqual(response.status_code, 200)
+        return {recipe['id'] for recipe in response.data['results']}
+
+    def test_filter_by_tags(self):
+        self.assertEqual(
+            self.filter_by('breakfast'), {self.morning.pk, self.all_day.pk}
+        )
+        self.assertEqual(self.filter_by('dinner'), {self.evening.pk})
+        # Несколько тегов объединяются, рецепт с обоими не дублируется.
+        response = self.client.get(
+            self.url, {'tags': ['breakfast', 'lunch']}
+        )
+        ids = [recipe['id'] for recipe in response.data['results']]
+        self.assertCountEqual(ids, [self.morning.pk, self.all_day.pk])
+
+    def test_unknown_tag_is_rejected(self):
+        response = self.client.get(self.url, {'tags': ['brunch']})
+        self.assertEqual(response.status_code, 400)
+
+    def validate_tags(self, tags):
+        serializer = RecipeWriteSerializer(data={'tags': tags})
+        self.assertFalse(serializer.is_valid())
+        return serializer.errors['tags']
+
+    def test_duplicate_tags_are_rejected(self):
+        self.assertEqual(
+            self.validate_tags([self.lunch.pk, self.lunch.pk]),
+            ['Теги не должны повторяться.']
+        )
+
+    def test_missing_tags_are_rejected(self):
+        missing = self.dinner.pk + 100
+        self.assertEqual(
+            self.validate_tags([self.lunch.pk, missing]),
+            [f'Теги не найдены: {missing}.']
+        )
+
+
+class RecipeCompositionUpdateTests(APITestCase):
+    """Правка состава считает разницу от состава в базе, а не от кеша."""
+
+    def setUp(self):
+        super().setUp()
+        self.flour, self.sugar, self.salt = (
+            Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in ('Мука', 'Сахар', 'Соль')
+        )
+        self.recipe = create_recipe(create_user('author'))
+        RecipeIngredient.objects.create(
+            recipe=self.recipe, ingredient=self.flour, amount=10
+        )
+        ShoppingList.objects.create(user=self.user, recipe=self.recipe)
+
+    def update(self, recipe, *amounts):
+        RecipeWriteSerializer().update(recipe, {'ingredients': [
+            {'ingredient': ingredient, 'amount': amount}
+            for ingredient, amount in amounts
+        ]})
+
+    def test_update_with_stale_prefetch(self):
+        stale = Recipe.objects.prefetch_related('recipe_ingredients').get(
+            pk=self.recipe.pk
+        )
+        self.update(
+            Recipe.objects.get(pk=self.recipe.pk), (self.sugar, 5)
+        )
+        self.update(stale, (self.flour, 20), (self.salt, 1))
+        self.assertEqual(
+            cart.recipe_amounts([self.recipe.pk]),
+            {self.flour.pk: 20, self.salt.pk: 1}
+        )
+        self.assertEqual(cart.find_drift(), [])
+
+
+class AsyncReadViewsTests(TransactionTestCase):
+    """Асинхронные представления для запуска под ASGI.
+
+    Вьюсеты выполняются в пуле потоков со своими соединениями, поэтому
+    данные должны быть закоммичены: TransactionTestCase, а не TestCase.
+    """
+
+    def setUp(self):
+        cache.clear()
+        short_links.link_cache.clear()
+        ingredient_index.invalidate()
+        self.factory = AsyncRequestFactory()
+        self.recipe = create_recipe(create_user('author'))
+        self.ingredient = Ingredient.objects.create(
+            name='Мука', measurement_unit='г'
+        )
+
+    def tearDown(self):
+        # Иначе переходы запишет atexit, когда тестовой базы уже нет.
+        short_links.click_buffer.flush()
+
+    def call(self, view, path, *args, headers=None, **kwargs):
+        # Заголовки ASGI-запроса передаются без префикса HTTP_.
+        request = self.factory.get(path, **(headers or {}))
+        response = async_to_sync(view)(request, *args, **kwargs)
+        if response.status_code != 200:
+            return response
+        return json.loads(response.content)
+
+    def no_threads(self):
+        return mock.patch.object(
+            async_views, '_in_thread', side_effect=AssertionError
+        )
+
+    def test_recipe_list_and_detail(self):
+        data = self.call(async_views.recipe_list, '/api/recipes/')
+        self.assertEqual(data['results'][0]['id'], self.recipe.pk)
+        data = self.call(
+            async_views.recipe_detail, f'/api/recipes/{self.recipe.pk}/',
+            pk=self.recipe.pk
+        )
+        self.assertEqual(data['name'], self.recipe.name)
+
+    def test_cached_anonymous_response_skips_thread_pool(self):
+        first = self.call(async_views.recipe_list, '/api/recipes/')
+        with self.no_threads():
+            second = self.call(async_views.recipe_list, '/api/recipes/')
+        self.assertEqual(second, first)
+
+    def test_authenticated_request_is_not_served_from_cache(self):
+        user = create_user('user')
+        token = Token.objects.create(user=user)
+        self.call(async_views.recipe_list, '/api/recipes/')
+        Favorite.objects.create(user=user, recipe=self.recipe)
+        data = self.call(
+            async_views.recipe_list, '/api/recipes/',
+            headers={'authorization': f'Token {token.key}'}
+        )
+        self.assertTrue(data['results'][0]['is_favorited'])
+
+    def test_ingredient_search_uses_fresh_index(self):
+        expected = [{
+            'id': self.ingredient.pk, 'name': 'Мука', 'measurement_unit': 'г',
+        }]
+        url = '/api/ingredients/?name=му'
+        self.assertEqual(self.call(async_views.ingredient_list, url), expected)
+        with self.no_threads():
+            self.assertEqual(
+                self.call(async_views.ingredient_list, url), expected
+            )
+
+    def test_short_link_redirect(self):
+        code = short_links.encode(self.recipe.pk)
+        response = self.call(
+            async_views.short_link_redirect, f'/s/{code}/', code
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response.url, f'/recipes/{self.recipe.pk}/')
+        with self.no_threads():
+            self.call(async_views.short_link_redirect, f'/s/{code}/', code)
+        code = short_links.encode(self.recipe.pk + 1)
+        with self.assertRaises(Http404):
+            self.call(async_views.short_link_redirect, f'/s/{code}/', code)
+
+
+class ConditionalGetTests(APITestCase):
+    """ETag и Last-Modified карточки рецепта и списка продуктов."""
+
+    def setUp(self):
+        super().setUp()
+        self.recipe = create_recipe(create_user('author'))
+        self.url = reverse('api:recipe-detail', args=[self.recipe.pk])
+
+    def revalidate(self, client, url, response):
+        return client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_unchanged_recipe_gets_304_before_serialization(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Last-Modified', response)
+        # Токен и версия рецепта, без выборки и сериализации.
+        with self.assertNumQueries(2):
+            cached = self.revalidate(self.client, self.url, response)
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached['ETag'], response['ETag'])
+
+    def test_etag_follows_recipe_and_user_flags(self):
+        response = self.client.get(self.url)
+        Favorite.objects.create(user=self.user, recipe=self.recipe)
+        favorited = self.revalidate(self.client, self.url, response)
+        self.assertEqual(favorited.status_code, 200)
+        self.assertTrue(favorited.data['is_favorited'])
+        self.recipe.name = 'Новое название'
+        self.recipe.save()
+        renamed = self.revalidate(self.client, self.url, favorited)
+        self.assertEqual(renamed.status_code, 200)
+        self.assertEqual(renamed.data['name'], 'Новое название')
+
+    def test_anonymous_last_modified(self):
+        client = APIClient()
+        response = client.get(self.url)
+        self.assertIn('Last-Modified', response)
+        cached = client.get(
+            self.url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+        )
+        self.assertEqual(cached.status_code, 304)
+
+    def test_ingredient_list(self):
+        url = reverse('api:ingredient-list')
+        Ingredient.objects.create(name='Мука', measurement_unit='г')
+        ingredient_index.invalidate()
+        response = self.client.get(url)
+        self.assertEqual(
+            self.revalidate(self.client, url, response).status_code, 304
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            Ingredient.objects.create(name='Сахар', measurement_unit='г')
+        changed = self.revalidate(self.client, url, response)
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(len(changed.data), 2)
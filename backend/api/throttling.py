@@ -0,0 +1,39 @@
+from foodgram.ratelimit import scope_for, store
+from rest_framework.throttling import SimpleRateThrottle
+
+
+class ActionRateThrottle(SimpleRateThrottle):
+    """Token bucket для действий из rate_limit_scopes вьюсета.
+
+    Ставка 'N/период' из DEFAULT_THROTTLE_RATES читается как корзина на
+    N запросов подряд, пополняемая на N токенов за период. Корзина своя у
+    каждого пользователя (анонима — по IP) в каждой области и хранится в
+    общем для воркеров файле, поэтому предел не умножается на их число.
+    """
+    wait_seconds = None
+
+    def __init__(self):
+        # Ставка зависит от действия и определяется в allow_request.
+        pass
+
+    def allow_request(self, request, view):
+        self.scope = scope_for(type(view), getattr(view, 'action', None))
+        if self.scope is None:
+            return True
+        self.rate = self.get_rate()
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        self.wait_seconds = store.take(
+            self.get_cache_key(request, view),
+            self.num_requests, self.num_requests / self.duration
+        )
+        return not self.wait_seconds
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            ident = request.user.pk
+        else:
+            ident = self.get_ident(request)
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
+
+    def wait(self):
+        return self.wait_seconds
@@ -1,18 +1,40 @@
+from django.conf import settings
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
+from . import async_views
 from .views import (
-    IngredientViewSet, RecipeViewSet, UserViewSet
+    IngredientViewSet, RecipeViewSet, TagViewSet, UserViewSet
 )
 
 app_name = 'api'
 
 router = DefaultRouter()
 router.register('users', UserViewSet)
+router.register('tags', TagViewSet)
 router.register('ingredients', IngredientViewSet)
 router.register('recipes', RecipeViewSet)
 
-urlpatterns = [
+urlpatterns = []
+if settings.ASYNC_READ_VIEWS:
+    # Перекрывают одноимённые маршруты роутера.
+    urlpatterns += [
+        path('recipes/', async_views.recipe_list, name='recipe-list'),
+        path(
+            'recipes/<int:pk>/', async_views.recipe_detail,
+            name='recipe-detail'
+        ),
+        path(
+            'ingredients/', async_views.ingredient_list,
+            name='ingredient-list'
+        ),
+        path(
+            'ingredients/<int:pk>/', async_views.ingredient_detail,
+            name='ingredient-detail'
+        ),
+    ]
+
+urlpatterns += [
     path('', include(router.urls)),
     path('auth/', include('djoser.urls.authtoken')),
 ] 
\ No newline at end of file
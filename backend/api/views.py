@@ -1,33 +1,138 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db.models import Sum
-from django.http import FileResponse
+from django.db.models import BooleanField, Value
+from django.http import FileResponse, JsonResponse
 from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet as DjoserUserViewSet
-from recipes.models import Ingredient, Recipe, RecipeIngredient, Favorite, ShoppingList
+from django.db import transaction
+from recipes import cart, relations, short_links
+from recipes.counters import refresh
+from recipes.ingredient_index import ingredient_index
+from recipes.timeline import get_feed
+from recipes.models import Ingredient, Recipe, Favorite, ShoppingList, Tag
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
+from rest_framework.filters import OrderingFilter
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
-from rest_framework.exceptions import ValidationError
-from datetime import datetime
+from rest_framework.exceptions import NotFound, ValidationError
 
-from .filters import RecipeFilter
+from .cache import (
+    INGREDIENTS, RECIPES, TAGS, AnonymousCacheMixin, get_generation,
+    get_generation_modified
+)
+from .conditional import ConditionalGetMixin
+from .filters import RecipeFilter, RecipeSearchFilter
+from .pagination import RecipeCursorPagination, RecipeFeedPagination
 from .permissions import IsAuthorOrReadOnly
-from .serializers import IngredientSerializer, RecipeReadSerializer, RecipeWriteSerializer, UserSerializer
+from .renderers import CSVRenderer, PDFRenderer, PlainTextRenderer
+from .serializers import (
+    IngredientSerializer, RecipeIdsSerializer, RecipeReadSerializer,
+    RecipeWriteSerializer, SubscriptionSerializer, TagSerializer
+)
+from .exports import FAILED, PENDING, discard_exports_on_commit, get_export
+from .shopping_list import EXPORT_FORMATS, get_shopping_list_totals
 
 User = get_user_model()
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(
+    AnonymousCacheMixin, ConditionalGetMixin, viewsets.ReadOnlyModelViewSet
+):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
-    search_fields = ('name',)
+    pagination_class = None
+    cache_generation = INGREDIENTS
 
+    def get_validators(self):
+        # Список отдаётся из индекса в памяти, поэтому его версия — хеш
+        # индекса; карточка продукта меняется вместе с поколением.
+        if self.action == 'list':
+            version = ingredient_index.version()
+        else:
+            version = get_generation(INGREDIENTS)
+        return version, get_generation_modified(INGREDIENTS)
 
-class RecipeViewSet(viewsets.ModelViewSet):
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(self.search, request)
+
+    def search(self, request):
+        return Response(
+            ingredient_index.search(request.query_params.get('name', ''))
+        )
+
+
+class TagViewSet(AnonymousCacheMixin, viewsets.ReadOnlyModelViewSet):
+    queryset = Tag.objects.all()
+    serializer_class = TagSerializer
+    pagination_class = None
+    cache_generation = TAGS
+
+
+class RecipeViewSet(
+    AnonymousCacheMixin, ConditionalGetMixin, viewsets.ModelViewSet
+):
     queryset = Recipe.objects.all()
+    cache_generation = RECIPES
     permission_classes = (IsAuthorOrReadOnly,)
+    pagination_class = RecipeFeedPagination
+    filter_backends = (DjangoFilterBackend, RecipeSearchFilter, OrderingFilter)
     filterset_class = RecipeFilter
+    ordering_fields = ('pub_date', 'favorites_count')
+    # Запись с картинкой в base64 и выгрузка — самые дорогие действия.
+    rate_limit_scopes = {
+        'create': 'recipe_write',
+        'update': 'recipe_write',
+        'partial_update': 'recipe_write',
+        'download_shopping_cart': 'shopping_list_export',
+    }
+
+    def get_queryset(self):
+        return Recipe.objects.with_related().with_user_flags(
+            self.request.user
+        )
+
+    def get_validators(self):
+        """Версия карточки рецепта по updated_at одним запросом по pk.
+
+        В представление входят названия продуктов и тегов, поэтому версия
+        учитывает их поколения, а для пользователя — ещё и его флаги
+        избранного и списка покупок. У флагов нет времени изменения,
+        поэтому Last-Modified отдаётся только анонимам.
+        """
+        if self.action != 'retrieve':
+            return None
+        user = self.request.user
+        flags = () if user.is_anonymous else (
+            'is_favorited', 'is_in_shopping_cart'
+        )
+        try:
+            row = (
+                Recipe.objects.with_user_flags(user)
+                .filter(pk=self.kwargs['pk'])
+                .values_list('updated_at', *flags)
+                .first()
+            )
+        except (TypeError, ValueError):
+            return None
+        if row is None:
+            return None
+        updated_at, *flag_values = row
+        version = ':'.join(map(str, (
+            updated_at.isoformat(), get_generation(INGREDIENTS),
+            get_generation(TAGS), self.request.get_host(), user.pk,
+            *flag_values
+        )))
+        if flags:
+            return version, None
+        return version, max(
+            updated_at.timestamp(),
+            get_generation_modified(INGREDIENTS),
+            get_generation_modified(TAGS)
+        )
 
     def get_serializer_class(self):
         if self.action in ['list', 'retrieve']:
@@ -37,67 +142,184 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
-    def _handle_add_relation(self, user, recipe, model, error_msg):
+    def _handle_add_relation(self, user, recipe, model, flag, error_msg):
         obj, created = model.objects.get_or_create(user=user, recipe=recipe)
         if not created:
             raise ValidationError(error_msg)
+        # Флаг аннотирован get_object() до вставки строки.
+        setattr(recipe, flag, True)
         serializer = self.get_serializer(recipe)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def _handle_remove_relation(self, user, recipe, model):
         model.objects.filter(user=user, recipe=recipe).delete()
-            return Response(status=status.HTTP_204_NO_CONTENT)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @transaction.atomic
+    def _handle_bulk_relation(self, request, model, counter):
+        """Добавляет или удаляет пачку рецептов за постоянное число запросов.
+
+        Счётчики и итоги корзины обновляются по рецептам, которые
+        действительно изменил этот запрос. Возвращает статус по каждому
+        id: added, exists, removed, absent или not_found.
+        """
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = serializer.validated_data['recipes']
+        found = set(
+            Recipe.objects.filter(id__in=ids).values_list('id', flat=True)
+        )
+        user_id = request.user.pk
+        if request.method == 'POST':
+            changed = relations.link(model, user_id, found)
+            statuses = ('added', 'exists')
+        else:
+            changed = relations.unlink(model, user_id, found)
+            statuses = ('removed', 'absent')
+        if changed:
+            refresh(Recipe, counter, changed)
+            if model is ShoppingList:
+                if request.method == 'POST':
+                    cart.add_recipes(user_id, changed)
+                else:
+                    cart.remove_recipes(user_id, changed)
+                discard_exports_on_commit(user_id)
+        return Response({'results': [
+            {
+                'id': pk,
+                'status': (
+                    'not_found' if pk not in found
+                    else statuses[0] if pk in changed
+                    else statuses[1]
+                ),
+            }
+            for pk in ids
+        ]})
+
+    @action(
+        detail=False, methods=['post', 'delete'],
+        permission_classes=[IsAuthenticated], url_path='favorite'
+    )
+    def favorite_bulk(self, request):
+        return self._handle_bulk_relation(request, Favorite, 'favorites_count')
 
-    @action(detail=True, methods=['post', 'delete'], permission_classes=[IsAuthenticated])
+    @action(
+        detail=False, methods=['get', 'post', 'delete'],
+        permission_classes=[IsAuthenticated], url_path='shopping_cart'
+    )
+    def shopping_cart_bulk(self, request):
+        if request.method == 'GET':
+            # Итоги читаются из CartItem и не зависят от числа рецептов.
+            return Response(get_shopping_list_totals(request.user))
+        return self._handle_bulk_relation(
+            request, ShoppingList, 'shopping_carts_count'
+        )
+
+    @action(
+        detail=True, methods=['post', 'delete'],
+        permission_classes=[IsAuthenticated]
+    )
     def favorite(self, request, pk=None):
         recipe = self.get_object()
         if request.method == 'POST':
             return self._handle_add_relation(
-                request.user, recipe, Favorite, 'Рецепт уже в избранном'
+                request.user, recipe, Favorite, 'is_favorited',
+                'Рецепт уже в избранном'
             )
         return self._handle_remove_relation(request.user, recipe, Favorite)
 
-    @action(detail=True, methods=['post', 'delete'], permission_classes=[IsAuthenticated])
+    @action(
+        detail=True, methods=['post', 'delete'],
+        permission_classes=[IsAuthenticated]
+    )
     def shopping_cart(self, request, pk=None):
         recipe = self.get_object()
         if request.method == 'POST':
             return self._handle_add_relation(
-                request.user, recipe, ShoppingList, 'Рецепт уже в списке покупок'
+                request.user, recipe, ShoppingList, 'is_in_shopping_cart',
+                'Рецепт уже в списке покупок'
             )
         return self._handle_remove_relation(request.user, recipe, ShoppingList)
 
-    @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated], url_path='download_shopping_cart')
+    @action(detail=True, methods=['get'], url_path='get-link')
+    def get_link(self, request, pk=None):
+        # Проверяется только существование рецепта, без выборки строки.
+        if not (pk.isdigit() and short_links.recipe_exists(int(pk))):
+            raise NotFound('Рецепт не найден.')
+        path = reverse(
+            'recipes:short_link', args=[short_links.encode(int(pk))]
+        )
+        return Response({'short-link': request.build_absolute_uri(path)})
+
+    @action(
+        detail=False,
+        methods=['get'],
+        permission_classes=[IsAuthenticated],
+        pagination_class=RecipeCursorPagination
+    )
+    def feed(self, request):
+        """Рецепты авторов, на которых подписан пользователь."""
+        page = self.paginator.paginate_ids(
+            lambda position, limit: get_feed(request.user, position, limit),
+            Recipe.objects.with_related().with_user_flags(request.user),
+            request
+        )
+        serializer = RecipeReadSerializer(
+            page, many=True, context=self.get_serializer_context()
+        )
+        return self.get_paginated_response(serializer.data)
+
+    @action(
+        detail=False,
+        methods=['get'],
+        permission_classes=[IsAuthenticated],
+        renderer_classes=[
+            PlainTextRenderer, CSVRenderer, JSONRenderer, PDFRenderer
+        ],
+        url_path='download_shopping_cart'
+    )
     def download_shopping_cart(self, request):
-        user = request.user
-        shopping_items = {}
-
-        for item in user.shopping_list.select_related('recipe__author').all():
-            recipe = item.recipe
-            ingredients = RecipeIngredient.objects.filter(recipe=recipe).select_related('ingredient')
-            for ri in ingredients:
-                key = (ri.ingredient.name.title(), ri.ingredient.measurement_unit)
-                shopping_items[key] = shopping_items.get(key, 0) + ri.amount
-
-        current_date = datetime.now().strftime('%d.%m.%Y')
-        content = [
-            f'Список покупок на {current_date}',
-            '',
-            'Ингредиенты:',
-            *[f'{i}. {name} ({unit}) — {amount}'
-              for i, ((name, unit), amount) in enumerate(
-                  sorted(shopping_items.items()), 1
-              )]
-        ]
+        export_format = request.accepted_renderer.format
+        export, state = get_export(request.user.pk, export_format)
+        # Состояние фоновой сборки отдаётся в JSON при любом формате.
+        if state == PENDING:
+            response = JsonResponse(
+                {'status': state, 'detail': 'Список покупок готовится.'},
+                status=status.HTTP_202_ACCEPTED
+            )
+            response['Retry-After'] = '2'
+            response['Location'] = request.build_absolute_uri()
+            return response
+        if state == FAILED:
+            # Сбой временный: после паузы сборка запускается заново.
+            response = JsonResponse(
+                {
+                    'status': state,
+                    'detail': 'Не удалось сформировать список покупок, '
+                              'попробуйте позже.',
+                },
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
+            response['Retry-After'] = str(
+                settings.SHOPPING_LIST_EXPORT_RETRY
+            )
+            return response
+        _, content_type = EXPORT_FORMATS[export_format]
         return FileResponse(
-            '\n'.join(content),
-            as_attachment=True,
-            filename='shopping_list.txt'
+            export, as_attachment=True,
+            filename=f'shopping_list.{export_format}',
+            content_type=content_type
         )
 
+
 class UserViewSet(DjoserUserViewSet):
     """Вьюсет пользователя."""
+    rate_limit_scopes = {'subscriptions': 'subscriptions'}
 
-    @action(detail=True, methods=['post', 'delete'], permission_classes=[IsAuthenticated])
+    @action(
+        detail=True, methods=['post', 'delete'],
+        permission_classes=[IsAuthenticated]
+    )
     def subscribe(self, request, id=None):
         user = request.user
         author = get_object_or_404(User, id=id)
@@ -105,18 +327,47 @@ class UserViewSet(DjoserUserViewSet):
         if user == author:
             raise ValidationError('Нельзя подписаться на самого себя')
         if request.method == 'POST':
-            _, created = user.follower.get_or_create(author=author)
+            _, created = user.followers.get_or_create(author=author)
             if not created:
                 raise ValidationError('Вы уже подписаны на этого автора')
             return Response(status=status.HTTP_201_CREATED)
 
-        get_object_or_404(user.follower, author=author).delete()
+        get_object_or_404(user.followers, author=author).delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
-    @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated], url_path='subscriptions')
+    @action(
+        detail=False, methods=['get'],
+        permission_classes=[IsAuthenticated], url_path='subscriptions'
+    )
     def subscriptions(self, request):
-        user = request.user
-        authors = User.objects.filter(following__user=user)
+        recipes_limit = request.query_params.get('recipes_limit')
+        if recipes_limit is not None:
+            try:
+                recipes_limit = int(recipes_limit)
+            except ValueError:
+                raise ValidationError(
+                    {'recipes_limit': 'Должно быть целым числом'}
+                )
+        authors = User.objects.filter(authors__user=request.user).annotate(
+            is_subscribed=Value(True, output_field=BooleanField()),
+        ).order_by('username')
         page = self.paginate_queryset(authors)
-        serializer = UserSerializer(page, many=True, context={'request': request})
-        return self.get_paginated_response(serializer.data) 
+        serializer = SubscriptionSerializer(page, many=True, context={
+            'request': request,
+            'recipes_by_author': self._get_recipes_by_author(
+                page, recipes_limit
+            ),
+        })
+        return self.get_paginated_response(serializer.data)
+
+    def _get_recipes_by_author(self, authors, recipes_limit):
+        """Рецепты всех авторов страницы, загруженные одним запросом."""
+        recipes = Recipe.objects.filter(
+            author__in=[author.id for author in authors]
+        )
+        if recipes_limit is not None:
+            recipes = recipes.limited_per_author(max(recipes_limit, 0))
+        recipes_by_author = {}
+        for recipe in recipes:
+            recipes_by_author.setdefault(recipe.author_id, []).append(recipe)
+        return recipes_by_author
@@ -0,0 +1,15 @@
+"""
+ASGI config for foodgram project.
+
+Запускается воркерами uvicorn под gunicorn:
+gunicorn foodgram.asgi:application -k uvicorn.workers.UvicornWorker
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+os.environ.setdefault('ASYNC_READ_VIEWS', 'True')
+
+application = get_asgi_application()
@@ -0,0 +1,38 @@
+"""Фоновые пулы потоков процесса.
+
+Пул создаётся при первой задаче, а не при импорте: так воркеры,
+которые форкаются после загрузки приложения, не наследуют потоки
+родителя, а тесты могут переопределить число потоков через настройки.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+
+class BackgroundExecutor:
+    """Лениво создаваемый ThreadPoolExecutor.
+
+    max_workers — число потоков или имя настройки, из которой оно
+    читается при создании пула.
+    """
+
+    def __init__(self, name, max_workers=1):
+        self.name = name
+        self.max_workers = max_workers
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        with self._lock:
+            if self._executor is None:
+                max_workers = self.max_workers
+                if isinstance(max_workers, str):
+                    max_workers = getattr(settings, max_workers)
+                self._executor = ThreadPoolExecutor(
+                    max_workers=max_workers, thread_name_prefix=self.name
+                )
+            return self._executor
+
+    def submit(self, func, *args, **kwargs):
+        return self.get().submit(func, *args, **kwargs)
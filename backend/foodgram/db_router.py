@@ -0,0 +1,193 @@
+"""Чтение с реплик для безопасных запросов к API.
+
+ReplicaRoutingMiddleware включает чтение с реплики на время обработки
+GET и HEAD запросов к представлениям api. После любого пишущего запроса
+клиент на REPLICA_STICKY_SECONDS секунд закрепляется за основной базой,
+чтобы сразу видеть свои изменения несмотря на отставание реплики.
+Недоступная реплика исключается из ротации на REPLICA_RETRY_SECONDS: и
+при подключении, и если запрос упал на уже открытом соединении. Во втором
+случае middleware повторяет безопасный запрос целиком на основной базе.
+"""
+import asyncio
+import contextlib
+import contextvars
+import hashlib
+import logging
+import random
+import time
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.cache import cache
+from django.db import (
+    DEFAULT_DB_ALIAS, DatabaseError, InterfaceError, OperationalError,
+    connections
+)
+
+logger = logging.getLogger(__name__)
+
+SAFE_METHODS = ('GET', 'HEAD')
+# Токены читаются только с основной базы: только что выданный токен
+# может ещё не доехать до реплики.
+PRIMARY_ONLY_APPS = {'authtoken'}
+
+_read_from_replica = contextvars.ContextVar(
+    'read_from_replica', default=False
+)
+_down_until = {}
+
+
+def _mark_down(alias):
+    logger.warning('Реплика %s недоступна, исключена из ротации', alias)
+    _down_until[alias] = time.monotonic() + settings.REPLICA_RETRY_SECONDS
+
+
+def _guard_replica_query(execute, sql, params, many, context):
+    """Исключает реплику из ротации, если запрос к ней не выполнился.
+
+    Исключение помечается псевдонимом реплики, чтобы middleware
+    повторила запрос на основной базе.
+    """
+    try:
+        return execute(sql, params, many, context)
+    except (OperationalError, InterfaceError) as error:
+        alias = context['connection'].alias
+        _mark_down(alias)
+        error.replica_alias = alias
+        raise
+
+
+def _replica_available(alias):
+    if _down_until.get(alias, 0) > time.monotonic():
+        return False
+    connection = connections[alias]
+    try:
+        connection.ensure_connection()
+    except DatabaseError:
+        _mark_down(alias)
+        return False
+    # Обёртки у каждого потока свои, как и соединения; эта — внешняя,
+    # чтобы видеть ошибки любых других.
+    if _guard_replica_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, _guard_replica_query)
+    return True
+
+
+def get_read_alias():
+    replicas = [
+        alias for alias in settings.DATABASE_REPLICAS
+        if _replica_available(alias)
+    ]
+    return random.choice(replicas) if replicas else DEFAULT_DB_ALIAS
+
+
+@contextlib.contextmanager
+def read_from_primary():
+    """Направляет чтение внутри блока на основную базу."""
+    token = _read_from_replica.set(False)
+    try:
+        yield
+    finally:
+        _read_from_replica.reset(token)
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        if (
+            _read_from_replica.get()
+            and model._meta.app_label not in PRIMARY_ONLY_APPS
+        ):
+            return get_read_alias()
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+def _sticky_key(request):
+    credentials = (
+        request.META.get('HTTP_AUTHORIZATION')
+        or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    )
+    if not credentials:
+        return None
+    digest = hashlib.md5(credentials.encode('utf-8')).hexdigest()
+    return f'db:sticky:{digest}'
+
+
+class ReplicaRoutingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        token = _read_from_replica.set(False)
+        try:
+            response = self.get_response(request)
+        finally:
+            _read_from_replica.reset(token)
+        self._pin_writer(request)
+        return response
+
+    async def __acall__(self, request):
+        token = _read_from_replica.set(False)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _read_from_replica.reset(token)
+        self._pin_writer(request)
+        return response
+
+    def _pin_writer(self, request):
+        if request.method not in SAFE_METHODS:
+            key = _sticky_key(request)
+            if key:
+                cache.set(key, True, settings.REPLICA_STICKY_SECONDS)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not settings.DATABASE_REPLICAS:
+            return None
+        if request.method not in SAFE_METHODS:
+            return None
+        view_class = getattr(view_func, 'cls', None)
+        module = (view_class or view_func).__module__
+        if module != 'api.views':
+            return None
+        key = _sticky_key(request)
+        if key and cache.get(key):
+            return None
+        _read_from_replica.set(True)
+        request._replica_view = (view_func, view_args, view_kwargs)
+        return None
+
+    def process_exception(self, request, exception):
+        alias = getattr(exception, 'replica_alias', None)
+        view = getattr(request, '_replica_view', None)
+        if alias is None or view is None:
+            return None
+        # GET и HEAD безопасно выполнить ещё раз, теперь без реплик.
+        logger.warning(
+            'Запрос %s повторяется на основной базе после сбоя реплики %s',
+            request.path, alias
+        )
+        _read_from_replica.set(False)
+        request._replica_view = None
+        view_func, view_args, view_kwargs = view
+        if asyncio.iscoroutinefunction(view_func):
+            return async_to_sync(view_func)(
+                request, *view_args, **view_kwargs
+            )
+        return view_func(request, *view_args, **view_kwargs)
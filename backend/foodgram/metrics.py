@@ -0,0 +1,274 @@
+"""Метрики запросов в формате Prometheus.
+
+Каждый процесс gunicorn копит гистограммы в памяти и раз в
+METRICS_FLUSH_INTERVAL секунд сбрасывает их в собственный файл в
+METRICS_DIR. Эндпоинт /metrics складывает файлы всех процессов, поэтому
+видит суммарную картину по всем воркерам.
+"""
+import asyncio
+import bisect
+import contextlib
+import contextvars
+import glob
+import json
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.http import Http404, HttpResponse
+
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+SIZE_BUCKETS = (1024, 10240, 102400, 1048576, 10485760)
+
+# имя метрики: (тип, описание, границы корзин гистограммы)
+METRICS = {
+    'foodgram_http_request_duration_seconds': (
+        'histogram', 'Время обработки запроса.', LATENCY_BUCKETS
+    ),
+    'foodgram_http_db_queries': (
+        'histogram', 'Число SQL-запросов на HTTP-запрос.', QUERY_COUNT_BUCKETS
+    ),
+    'foodgram_http_db_duration_seconds': (
+        'summary', 'Время выполнения SQL-запросов.', None
+    ),
+    'foodgram_http_response_size_bytes': (
+        'histogram', 'Размер тела ответа.', SIZE_BUCKETS
+    ),
+}
+LABELS = ('route', 'method', 'status')
+
+
+class MetricsStore:
+    """Агрегаты текущего процесса с периодическим сбросом в файл."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = {}
+        self._flushed_at = time.monotonic()
+
+    def observe(self, metric, labels, value):
+        buckets = METRICS[metric][2] or ()
+        key = '|'.join(labels)
+        with self._lock:
+            series = self._data.setdefault(metric, {}).setdefault(
+                key, [0] * (len(buckets) + 2)
+            )
+            # Корзины хранятся некумулятивно, за ними идут sum и count;
+            # значения больше последней границы попадают только в count.
+            if buckets:
+                index = bisect.bisect_left(buckets, value)
+                if index < len(buckets):
+                    series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @property
+    def path(self):
+        return os.path.join(
+            settings.METRICS_DIR, f'metrics-{os.getpid()}.json'
+        )
+
+    def maybe_flush(self):
+        elapsed = time.monotonic() - self._flushed_at
+        if elapsed >= settings.METRICS_FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            payload = json.dumps(self._data)
+            self._flushed_at = time.monotonic()
+        os.makedirs(settings.METRICS_DIR, exist_ok=True)
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(payload)
+        os.replace(tmp_path, self.path)
+
+    def collect(self):
+        """Сумма агрегатов всех процессов."""
+        self.flush()
+        merged = {}
+        pattern = os.path.join(settings.METRICS_DIR, 'metrics-*.json')
+        for path in glob.glob(pattern):
+            try:
+                with open(path, encoding='utf-8') as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            for metric, series in data.items():
+                target = merged.setdefault(metric, {})
+                for key, values in series.items():
+                    if key in target:
+                        values = [a + b for a, b in zip(target[key], values)]
+                    target[key] = values
+        return merged
+
+
+store = MetricsStore()
+
+
+def _format_labels(key, extra=''):
+    pairs = [
+        f'{name}="{value}"' for name, value in zip(LABELS, key.split('|'))
+    ]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}'
+
+
+def render_prometheus(data):
+    lines = []
+    for metric, (kind, description, buckets) in METRICS.items():
+        lines.append(f'# HELP {metric} {description}')
+        lines.append(f'# TYPE {metric} {kind}')
+        for key, values in sorted(data.get(metric, {}).items()):
+            total, count = values[-2], values[-1]
+            if kind == 'histogram':
+                cumulative = 0
+                for bound, observed in zip(buckets, values):
+                    cumulative += observed
+                    labels = _format_labels(key, f'le="{bound}"')
+                    lines.append(f'{metric}_bucket{labels} {cumulative}')
+                labels = _format_labels(key, 'le="+Inf"')
+                lines.append(f'{metric}_bucket{labels} {count}')
+            labels = _format_labels(key)
+            lines.append(f'{metric}_sum{labels} {total}')
+            lines.append(f'{metric}_count{labels} {count}')
+    return '\n'.join(lines) + '\n'
+
+
+class _QueryCounter:
+    """execute_wrapper, считающий число и время SQL-запросов."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.attached = False
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+
+
+_current_counter = contextvars.ContextVar('query_counter', default=None)
+
+
+@contextlib.contextmanager
+def _wrap_connections(wrapper):
+    """Подключает wrapper ко всем базам: запрос может читать с реплики."""
+    with contextlib.ExitStack() as stack:
+        for conn in connections.all():
+            stack.enter_context(conn.execute_wrapper(wrapper))
+        yield
+
+
+@contextlib.contextmanager
+def count_queries():
+    """Считает запросы текущего потока в счётчик текущего HTTP-запроса.
+
+    Под ASGI представления обращаются к базе из пула потоков, а
+    соединения у каждого потока свои, поэтому мост в пул потоков
+    подключает счётчик сам.
+    """
+    counter = _current_counter.get()
+    if counter is None:
+        yield
+        return
+    counter.attached = True
+    with _wrap_connections(counter):
+        yield
+
+
+def _observe_response(labels, queries, size):
+    if queries.attached:
+        store.observe('foodgram_http_db_queries', labels, queries.count)
+        store.observe(
+            'foodgram_http_db_duration_seconds', labels, queries.duration
+        )
+    store.observe('foodgram_http_response_size_bytes', labels, size)
+
+
+def _observe_streamed(content, labels, queries):
+    """Досчитывает запросы и размер по мере отдачи потокового ответа."""
+    size = 0
+    try:
+        with _wrap_connections(queries):
+            for chunk in content:
+                size += len(chunk)
+                yield chunk
+    finally:
+        _observe_response(labels, queries, size)
+
+
+class MetricsMiddleware:
+    """Собирает задержку, SQL-запросы и размер ответа по маршрутам."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        queries = _QueryCounter()
+        token = _current_counter.set(queries)
+        started = time.perf_counter()
+        try:
+            with count_queries():
+                response = self.get_response(request)
+        finally:
+            _current_counter.reset(token)
+        return self._observe(
+            request, response, queries, time.perf_counter() - started
+        )
+
+    async def __acall__(self, request):
+        queries = _QueryCounter()
+        token = _current_counter.set(queries)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_counter.reset(token)
+        return self._observe(
+            request, response, queries, time.perf_counter() - started
+        )
+
+    def _observe(self, request, response, queries, elapsed):
+        match = request.resolver_match
+        route = match.view_name if match else 'unresolved'
+        if route == 'metrics':
+            return response
+        labels = (route, request.method, str(response.status_code))
+        store.observe(
+            'foodgram_http_request_duration_seconds', labels, elapsed
+        )
+        if response.streaming:
+            response.streaming_content = _observe_streamed(
+                response.streaming_content, labels, queries
+            )
+        else:
+            _observe_response(labels, queries, len(response.content))
+        store.maybe_flush()
+        return response
+
+
+def metrics_view(request):
+    allowed = settings.METRICS_ALLOWED_IPS
+    if allowed and request.META.get('REMOTE_ADDR') not in allowed:
+        raise Http404
+    return HttpResponse(
+        render_prometheus(store.collect()),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
@@ -0,0 +1,214 @@
+"""Ограничение частоты и сброс нагрузки для дорогих эндпоинтов.
+
+Вьюсет перечисляет дорогие действия в rate_limit_scopes
+{действие: область}. По области работают два механизма:
+
+- api.throttling.ActionRateThrottle — token bucket на пользователя и
+  область со ставками из DEFAULT_THROTTLE_RATES;
+- ConcurrencyLimitMiddleware — не больше LOAD_SHEDDING_LIMITS[область]
+  одновременно обрабатываемых запросов на все воркеры, лишние сразу
+  получают 429 с Retry-After, не занимая воркер работой.
+
+Состояние общее для всех процессов: файл SQLite в RATE_LIMIT_DIR, каждая
+операция — одна транзакция BEGIN IMMEDIATE. Если файл недоступен,
+ограничения не применяются: сбой учёта не должен ронять сайт.
+"""
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS buckets ('
+    'key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL, '
+    'full_at REAL NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS buckets_full_at ON buckets (full_at)',
+    'CREATE TABLE IF NOT EXISTS slots ('
+    'id INTEGER PRIMARY KEY, scope TEXT NOT NULL, expires REAL NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS slots_scope ON slots (scope, expires)',
+)
+# Как часто процесс удаляет полные корзины: они равносильны отсутствующим.
+CLEANUP_INTERVAL = 60
+# Сколько ждать блокировку файла, прежде чем пропустить запрос без учёта.
+LOCK_TIMEOUT = 0.5
+
+
+def scope_for(view_class, action):
+    """Область ограничений действия или None для обычных действий."""
+    scopes = getattr(view_class, 'rate_limit_scopes', None) or {}
+    return scopes.get(action)
+
+
+class SharedStore:
+    """Корзины токенов и занятые слоты в общем для процессов файле."""
+
+    def __init__(self, path=None):
+        self._path = path
+        self._local = threading.local()
+        self._cleaned_at = time.monotonic()
+
+    @property
+    def path(self):
+        return self._path or os.path.join(
+            settings.RATE_LIMIT_DIR, 'ratelimit.sqlite3'
+        )
+
+    def _connection(self):
+        # Соединение своё у каждого потока и у каждого процесса после fork.
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            connection = sqlite3.connect(
+                self.path, timeout=LOCK_TIMEOUT, isolation_level=None
+            )
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=OFF')
+            for statement in SCHEMA:
+                connection.execute(statement)
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def _transaction(self, func, *args):
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            result = func(connection, *args)
+            connection.execute('COMMIT')
+        except BaseException:
+            if connection.in_transaction:
+                connection.execute('ROLLBACK')
+            raise
+        return result
+
+    def _take(self, connection, key, capacity, rate, now):
+        row = connection.execute(
+            'SELECT tokens, updated FROM buckets WHERE key = ?', (key,)
+        ).fetchone()
+        tokens = capacity
+        if row is not None:
+            tokens = min(capacity, row[0] + (now - row[1]) * rate)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / rate
+        connection.execute(
+            'INSERT OR REPLACE INTO buckets (key, tokens, updated, full_at) '
+            'VALUES (?, ?, ?, ?)',
+            (key, tokens, now, now + (capacity - tokens) / rate)
+        )
+        if time.monotonic() - self._cleaned_at >= CLEANUP_INTERVAL:
+            self._cleaned_at = time.monotonic()
+            connection.execute('DELETE FROM buckets WHERE full_at < ?', (now,))
+        return wait
+
+    def take(self, key, capacity, rate):
+        """Берёт токен из корзины key.
+
+        Корзина вмещает capacity токенов и пополняется на rate токенов в
+        секунду. Возвращает 0, если токен взят, иначе — сколько секунд
+        ждать следующего.
+        """
+        try:
+            return self._transaction(
+                self._take, key, capacity, rate, time.time()
+            )
+        except (sqlite3.Error, OSError):
+            logger.warning('Учёт частоты запросов недоступен', exc_info=True)
+            return 0.0
+
+    def _acquire(self, connection, scope, limit, now):
+        connection.execute(
+            'DELETE FROM slots WHERE scope = ? AND expires < ?', (scope, now)
+        )
+        (busy,) = connection.execute(
+            'SELECT COUNT(*) FROM slots WHERE scope = ?', (scope,)
+        ).fetchone()
+        if busy >= limit:
+            return None
+        return connection.execute(
+            'INSERT INTO slots (scope, expires) VALUES (?, ?)',
+            (scope, now + settings.LOAD_SHEDDING_SLOT_TIMEOUT)
+        ).lastrowid
+
+    def acquire(self, scope, limit):
+        """Занимает слот области или возвращает None, если свободных нет.
+
+        Слоты воркера, убитого посреди запроса, освобождаются через
+        LOAD_SHEDDING_SLOT_TIMEOUT секунд.
+        """
+        try:
+            return self._transaction(self._acquire, scope, limit, time.time())
+        except (sqlite3.Error, OSError):
+            logger.warning('Учёт нагрузки недоступен', exc_info=True)
+            return 0
+
+    def release(self, slot):
+        if not slot:
+            return
+        try:
+            self._connection().execute(
+                'DELETE FROM slots WHERE id = ?', (slot,)
+            )
+        except (sqlite3.Error, OSError):
+            logger.warning('Слот %s не освобождён', slot, exc_info=True)
+
+
+store = SharedStore()
+
+
+class ConcurrencyLimitMiddleware:
+    """Отвечает 429, когда дорогих запросов области уже слишком много."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        try:
+            return self.get_response(request)
+        finally:
+            store.release(getattr(request, '_load_shedding_slot', None))
+
+    async def __acall__(self, request):
+        try:
+            return await self.get_response(request)
+        finally:
+            slot = getattr(request, '_load_shedding_slot', None)
+            if slot:
+                await sync_to_async(store.release, thread_sensitive=False)(
+                    slot
+                )
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        actions = getattr(view_func, 'actions', None) or {}
+        # HEAD вьюсеты обрабатывают действием GET.
+        method = 'get' if request.method == 'HEAD' else request.method.lower()
+        scope = scope_for(getattr(view_func, 'cls', None), actions.get(method))
+        limit = settings.LOAD_SHEDDING_LIMITS.get(scope)
+        if not limit:
+            return None
+        slot = store.acquire(scope, limit)
+        if slot is None:
+            response = JsonResponse(
+                {'detail': 'Сервер перегружен, повторите запрос позже.'},
+                status=429
+            )
+            response['Retry-After'] = str(settings.LOAD_SHEDDING_RETRY_AFTER)
+            return response
+        request._load_shedding_slot = slot
+        return None
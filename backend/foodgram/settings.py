@@ -1,4 +1,5 @@
 import os
+import tempfile
 from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -19,22 +20,31 @@ INSTALLED_APPS = [
     'rest_framework',
     'rest_framework.authtoken',
     'django_filters',
+    'djoser',
+    'accounts.apps.AccountsConfig',
     'api.apps.ApiConfig',
     'recipes.apps.RecipesConfig',
 ]
 
 MIDDLEWARE = [
+    'foodgram.metrics.MetricsMiddleware',
+    'foodgram.ratelimit.ConcurrencyLimitMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'foodgram.db_router.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
 ROOT_URLCONF = 'foodgram.urls'
 
+# Асинхронные представления чтения; включаются в asgi.py.
+ASYNC_READ_VIEWS = os.getenv('ASYNC_READ_VIEWS', 'False') == 'True'
+ASYNC_VIEW_THREADS = int(os.getenv('ASYNC_VIEW_THREADS', 32))
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -64,6 +74,46 @@ DATABASES = {
     }
 }
 
+# Реплики для чтения задаются списком хостов через запятую.
+DATABASE_REPLICAS = []
+for number, host in enumerate(filter(None, os.getenv('DB_REPLICA_HOSTS', '').split(',')), 1):
+    alias = f'replica_{number}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(alias)
+DATABASE_ROUTERS = ['foodgram.db_router.ReplicaRouter']
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', 5))
+REPLICA_RETRY_SECONDS = int(os.getenv('REPLICA_RETRY_SECONDS', 30))
+
+# locmem подходит только для одного процесса: при нескольких воркерах
+# gunicorn нужен общий кеш (file или redis через django-redis).
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'locmem')
+
+CACHES = {
+    'default': {
+        'locmem': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+        'file': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.getenv(
+                'CACHE_LOCATION', os.path.join(BASE_DIR, 'cache')
+            ),
+        },
+        'redis': {
+            'BACKEND': 'django_redis.cache.RedisCache',
+            'LOCATION': os.getenv(
+                'CACHE_LOCATION', 'redis://127.0.0.1:6379/1'
+            ),
+        },
+    }[CACHE_BACKEND]
+}
+
+RESPONSE_CACHE_TIMEOUT = int(os.getenv('RESPONSE_CACHE_TIMEOUT', 300))
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -92,10 +142,52 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+RECIPE_IMAGE_MAX_SIZE = int(os.getenv('RECIPE_IMAGE_MAX_SIZE', 5 * 1024 * 1024))
+
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', 2))
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'accounts.User'
 
+# Каталог общий для всех воркеров gunicorn, очищать при деплое.
+METRICS_DIR = os.getenv('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'foodgram-metrics'))
+METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', 5))
+METRICS_ALLOWED_IPS = [ip for ip in os.getenv('METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',') if ip]
+
+# Длина ленты подписок и число подписчиков, начиная с которого рецепты
+# автора не рассылаются по лентам, а подмешиваются при чтении.
+TIMELINE_MAX_LENGTH = int(os.getenv('TIMELINE_MAX_LENGTH', 500))
+TIMELINE_FANOUT_LIMIT = int(os.getenv('TIMELINE_FANOUT_LIMIT', 1000))
+
+INGREDIENT_INDEX_TTL = int(os.getenv('INGREDIENT_INDEX_TTL', 300))
+
+# Кеш проверенных коротких ссылок в памяти процесса и запись переходов:
+# раз в SHORT_LINK_FLUSH_INTERVAL секунд или по накоплении
+# SHORT_LINK_FLUSH_SIZE рецептов.
+SHORT_LINK_CACHE_SIZE = int(os.getenv('SHORT_LINK_CACHE_SIZE', 10000))
+SHORT_LINK_CACHE_TTL = int(os.getenv('SHORT_LINK_CACHE_TTL', 300))
+SHORT_LINK_FLUSH_INTERVAL = float(os.getenv('SHORT_LINK_FLUSH_INTERVAL', 10))
+SHORT_LINK_FLUSH_SIZE = int(os.getenv('SHORT_LINK_FLUSH_SIZE', 1000))
+
+# Выгрузки списка покупок: PDF корзин больше SHOPPING_LIST_SYNC_RECIPES
+# рецептов собирается в фоне. Шрифт должен содержать кириллицу.
+SHOPPING_LIST_SYNC_RECIPES = int(os.getenv('SHOPPING_LIST_SYNC_RECIPES', 30))
+SHOPPING_LIST_EXPORT_WORKERS = int(
+    os.getenv('SHOPPING_LIST_EXPORT_WORKERS', 2)
+)
+SHOPPING_LIST_EXPORT_TIMEOUT = int(
+    os.getenv('SHOPPING_LIST_EXPORT_TIMEOUT', 300)
+)
+SHOPPING_LIST_EXPORT_RETRY = int(os.getenv('SHOPPING_LIST_EXPORT_RETRY', 60))
+# Готовые выгрузки лежат вне MEDIA_ROOT и отдаются только через API.
+SHOPPING_LIST_EXPORT_ROOT = os.getenv(
+    'SHOPPING_LIST_EXPORT_ROOT', os.path.join(BASE_DIR, 'exports')
+)
+SHOPPING_LIST_PDF_FONT = os.getenv(
+    'SHOPPING_LIST_PDF_FONT', '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
+
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
@@ -105,4 +197,29 @@ REST_FRAMEWORK = {
     ],
     'DEFAULT_PAGINATION_CLASS': 'api.pagination.RecipePagination',
     'PAGE_SIZE': 6,
-} 
\ No newline at end of file
+    'DEFAULT_THROTTLE_CLASSES': [
+        'api.throttling.ActionRateThrottle',
+    ],
+    # Области из rate_limit_scopes вьюсетов, 'N/период' — token bucket.
+    'DEFAULT_THROTTLE_RATES': {
+        'shopping_list_export': os.getenv(
+            'THROTTLE_SHOPPING_LIST_EXPORT', '10/min'
+        ),
+        'recipe_write': os.getenv('THROTTLE_RECIPE_WRITE', '30/min'),
+        'subscriptions': os.getenv('THROTTLE_SUBSCRIPTIONS', '60/min'),
+    },
+}
+
+# Общий для воркеров файл учёта частоты и нагрузки, см. foodgram.ratelimit.
+RATE_LIMIT_DIR = os.getenv('RATE_LIMIT_DIR', os.path.join(tempfile.gettempdir(), 'foodgram-ratelimit'))
+# Сколько запросов области обрабатывается одновременно на всех воркерах;
+# остальные сразу получают 429.
+LOAD_SHEDDING_LIMITS = {
+    'shopping_list_export': int(
+        os.getenv('LOAD_SHEDDING_SHOPPING_LIST_EXPORT', 4)
+    ),
+    'recipe_write': int(os.getenv('LOAD_SHEDDING_RECIPE_WRITE', 8)),
+    'subscriptions': int(os.getenv('LOAD_SHEDDING_SUBSCRIPTIONS', 8)),
+}
+LOAD_SHEDDING_RETRY_AFTER = int(os.getenv('LOAD_SHEDDING_RETRY_AFTER', 2))
+LOAD_SHEDDING_SLOT_TIMEOUT = int(os.getenv('LOAD_SHEDDING_SLOT_TIMEOUT', 300)) 
\ No newline at end of file
@@ -0,0 +1,27 @@
+"""Настройки для тестов без PostgreSQL.
+
+python manage.py test --settings=foodgram.settings_test
+
+Вторая база SQLite заменяет реплику в тестах маршрутизации чтения; в
+ротацию она попадает только там, через override_settings.
+"""
+import tempfile
+
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db.sqlite3',
+    },
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'replica.sqlite3',
+    },
+}
+DATABASE_REPLICAS = []
+
+RATE_LIMIT_DIR = tempfile.mkdtemp(prefix='foodgram-ratelimit-')
+METRICS_DIR = tempfile.mkdtemp(prefix='foodgram-metrics-')
+SHOPPING_LIST_EXPORT_ROOT = tempfile.mkdtemp(prefix='foodgram-exports-')
@@ -0,0 +1,345 @@
+import json
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api import throttling
+from api.cache import INGREDIENTS, bump_generation
+from recipes.ingredient_index import ingredient_index
+from recipes.models import Ingredient
+
+from . import db_router, metrics, ratelimit
+
+User = get_user_model()
+REPLICA = 'replica'
+
+
+@override_settings(DATABASE_REPLICAS=[REPLICA])
+class ReplicaRoutingTests(TestCase):
+    """Чтение с реплики, запись и read-your-writes, откат на основную.
+
+    Таблица продуктов есть в обеих базах с разными названиями под одним
+    id, поэтому по ответу видно, какая база его отдала.
+    """
+    databases = {DEFAULT_DB_ALIAS, REPLICA}
+
+    @classmethod
+    def setUpClass(cls):
+        # Миграции на реплику не применяются: схему даёт репликация.
+        with connections[REPLICA].schema_editor() as editor:
+            editor.create_model(Ingredient)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        with connections[REPLICA].schema_editor() as editor:
+            editor.delete_model(Ingredient)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ingredient = Ingredient.objects.create(
+            name='с основной', measurement_unit='г'
+        )
+        Ingredient.objects.using(REPLICA).create(
+            pk=cls.ingredient.pk, name='с реплики', measurement_unit='г'
+        )
+        cls.user = User.objects.create_user(
+            username='user', email='user@example.com', password='password'
+        )
+        cls.author = User.objects.create_user(
+            username='author', email='author@example.com',
+            password='password'
+        )
+        cls.url = reverse('api:ingredient-detail', args=[cls.ingredient.pk])
+
+    def setUp(self):
+        cache.clear()
+        db_router._down_until.clear()
+        self.client = self.client_for(self.user)
+
+    def client_for(self, user):
+        client = APIClient()
+        token, _ = Token.objects.get_or_create(user=user)
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        return client
+
+    def read_name(self, client=None):
+        response = (client or self.client).get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return response.data['name']
+
+    def test_safe_api_reads_go_to_replica(self):
+        self.assertEqual(self.read_name(), 'с реплики')
+
+    def test_reads_outside_requests_go_to_primary(self):
+        self.assertEqual(
+            Ingredient.objects.get(pk=self.ingredient.pk).name, 'с основной'
+        )
+
+    def test_writes_go_to_primary(self):
+        token = db_router._read_from_replica.set(True)
+        try:
+            router = db_router.ReplicaRouter()
+            self.assertEqual(router.db_for_read(Ingredient), REPLICA)
+            self.assertEqual(
+                router.db_for_write(Ingredient), DEFAULT_DB_ALIAS
+            )
+            self.assertEqual(router.db_for_read(Token), DEFAULT_DB_ALIAS)
+        finally:
+            db_router._read_from_replica.reset(token)
+        url = reverse('api:user-subscribe', args=[self.author.pk])
+        self.assertEqual(self.client.post(url).status_code, 201)
+        self.assertTrue(
+            self.user.followers.filter(author=self.author).exists()
+        )
+
+    def test_writer_reads_own_writes_from_primary(self):
+        url = reverse('api:user-subscribe', args=[self.author.pk])
+        self.client.post(url)
+        self.assertEqual(self.read_name(), 'с основной')
+        other = self.client_for(self.author)
+        self.assertEqual(self.read_name(other), 'с реплики')
+
+    @override_settings(REPLICA_STICKY_SECONDS=0)
+    def test_stickiness_expires(self):
+        self.client.post(reverse('api:user-subscribe', args=[self.author.pk]))
+        self.assertEqual(self.read_name(), 'с реплики')
+
+    def test_unreachable_replica_falls_back_to_primary(self):
+        with mock.patch.object(
+            connections[REPLICA], 'ensure_connection',
+            side_effect=OperationalError('connection refused')
+        ):
+            self.assertEqual(self.read_name(), 'с основной')
+        # Реплика исключена из ротации на REPLICA_RETRY_SECONDS.
+        self.assertEqual(self.read_name(), 'с основной')
+
+    def test_query_failure_on_open_connection_falls_back_to_primary(self):
+        self.assertEqual(self.read_name(), 'с реплики')
+
+        def fail(execute, sql, params, many, context):
+            raise OperationalError('server closed the connection')
+
+        with connections[REPLICA].execute_wrapper(fail):
+            self.assertEqual(self.read_name(), 'с основной')
+            self.assertEqual(self.read_name(), 'с основной')
+        db_router._down_until.clear()
+        self.assertEqual(self.read_name(), 'с реплики')
+
+    def test_anonymous_cache_miss_after_bump_reads_primary(self):
+        anonymous = APIClient()
+        bump_generation(INGREDIENTS)
+        self.assertEqual(self.read_name(anonymous), 'с основной')
+        # В кеш под новым поколением попал ответ основной базы.
+        with override_settings(REPLICA_STICKY_SECONDS=0):
+            self.assertEqual(self.read_name(anonymous), 'с основной')
+
+    @override_settings(REPLICA_STICKY_SECONDS=0)
+    def test_anonymous_reads_replica_once_replicas_caught_up(self):
+        bump_generation(INGREDIENTS)
+        self.assertEqual(self.read_name(APIClient()), 'с реплики')
+
+    def test_ingredient_index_is_built_from_primary(self):
+        ingredient_index.invalidate()
+        self.addCleanup(ingredient_index.invalidate)
+        response = self.client.get(reverse('api:ingredient-list'))
+        self.assertEqual(
+            [item['name'] for item in response.data], ['с основной']
+        )
+
+    def test_metrics_count_replica_queries(self):
+        counter = metrics._QueryCounter()
+        token = metrics._current_counter.set(counter)
+        try:
+            with metrics.count_queries():
+                list(Ingredient.objects.using(REPLICA).all())
+        finally:
+            metrics._current_counter.reset(token)
+        self.assertEqual(counter.count, 1)
+
+
+class SharedStoreTests(SimpleTestCase):
+    """Корзины токенов и слоты в общем файле SQLite."""
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.store = ratelimit.SharedStore(
+            path=os.path.join(directory, 'ratelimit.sqlite3')
+        )
+        self.now = 1000.0
+        patcher = mock.patch.object(
+            ratelimit.time, 'time', side_effect=lambda: self.now
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_token_bucket(self):
+        self.assertEqual(self.store.take('user', 2, 1), 0)
+        self.assertEqual(self.store.take('user', 2, 1), 0)
+        self.assertAlmostEqual(self.store.take('user', 2, 1), 1)
+        # Корзины разных ключей независимы.
+        self.assertEqual(self.store.take('other', 2, 1), 0)
+        self.now += 1
+        self.assertEqual(self.store.take('user', 2, 1), 0)
+
+    @override_settings(LOAD_SHEDDING_SLOT_TIMEOUT=10)
+    def test_slots(self):
+        first = self.store.acquire('scope', 2)
+        self.assertTrue(first)
+        self.assertTrue(self.store.acquire('scope', 2))
+        self.assertIsNone(self.store.acquire('scope', 2))
+        self.assertTrue(self.store.acquire('other', 2))
+        self.store.release(first)
+        self.assertTrue(self.store.acquire('scope', 2))
+        # Слоты убитого воркера освобождаются по таймауту.
+        self.now += 11
+        self.assertTrue(self.store.acquire('scope', 2))
+
+    def test_unavailable_store_does_not_limit(self):
+        store = ratelimit.SharedStore(
+            path=os.path.join(__file__, 'ratelimit.sqlite3')
+        )
+        with self.assertLogs('foodgram.ratelimit', 'WARNING'):
+            self.assertEqual(store.take('user', 1, 1), 0)
+            self.assertEqual(store.acquire('scope', 1), 0)
+
+
+@override_settings(LOAD_SHEDDING_LIMITS={'subscriptions': 1})
+class RateLimitTests(TestCase):
+    """Ограничение частоты и сброс нагрузки на дорогих действиях."""
+    url = reverse('api:user-subscriptions')
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.store = ratelimit.SharedStore(
+            path=os.path.join(directory, 'ratelimit.sqlite3')
+        )
+        for patcher in (
+            mock.patch.object(ratelimit, 'store', self.store),
+            mock.patch.object(throttling, 'store', self.store),
+            mock.patch.object(
+                throttling.ActionRateThrottle, 'THROTTLE_RATES',
+                {'subscriptions': '2/min'}
+            ),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        user = User.objects.create_user(
+            username='user', email='user@example.com', password='password'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user)
+
+    def test_throttle(self):
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '30')
+        # Обычные действия без области не ограничиваются.
+        response = self.client.get(reverse('api:user-me'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_load_shedding(self):
+        slot = self.store.acquire('subscriptions', 1)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(
+            response['Retry-After'], str(settings.LOAD_SHEDDING_RETRY_AFTER)
+        )
+        self.store.release(slot)
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        # Слот запроса освобождён после ответа.
+        self.assertTrue(self.store.acquire('subscriptions', 1))
+
+
+class MetricsTests(TestCase):
+    """Эндпоинт /metrics, список разрешённых адресов и сумма по процессам."""
+    url = reverse('metrics')
+    labels = ('api:ingredient-list', 'GET', '200')
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        override = override_settings(METRICS_DIR=directory)
+        override.enable()
+        self.addCleanup(override.disable)
+        patcher = mock.patch.object(metrics, 'store', metrics.MetricsStore())
+        self.store = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def write_other_process(self, data, pid=1):
+        path = os.path.join(settings.METRICS_DIR, f'metrics-{pid}.json')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(data if isinstance(data, str) else json.dumps(data))
+
+    def test_exposition(self):
+        Ingredient.objects.create(name='Мука', measurement_unit='г')
+        self.client.get(reverse('api:ingredient-list'))
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response['Content-Type'],
+            'text/plain; version=0.0.4; charset=utf-8'
+        )
+        lines = response.content.decode().splitlines()
+        labels = 'route="api:ingredient-list",method="GET",status="200"'
+        self.assertIn(
+            '# TYPE foodgram_http_request_duration_seconds histogram', lines
+        )
+        self.assertIn(
+            f'foodgram_http_request_duration_seconds_count{{{labels}}} 1',
+            lines
+        )
+        self.assertIn(
+            f'foodgram_http_db_queries_bucket{{{labels},le="+Inf"}} 1', lines
+        )
+        # Запросы к самому эндпоинту не учитываются.
+        self.assertFalse([line for line in lines if 'route="metrics"' in line])
+
+    @override_settings(METRICS_ALLOWED_IPS=['10.0.0.1'])
+    def test_allowed_ips(self):
+        self.assertEqual(
+            self.client.get(self.url, REMOTE_ADDR='127.0.0.1').status_code,
+            404
+        )
+        self.assertEqual(
+            self.client.get(self.url, REMOTE_ADDR='10.0.0.1').status_code,
+            200
+        )
+        with override_settings(METRICS_ALLOWED_IPS=[]):
+            self.assertEqual(
+                self.client.get(self.url, REMOTE_ADDR='192.0.2.1').status_code,
+                200
+            )
+
+    def test_collect_sums_processes(self):
+        metric = 'foodgram_http_response_size_bytes'
+        key = '|'.join(self.labels)
+        self.store.observe(metric, self.labels, 2048)
+        # Корзины некумулятивны, за ними идут sum и count; значение
+        # больше последней границы учтено только в count.
+        self.write_other_process({metric: {
+            key: [1, 0, 0, 0, 0, 10 ** 8 + 512, 2],
+            'other|GET|404': [1, 0, 0, 0, 0, 100, 1],
+        }})
+        self.write_other_process('{"обрезанный файл', pid=2)
+        self.assertEqual(self.store.collect()[metric], {
+            key: [1, 1, 0, 0, 0, 10 ** 8 + 2560, 3],
+            'other|GET|404': [1, 0, 0, 0, 0, 100, 1],
+        })
@@ -3,12 +3,26 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 
+from api import async_views
+from .metrics import metrics_view
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('api.urls')),
-    path('', include('recipes.urls')),
+    path('metrics', metrics_view, name='metrics'),
 ]
 
+if settings.ASYNC_READ_VIEWS:
+    # Перекрывает одноимённый маршрут recipes.urls.
+    urlpatterns.append(
+        path(
+            's/<str:code>/', async_views.short_link_redirect,
+            name='short_link'
+        )
+    )
+
+urlpatterns.append(path('', include('recipes.urls')))
+
 if settings.DEBUG:
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
     urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT) 
\ No newline at end of file
@@ -1,30 +1,67 @@
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Count
+from django.urls import reverse
+from django.utils.functional import cached_property
+from django.utils.html import format_html, format_html_join
 from django.utils.safestring import mark_safe
 from django.contrib.auth import get_user_model
 from accounts.models import Follow
-from .models import Ingredient, Recipe, RecipeIngredient, Favorite, ShoppingList
+from . import cart
+from .models import (
+    Ingredient, Recipe, RecipeIngredient, Favorite, ShoppingList, Tag,
+    ingredients_prefetch
+)
 
 User = get_user_model()
 
+# Начиная с этого числа строк нефильтрованный список показывает оценку
+# из статистики PostgreSQL вместо точного COUNT(*).
+ESTIMATED_COUNT_THRESHOLD = 100000
+
+
+class EstimatedCountPaginator(Paginator):
+    """Пагинатор, не считающий строки больших таблиц целиком."""
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor == 'postgresql' and not queryset.query.where:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT reltuples::bigint FROM pg_class '
+                    'WHERE oid = %s::regclass',
+                    [queryset.model._meta.db_table]
+                )
+                row = cursor.fetchone()
+            if row and row[0] > ESTIMATED_COUNT_THRESHOLD:
+                return row[0]
+        return super().count
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Список без полного подсчёта строк, с оценкой для больших таблиц."""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
 
 @admin.register(User)
-class UserAdmin(admin.ModelAdmin):
+class UserAdmin(LargeTableAdmin):
     list_display = ('username', 'email', 'first_name', 'last_name',
-                    'recipes_count', 'followers_count', 'following_count')
+                    'recipes_link', 'followers_count', 'following_count')
     search_fields = ('username', 'email', 'first_name', 'last_name')
     list_filter = ('is_staff', 'is_active', 'date_joined')
 
-    @admin.display(description='Рецепты')
-    def recipes_count(self, obj):
-        return obj.recipes.count()
-
-    @admin.display(description='Подписчики')
-    def followers_count(self, obj):
-        return obj.followers.count()
-
-    @admin.display(description='Подписки')
-    def following_count(self, obj):
-        return obj.following.count()
+    @admin.display(description='Рецепты', ordering='recipes_count')
+    def recipes_link(self, obj):
+        # Заменяет фильтр по автору в списке рецептов.
+        url = reverse('admin:recipes_recipe_changelist')
+        return format_html(
+            '<a href="{}?author__id__exact={}">{}</a>',
+            url, obj.pk, obj.recipes_count
+        )
 
 
 @admin.register(Ingredient)
@@ -32,32 +69,74 @@ class IngredientAdmin(admin.ModelAdmin):
     list_display = ('name', 'measurement_unit', 'recipes_count')
     search_fields = ('name', 'measurement_unit')
     list_filter = ('measurement_unit',)
+    # Meta.ordering не применяется к запросам с GROUP BY.
+    ordering = ('name',)
 
-    @admin.display(description='Рецепты')
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            recipes_count=Count('ingredient_recipes')
+        )
+
+    @admin.display(description='Рецепты', ordering='recipes_count')
     def recipes_count(self, obj):
-        return obj.recipes.count()
+        return obj.recipes_count
+
+
+@admin.register(Tag)
+class TagAdmin(admin.ModelAdmin):
+    list_display = ('name', 'slug')
+    search_fields = ('name', 'slug')
+    prepopulated_fields = {'slug': ('name',)}
 
 
 class RecipeIngredientInline(admin.TabularInline):
     model = RecipeIngredient
     extra = 1
+    autocomplete_fields = ('ingredient',)
 
 
 @admin.register(Recipe)
-class RecipeAdmin(admin.ModelAdmin):
+class RecipeAdmin(LargeTableAdmin):
     list_display = ('id', 'name', 'cooking_time', 'author',
-                    'favorites_count', 'ingredients_list', 'image_preview')
+                    'favorites_count', 'shopping_carts_count', 'link_clicks',
+                    'ingredients_list', 'image_preview')
     search_fields = ('name', 'author__username')
-    list_filter = ('author',)
+    # Рецепты автора открываются ссылкой из списка пользователей:
+    # фильтр по автору выводил бы всех пользователей на каждой странице.
+    list_filter = ('tags',)
+    autocomplete_fields = ('author',)
+    filter_horizontal = ('tags',)
     inlines = (RecipeIngredientInline,)
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related(
+            ingredients_prefetch()
+        )
+
+    def save_related(self, request, form, formsets, change):
+        # Правка состава в инлайне переносится в итоги корзин.
+        recipe = form.instance
+        before = {}
+        if change:
+            before = {
+                pk: item.amount
+                for pk, item in cart.lock_composition(recipe.pk).items()
+            }
+        super().save_related(request, form, formsets, change)
+        if change:
+            cart.apply_recipe_changes(recipe.pk, cart.composition_changes(
+                before, cart.recipe_amounts([recipe.pk])
+            ))
+
     @admin.display(description='Ингредиенты')
     def ingredients_list(self, obj):
-        ingredients = RecipeIngredient.objects.filter(recipe=obj).select_related('ingredient')
-        return mark_safe('<br>'.join(
-            f'{ri.ingredient.name} ({ri.ingredient.measurement_unit}) — {ri.amount}'
-            for ri in ingredients
-        ))
+        return format_html_join(
+            mark_safe('<br>'), '{} ({}) — {}',
+            (
+                (ri.ingredient.name, ri.ingredient.measurement_unit, ri.amount)
+                for ri in obj.recipe_ingredients.all()
+            )
+        )
 
     @admin.display(description='Изображение')
     def image_preview(self, obj):
@@ -65,24 +144,23 @@ class RecipeAdmin(admin.ModelAdmin):
             return mark_safe(f'<img src="{obj.image.url}" width="50" height="50" />')
         return 'Нет изображения'
 
-    @admin.display(description='В избранном')
-    def favorites_count(self, obj):
-        return obj.favorites.count()
-
 
 @admin.register(Favorite)
-class FavoriteAdmin(admin.ModelAdmin):
+class FavoriteAdmin(LargeTableAdmin):
     list_display = ('user', 'recipe')
     search_fields = ('user__username', 'recipe__name')
+    autocomplete_fields = ('user', 'recipe')
 
 
 @admin.register(ShoppingList)
-class ShoppingListAdmin(admin.ModelAdmin):
+class ShoppingListAdmin(LargeTableAdmin):
     list_display = ('user', 'recipe')
     search_fields = ('user__username', 'recipe__name')
+    autocomplete_fields = ('user', 'recipe')
 
 
 @admin.register(Follow)
-class FollowAdmin(admin.ModelAdmin):
+class FollowAdmin(LargeTableAdmin):
     list_display = ('user', 'author')
     search_fields = ('user__username', 'author__username')
+    autocomplete_fields = ('user', 'author')
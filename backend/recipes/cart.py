@@ -0,0 +1,189 @@
+"""Итоги списка покупок, поддерживаемые при каждом изменении.
+
+В CartItem хранится суммарное количество каждого продукта в корзине
+пользователя, поэтому итоги читаются за O(число продуктов), без
+соединения ShoppingList с RecipeIngredient. Таблица обновляется в той же
+транзакции, что и корзина или состав рецепта; rebuild() сверяет её с
+исходными данными и исправляет расхождения.
+"""
+from itertools import chain, groupby
+from operator import itemgetter
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+from django.db.models.functions import Greatest
+
+from .models import CartItem, Recipe, RecipeIngredient, ShoppingList
+
+User = get_user_model()
+
+REBUILD_BATCH_SIZE = 500
+
+
+def recipe_amounts(recipe_ids):
+    """{ingredient_id: суммарное количество} по рецептам recipe_ids."""
+    return dict(
+        RecipeIngredient.objects
+        .filter(recipe_id__in=recipe_ids)
+        .order_by()
+        .values('ingredient_id')
+        .annotate(total=Sum('amount'))
+        .values_list('ingredient_id', 'total')
+    )
+
+
+def lock_composition(recipe_id):
+    """Состав рецепта {ingredient_id: RecipeIngredient} под блокировкой.
+
+    Вызывается в транзакции до изменения состава: строка рецепта и строки
+    состава блокируются до её конца, поэтому параллельная правка того же
+    рецепта ждёт и считает разницу уже от нового состава.
+    """
+    list(Recipe.objects.select_for_update().filter(pk=recipe_id).values('pk'))
+    return {
+        item.ingredient_id: item
+        for item in RecipeIngredient.objects.select_for_update().filter(
+            recipe_id=recipe_id
+        )
+    }
+
+
+def _apply(users, deltas):
+    """Прибавляет deltas {ingredient_id: количество} к итогам users.
+
+    users — queryset со столбцом cart_user. Положительные изменения
+    вставляются одним upsert (в Django 3.2 его нет в ORM), отрицательные
+    вычитаются одним UPDATE, после чего обнулившиеся строки удаляются.
+    """
+    added = [(pk, amount) for pk, amount in deltas.items() if amount > 0]
+    removed = {pk: -amount for pk, amount in deltas.items() if amount < 0}
+    if added:
+        table = connection.ops.quote_name(CartItem._meta.db_table)
+        users_sql, users_params = users.query.sql_with_params()
+        amounts_sql = ' UNION ALL '.join(
+            ['SELECT %s AS ingredient_id, %s AS amount'] * len(added)
+        )
+        with connection.cursor() as cursor:
+            # WHERE true снимает неоднозначность разбора ON CONFLICT
+            # после SELECT в SQLite.
+            cursor.execute(
+                f'INSERT INTO {table} (user_id, ingredient_id, total_amount) '
+                'SELECT u.cart_user, a.ingredient_id, a.amount '
+                f'FROM ({users_sql}) u CROSS JOIN ({amounts_sql}) a '
+                'WHERE true '
+                'ON CONFLICT (user_id, ingredient_id) DO UPDATE SET '
+                f'total_amount = {table}.total_amount + excluded.total_amount',
+                (*users_params, *chain.from_iterable(added))
+            )
+    if removed:
+        items = CartItem.objects.filter(
+            user_id__in=users, ingredient_id__in=removed
+        )
+        items.update(total_amount=Greatest(
+            F('total_amount') - Case(
+                *(
+                    When(ingredient_id=pk, then=Value(amount))
+                    for pk, amount in removed.items()
+                ),
+                output_field=IntegerField()
+            ),
+            Value(0)
+        ))
+        items.filter(total_amount=0).delete()
+
+
+def _user(user_id):
+    return User.objects.filter(pk=user_id).values(cart_user=F('pk'))
+
+
+def add_recipes(user_id, recipe_ids):
+    """Учитывает рецепты, добавленные в корзину пользователя."""
+    _apply(_user(user_id), recipe_amounts(recipe_ids))
+
+
+def remove_recipes(user_id, recipe_ids):
+    """Вычитает рецепты, убираемые из корзины пользователя.
+
+    Вызывается до удаления строк корзины: при каскадном удалении рецепта
+    его состав ещё на месте.
+    """
+    _apply(_user(user_id), {
+        pk: -amount for pk, amount in recipe_amounts(recipe_ids).items()
+    })
+
+
+def apply_recipe_changes(recipe_id, deltas):
+    """Переносит изменения состава рецепта в корзины, где он лежит."""
+    deltas = {pk: amount for pk, amount in deltas.items() if amount}
+    if deltas:
+        _apply(
+            ShoppingList.objects.filter(recipe_id=recipe_id).values(
+                cart_user=F('user_id')
+            ),
+            deltas
+        )
+
+
+def composition_changes(before, after):
+    """Разница двух составов {ingredient_id: количество}."""
+    return {
+        pk: after.get(pk, 0) - before.get(pk, 0)
+        for pk in before.keys() | after.keys()
+    }
+
+
+def _expected_totals():
+    return (
+        ShoppingList.objects
+        .filter(recipe__recipe_ingredients__isnull=False)
+        .values('user_id', 'recipe__recipe_ingredients__ingredient_id')
+        .annotate(total=Sum('recipe__recipe_ingredients__amount'))
+    )
+
+
+def _fingerprints(rows):
+    return {
+        user_id: hash(tuple((pk, amount) for _, pk, amount in group))
+        for user_id, group in groupby(rows, key=itemgetter(0))
+    }
+
+
+def find_drift():
+    """id пользователей, у которых итоги разошлись с корзиной."""
+    expected = _fingerprints(
+        _expected_totals()
+        .order_by('user_id', 'recipe__recipe_ingredients__ingredient_id')
+        .values_list(
+            'user_id', 'recipe__recipe_ingredients__ingredient_id', 'total'
+        )
+        .iterator()
+    )
+    actual = _fingerprints(
+        CartItem.objects
+        .order_by('user_id', 'ingredient_id')
+        .values_list('user_id', 'ingredient_id', 'total_amount')
+        .iterator()
+    )
+    return sorted(
+        user_id for user_id in expected.keys() | actual.keys()
+        if expected.get(user_id) != actual.get(user_id)
+    )
+
+
+def rebuild(user_ids):
+    """Заполняет итоги пользователей user_ids заново по их корзинам."""
+    table = connection.ops.quote_name(CartItem._meta.db_table)
+    for start in range(0, len(user_ids), REBUILD_BATCH_SIZE):
+        batch = user_ids[start:start + REBUILD_BATCH_SIZE]
+        CartItem.objects.filter(user_id__in=batch).delete()
+        sql, params = (
+            _expected_totals().filter(user_id__in=batch).order_by()
+            .query.sql_with_params()
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} (user_id, ingredient_id, total_amount) '
+                f'{sql}',
+                params
+            )
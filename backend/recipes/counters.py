@@ -0,0 +1,61 @@
+from django.contrib.auth import get_user_model
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from accounts.models import Follow
+from .models import Favorite, Recipe, ShoppingList
+
+User = get_user_model()
+
+
+def increment(model, pk, field, delta=1):
+    """Атомарно изменяет счётчик без чтения строки в Python."""
+    model.objects.filter(pk=pk).update(**{field: F(field) + delta})
+
+
+def _count_subquery(model, field):
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')})
+        .order_by()
+        .values(field)
+        .annotate(total=Count('pk'))
+        .values('total')
+    ), 0)
+
+
+# (модель, счётчик, считаемая модель, её внешний ключ на модель)
+COUNTERS = (
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (Recipe, 'shopping_carts_count', ShoppingList, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'followers_count', Follow, 'author'),
+    (User, 'following_count', Follow, 'user'),
+)
+
+
+def refresh(model, field, pks):
+    """Пересчитывает счётчик field у строк pks одним запросом.
+
+    Нужен после bulk-операций, которые не отправляют сигналы.
+    """
+    for counted_model, counter, related_model, related_field in COUNTERS:
+        if counted_model is model and counter == field:
+            model.objects.filter(pk__in=pks).update(
+                **{field: _count_subquery(related_model, related_field)}
+            )
+            return
+    raise ValueError(f'Неизвестный счётчик {field}.')
+
+
+def recount():
+    """Пересчитывает все счётчики, исправляя только разошедшиеся строки.
+
+    Возвращает словарь {название счётчика: число исправленных строк}.
+    """
+    fixed = {}
+    for model, field, related_model, related_field in COUNTERS:
+        actual = _count_subquery(related_model, related_field)
+        fixed[f'{model._meta.model_name}.{field}'] = (
+            model.objects.exclude(**{field: actual}).update(**{field: actual})
+        )
+    return fixed
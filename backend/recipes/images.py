@@ -0,0 +1,92 @@
+import logging
+import os
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from foodgram.background import BackgroundExecutor
+from PIL import Image, ImageOps, features
+
+from .models import Recipe
+
+logger = logging.getLogger(__name__)
+
+# Наибольшая сторона каждого варианта в пикселях.
+IMAGE_VARIANTS = {
+    'thumbnail': 160,
+    'card': 480,
+    'full': 1200,
+}
+
+executor = BackgroundExecutor('recipe-images', 'IMAGE_WORKERS')
+
+
+def schedule_image_variants(recipe):
+    """Ставит нарезку вариантов изображения в очередь после коммита."""
+    recipe_id, image_name = recipe.pk, recipe.image.name
+    transaction.on_commit(
+        lambda: executor.submit(
+            build_image_variants, recipe_id, image_name
+        )
+    )
+
+
+def discard_image_variants(variants):
+    """Удаляет файлы вариантов после коммита транзакции."""
+    names = list(variants.values())
+    if names:
+        transaction.on_commit(lambda: _delete_files(names))
+
+
+def _delete_files(names):
+    for name in names:
+        try:
+            default_storage.delete(name)
+        except OSError:
+            logger.warning('Не удалось удалить вариант изображения %s', name)
+
+
+def _variant_format():
+    if features.check('webp'):
+        return 'WEBP', 'webp'
+    return 'JPEG', 'jpg'
+
+
+def build_image_variants(recipe_id, image_name):
+    image_format, extension = _variant_format()
+    stem = os.path.splitext(os.path.basename(image_name))[0]
+    try:
+        with default_storage.open(image_name) as source:
+            with Image.open(source) as original:
+                image = ImageOps.exif_transpose(original).convert('RGB')
+        variants = {}
+        for name, size in IMAGE_VARIANTS.items():
+            variant = image.copy()
+            variant.thumbnail((size, size), Image.LANCZOS)
+            buffer = BytesIO()
+            variant.save(buffer, image_format, quality=80)
+            variants[name] = default_storage.save(
+                f'recipes/variants/{stem}_{name}.{extension}',
+                ContentFile(buffer.getvalue())
+            )
+        # Пока шла обработка, автор мог загрузить новое изображение.
+        # Строка блокируется, как и при замене изображения: варианты
+        # либо достанутся рецепту и будут удалены при замене, либо
+        # сразу удаляются здесь.
+        with transaction.atomic():
+            recipe = Recipe.objects.select_for_update().filter(
+                pk=recipe_id, image=image_name
+            ).first()
+            if recipe is not None:
+                recipe.image_variants = variants
+                recipe.save(update_fields=['image_variants', 'updated_at'])
+        if recipe is None:
+            _delete_files(variants.values())
+    except Exception:
+        logger.exception(
+            'Не удалось обработать изображение %s рецепта %s',
+            image_name, recipe_id
+        )
+    finally:
+        close_old_connections()
@@ -0,0 +1,242 @@
+"""Потоковый импорт справочника продуктов.
+
+Файл читается порциями, поэтому расход памяти не зависит от его размера.
+Ключом записи считается название продукта: если продукт с таким названием
+уже есть, но с другой единицей измерения, единица обновляется.
+"""
+import csv
+import io
+import json
+import re
+from itertools import islice
+
+from django.db import connection, transaction
+
+from .ingredient_index import ingredient_index
+from .models import Ingredient
+
+READ_CHUNK_SIZE = 64 * 1024
+CSV_HEADER = ('name', 'measurement_unit')
+# Хвост, на котором число обрывается посередине: '1.' или '1e-'.
+# raw_decode принимает начало такого числа как целое число.
+NUMBER_TAIL = re.compile(r'(?:\.|[eE][-+]?)\Z')
+
+
+def iter_json_array(f, chunk_size=READ_CHUNK_SIZE):
+    """Элементы JSON-массива верхнего уровня без загрузки файла целиком."""
+    decoder = json.JSONDecoder()
+    buffer = f.read(chunk_size)
+    pos = 0
+    eof = not buffer
+    expect_value = True
+    after_comma = False
+    started = False
+    while True:
+        while pos < len(buffer) and buffer[pos].isspace():
+            pos += 1
+        if pos == len(buffer):
+            if eof:
+                raise ValueError('Неожиданный конец JSON-файла.')
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            continue
+        char = buffer[pos]
+        if not started:
+            if char != '[':
+                raise ValueError('Ожидался JSON-массив.')
+            started = True
+            pos += 1
+        elif char == ']':
+            if after_comma:
+                raise ValueError('Лишняя запятая перед концом массива.')
+            return
+        elif not expect_value:
+            if char != ',':
+                raise ValueError(f'Ожидалась запятая, получено {char!r}.')
+            expect_value = after_comma = True
+            pos += 1
+        else:
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                end = None
+            # Значение, упёршееся в конец буфера, могло быть обрезано.
+            if end is None or not eof and (
+                end == len(buffer)
+                or isinstance(item, (int, float))
+                and NUMBER_TAIL.match(buffer, end)
+            ):
+                chunk = f.read(chunk_size)
+                eof = not chunk
+                buffer = buffer[pos:] + chunk
+                pos = 0
+                continue
+            yield item
+            pos = end
+            expect_value = after_comma = False
+
+
+def read_json(f):
+    for item in iter_json_array(f):
+        if isinstance(item, dict):
+            yield item.get('name'), item.get('measurement_unit')
+        else:
+            yield None, None
+
+
+def read_csv(f):
+    for i, row in enumerate(csv.reader(f)):
+        if i == 0 and tuple(value.strip() for value in row) == CSV_HEADER:
+            continue
+        if len(row) == 2:
+            yield row[0], row[1]
+        elif row:
+            yield None, None
+
+
+READERS = {
+    'json': read_json,
+    'csv': read_csv,
+}
+
+
+def clean_rows(rows):
+    """Нормализует пары (название, единица); некорректные заменяет на None."""
+    name_length = Ingredient._meta.get_field('name').max_length
+    unit_length = Ingredient._meta.get_field('measurement_unit').max_length
+    for name, unit in rows:
+        if isinstance(name, str) and isinstance(unit, str):
+            name, unit = name.strip(), unit.strip()
+            if (
+                0 < len(name) <= name_length
+                and 0 < len(unit) <= unit_length
+            ):
+                yield name, unit
+                continue
+        yield None
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+class IngredientImporter:
+    """Upsert продуктов пачками с подсчётом вставленных и обновлённых.
+
+    Вызывающий код отвечает за транзакцию: импорт должен выполняться
+    внутри transaction.atomic, чтобы при ошибке не остался частичный
+    результат.
+    """
+
+    def __init__(self, batch_size=5000):
+        self.batch_size = batch_size
+        self.total = 0
+        self.inserted = 0
+        self.updated = 0
+
+    @property
+    def skipped(self):
+        return self.total - self.inserted - self.updated
+
+    def run(self, rows):
+        if connection.vendor == 'postgresql':
+            self._run_copy(rows)
+        else:
+            self._run_batches(rows)
+        # bulk-операции и COPY не отправляют сигналов.
+        if self.inserted or self.updated:
+            transaction.on_commit(ingredient_index.invalidate)
+        return self
+
+    def _run_batches(self, rows):
+        # В Django 3.2 у bulk_create нет update_conflicts, поэтому
+        # существующие записи пачки выбираются одним запросом,
+        # а вставки и обновления выполняются bulk-операциями.
+        for batch in batched(clean_rows(rows), self.batch_size):
+            self.total += len(batch)
+            incoming = dict(row for row in batch if row is not None)
+            existing = {}
+            for pk, name, unit in (
+                Ingredient.objects
+                .filter(name__in=incoming)
+                .order_by('-id')
+                .values_list('id', 'name', 'measurement_unit')
+            ):
+                units, _ = existing.get(name, (set(), None))
+                units.add(unit)
+                existing[name] = (units, pk)
+            to_create = []
+            to_update = []
+            for name, unit in incoming.items():
+                if name not in existing:
+                    to_create.append(
+                        Ingredient(name=name, measurement_unit=unit)
+                    )
+                    continue
+                units, pk = existing[name]
+                if unit not in units:
+                    to_update.append(
+                        Ingredient(id=pk, name=name, measurement_unit=unit)
+                    )
+            Ingredient.objects.bulk_create(to_create)
+            Ingredient.objects.bulk_update(to_update, ['measurement_unit'])
+            self.inserted += len(to_create)
+            self.updated += len(to_update)
+
+    def _run_copy(self, rows):
+        table = connection.ops.quote_name(Ingredient._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE TEMP TABLE ingredient_import ('
+                'line bigint, name text, measurement_unit text'
+                ') ON COMMIT DROP'
+            )
+            for batch in batched(clean_rows(rows), self.batch_size):
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                for row in batch:
+                    self.total += 1
+                    if row is not None:
+                        writer.writerow((self.total, *row))
+                buffer.seek(0)
+                cursor.copy_expert(
+                    'COPY ingredient_import (line, name, measurement_unit) '
+                    'FROM STDIN WITH (FORMAT csv)',
+                    buffer
+                )
+            # Из повторов одного названия в файле побеждает последний.
+            cursor.execute(
+                'CREATE TEMP TABLE ingredient_import_latest ON COMMIT DROP AS '
+                'SELECT DISTINCT ON (name) name, measurement_unit '
+                'FROM ingredient_import ORDER BY name, line DESC'
+            )
+            cursor.execute('ANALYZE ingredient_import_latest')
+            cursor.execute(
+                f'UPDATE {table} AS i '
+                'SET measurement_unit = l.measurement_unit '
+                'FROM ingredient_import_latest AS l '
+                'WHERE i.id = ('
+                f'SELECT min(id) FROM {table} WHERE name = l.name) '
+                'AND NOT EXISTS ('
+                f'SELECT 1 FROM {table} AS e '
+                'WHERE e.name = l.name '
+                'AND e.measurement_unit = l.measurement_unit)'
+            )
+            self.updated += cursor.rowcount
+            cursor.execute(
+                f'INSERT INTO {table} (name, measurement_unit) '
+                'SELECT l.name, l.measurement_unit '
+                'FROM ingredient_import_latest AS l '
+                f'WHERE NOT EXISTS (SELECT 1 FROM {table} AS e '
+                'WHERE e.name = l.name)'
+            )
+            self.inserted += cursor.rowcount
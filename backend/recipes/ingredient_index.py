@@ -0,0 +1,102 @@
+import bisect
+import hashlib
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+from .models import Ingredient
+
+
+class IngredientIndex:
+    """Индекс названий продуктов в памяти процесса для автодополнения.
+
+    Строится лениво одним запросом и сбрасывается сигналами при изменении
+    продуктов. Изменения, сделанные другими процессами, подхватываются
+    по истечении ttl секунд.
+    """
+
+    def __init__(self, ttl=None):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._data = None
+
+    def invalidate(self):
+        self._data = None
+
+    def _build(self):
+        # Индекс живёт дольше запроса, поэтому не строится по реплике,
+        # которая может ещё не получить изменения справочника.
+        rows = sorted(
+            (name.lower(), pk, name, unit)
+            for pk, name, unit in Ingredient.objects.using(
+                DEFAULT_DB_ALIAS
+            ).values_list(
+                'id', 'name', 'measurement_unit'
+            )
+        )
+        keys = [row[0] for row in rows]
+        items = [
+            {'id': pk, 'name': name, 'measurement_unit': unit}
+            for _, pk, name, unit in rows
+        ]
+        offsets = []
+        offset = 0
+        for key in keys:
+            offsets.append(offset)
+            offset += len(key) + 1
+        haystack = '\n'.join(keys)
+        version = hashlib.md5(repr(rows).encode('utf-8')).hexdigest()
+        return keys, items, offsets, haystack, version, time.monotonic()
+
+    def _is_fresh(self, data):
+        ttl = self.ttl
+        if ttl is None:
+            ttl = settings.INGREDIENT_INDEX_TTL
+        return data is not None and time.monotonic() - data[-1] <= ttl
+
+    def is_fresh(self):
+        """Можно ли искать без обращения к базе."""
+        return self._is_fresh(self._data)
+
+    def _get_data(self):
+        data = self._data
+        if not self._is_fresh(data):
+            with self._lock:
+                data = self._data
+                if not self._is_fresh(data):
+                    data = self._data = self._build()
+        return data
+
+    def version(self):
+        """Хеш содержимого индекса; меняется вместе со справочником."""
+        return self._get_data()[4]
+
+    def search(self, query):
+        """Продукты, в названии которых встречается query.
+
+        Сначала идут совпадения по началу названия в алфавитном порядке,
+        затем остальные вхождения по позиции подстроки.
+        """
+        keys, items, offsets, haystack, _, _ = self._get_data()
+        query = query.strip().lower()
+        if not query:
+            return list(items)
+        start = bisect.bisect_left(keys, query)
+        end = bisect.bisect_right(keys, query + '\U0010ffff', lo=start)
+        # Поиск подстроки идёт по всем названиям, склеенным в одну строку,
+        # чтобы перебор выполнялся в C, а не в цикле Python.
+        positions = {}
+        for match in re.finditer(re.escape(query), haystack):
+            i = bisect.bisect_right(offsets, match.start()) - 1
+            if i not in positions:
+                positions[i] = match.start() - offsets[i]
+        substring_matches = sorted(
+            (position, i) for i, position in positions.items() if position
+        )
+        return items[start:end] + [items[i] for _, i in substring_matches]
+
+
+ingredient_index = IngredientIndex()
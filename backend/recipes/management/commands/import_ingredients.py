@@ -1,29 +1,50 @@
-import json
-from django.core.management.base import BaseCommand
-from recipes.models import Ingredient
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from api.cache import INGREDIENTS, RECIPES, bump_generation_on_commit
+from recipes.importers import READERS, IngredientImporter
+
 
 class Command(BaseCommand):
-    help = 'Импорт ингредиентов из JSON-файла'
+    help = 'Импорт ингредиентов из JSON- или CSV-файла'
 
     def add_arguments(self, parser):
-        parser.add_argument('json_path', type=str, help='Путь к JSON-файлу с ингредиентами')
+        parser.add_argument(
+            'path', type=str, help='Путь к JSON- или CSV-файлу с ингредиентами'
+        )
+        parser.add_argument(
+            '--format', choices=sorted(READERS),
+            help='Формат файла; по умолчанию определяется по расширению'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='Число записей в одной пачке'
+        )
 
     def handle(self, *args, **options):
-        json_path = options['json_path']
-        try:
-            with open(json_path, encoding='utf-8') as f:
-                Ingredient.objects.bulk_create(
-                    (
-                        Ingredient(**item)
-                        for item in json.load(f)
-                    ),
-                    ignore_conflicts=True
+        path = options['path']
+        file_format = options['format']
+        if file_format is None:
+            file_format = os.path.splitext(path)[1].lstrip('.').lower()
+            if file_format not in READERS:
+                raise CommandError(
+                    f'Не удалось определить формат файла {path}, '
+                    'укажите --format.'
                 )
-            total = Ingredient.objects.count()
-            self.stdout.write(
-                self.style.SUCCESS(f'Ингредиенты успешно импортированы из {json_path}. Всего в базе: {total}.')
-            )
-        except Exception as e:
-            self.stderr.write(
-                self.style.ERROR(f'Ошибка при импорте из {json_path}: {e}')
-            )
+        importer = IngredientImporter(batch_size=options['batch_size'])
+        try:
+            with open(path, encoding='utf-8', newline='') as f:
+                with transaction.atomic():
+                    importer.run(READERS[file_format](f))
+                    if importer.inserted or importer.updated:
+                        bump_generation_on_commit(INGREDIENTS, RECIPES)
+        except (OSError, ValueError) as e:
+            raise CommandError(f'Ошибка при импорте из {path}: {e}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Ингредиенты импортированы из {path}. '
+            f'Добавлено: {importer.inserted}, '
+            f'обновлено: {importer.updated}, '
+            f'пропущено: {importer.skipped}.'
+        ))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from recipes.cart import find_drift, rebuild
+
+
+class Command(BaseCommand):
+    help = 'Сверка итогов списков покупок с корзинами и их исправление'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Только найти расхождения, ничего не меняя'
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            user_ids = find_drift()
+            if user_ids and not options['check']:
+                rebuild(user_ids)
+        if not user_ids:
+            self.stdout.write(self.style.SUCCESS('Расхождений нет.'))
+        elif options['check']:
+            raise CommandError(
+                f'Итоги разошлись у пользователей: {len(user_ids)}.'
+            )
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f'Итоги пересобраны у пользователей: {len(user_ids)}.'
+            ))
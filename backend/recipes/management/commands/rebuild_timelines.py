@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from recipes.timeline import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Заполнение лент подписок заново по текущим подпискам'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            users = rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Ленты подписок пересобраны для пользователей: {users}.'
+        ))
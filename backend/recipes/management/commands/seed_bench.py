@@ -0,0 +1,238 @@
+import random
+from datetime import timedelta
+from itertools import accumulate
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from accounts.models import Follow
+from recipes import cart, timeline
+from recipes.counters import recount
+from recipes.models import (
+    Favorite, Ingredient, Recipe, RecipeIngredient, ShoppingList, Tag
+)
+
+User = get_user_model()
+
+
+def zipf_weights(size, exponent):
+    """Накопленные веса распределения Ципфа для random.choices."""
+    return list(accumulate(
+        1 / rank ** exponent for rank in range(1, size + 1)
+    ))
+
+
+class Command(BaseCommand):
+    help = 'Генерация синтетических данных для нагрузочных замеров'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument(
+            '--ingredients-per-recipe', type=int, default=8,
+            help='Число продуктов в каждом рецепте'
+        )
+        parser.add_argument(
+            '--favorites', type=int, default=20,
+            help='Среднее число избранных рецептов на пользователя'
+        )
+        parser.add_argument(
+            '--carts', type=int, default=5,
+            help='Среднее число рецептов в списке покупок пользователя'
+        )
+        parser.add_argument(
+            '--follows', type=int, default=10,
+            help='Среднее число подписок пользователя'
+        )
+        parser.add_argument(
+            '--skew', type=float, default=1.1,
+            help='Показатель распределения Ципфа для популярности'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--prefix', default='bench')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        skew = options['skew']
+        with transaction.atomic():
+            ingredient_ids = self.ensure_ingredients(options['prefix'])
+            user_ids = self.create_users(options['users'], options['prefix'])
+            recipe_ids = self.create_recipes(
+                options['recipes'], user_ids, options['prefix'], skew
+            )
+            self.create_recipe_ingredients(
+                recipe_ids, ingredient_ids, options['ingredients_per_recipe']
+            )
+            self.create_recipe_tags(
+                recipe_ids, self.ensure_tags(options['prefix'])
+            )
+            self.create_relations(
+                Favorite, user_ids, recipe_ids, options['favorites'], skew
+            )
+            self.create_relations(
+                ShoppingList, user_ids, recipe_ids, options['carts'], skew
+            )
+            self.create_follows(user_ids, options['follows'], skew)
+            recount()
+            timeline.rebuild()
+            cart.rebuild(cart.find_drift())
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано пользователей: {len(user_ids)}, '
+            f'рецептов: {len(recipe_ids)}.'
+        ))
+
+    def ensure_ingredients(self, prefix):
+        if not Ingredient.objects.exists():
+            Ingredient.objects.bulk_create(
+                (
+                    Ingredient(
+                        name=f'{prefix} продукт {i}', measurement_unit='г'
+                    )
+                    for i in range(2000)
+                ),
+                batch_size=self.batch_size
+            )
+        return list(Ingredient.objects.values_list('id', flat=True))
+
+    def ensure_tags(self, prefix):
+        if not Tag.objects.exists():
+            Tag.objects.bulk_create(
+                Tag(name=f'{prefix} тег {i}', slug=f'{prefix}-tag-{i}')
+                for i in range(8)
+            )
+        return list(Tag.objects.values_list('id', flat=True))
+
+    def create_users(self, count, prefix):
+        # Хеш пароля дорогой, поэтому считается один раз на всех.
+        password = make_password(prefix)
+        User.objects.bulk_create(
+            (
+                User(
+                    username=f'{prefix}_user_{i}',
+                    email=f'{prefix}_user_{i}@example.com',
+                    first_name='Bench',
+                    last_name=str(i),
+                    password=password,
+                )
+                for i in range(count)
+            ),
+            batch_size=self.batch_size
+        )
+        # В Django 3.2 bulk_create возвращает id только на PostgreSQL.
+        return list(
+            User.objects.filter(username__startswith=f'{prefix}_user_')
+            .order_by('id')
+            .values_list('id', flat=True)
+        )
+
+    def create_recipes(self, count, user_ids, prefix, skew):
+        authors = self.rng.choices(
+            user_ids, cum_weights=zipf_weights(len(user_ids), skew), k=count
+        )
+        Recipe.objects.bulk_create(
+            (
+                Recipe(
+                    author_id=author_id,
+                    name=f'{prefix} рецепт {i}',
+                    image='recipes/bench.png',
+                    text='Синтетический рецепт для нагрузочных замеров.',
+                    cooking_time=self.rng.randint(5, 180),
+                )
+                for i, author_id in enumerate(authors)
+            ),
+            batch_size=self.batch_size
+        )
+        recipes = list(
+            Recipe.objects.filter(name__startswith=f'{prefix} рецепт ')
+            .only('id')
+            .order_by('id')
+        )
+        # auto_now_add проставляет всем одинаковое время, а ленте
+        # и курсорной пагинации нужен разброс дат публикации.
+        now = timezone.now()
+        for recipe in recipes:
+            recipe.pub_date = now - timedelta(
+                minutes=self.rng.randint(0, 60 * 24 * 365)
+            )
+        Recipe.objects.bulk_update(
+            recipes, ['pub_date'], batch_size=self.batch_size
+        )
+        return [recipe.id for recipe in recipes]
+
+    def create_recipe_ingredients(self, recipe_ids, ingredient_ids, count):
+        count = min(count, len(ingredient_ids))
+        RecipeIngredient.objects.bulk_create(
+            (
+                RecipeIngredient(
+                    recipe_id=recipe_id,
+                    ingredient_id=ingredient_id,
+                    amount=self.rng.randint(1, 500),
+                )
+                for recipe_id in recipe_ids
+                for ingredient_id in self.rng.sample(ingredient_ids, count)
+            ),
+            batch_size=self.batch_size,
+            ignore_conflicts=True
+        )
+
+    def create_recipe_tags(self, recipe_ids, tag_ids):
+        through = Recipe.tags.through
+        through.objects.bulk_create(
+            (
+                through(recipe_id=recipe_id, tag_id=tag_id)
+                for recipe_id in recipe_ids
+                for tag_id in self.rng.sample(
+                    tag_ids, self.rng.randint(1, min(3, len(tag_ids)))
+                )
+            ),
+            batch_size=self.batch_size,
+            ignore_conflicts=True
+        )
+
+    def popular_picks(self, user_ids, population, average, skew):
+        """Пары (пользователь, цель) с популярностью целей по Ципфу.
+
+        Число целей у каждого пользователя случайно, в среднем average.
+        """
+        if not population or not average:
+            return
+        weights = zipf_weights(len(population), skew)
+        ranked = population[:]
+        self.rng.shuffle(ranked)
+        for user_id in user_ids:
+            targets = self.rng.choices(
+                ranked, cum_weights=weights,
+                k=self.rng.randint(0, 2 * average)
+            )
+            for target_id in set(targets):
+                yield user_id, target_id
+
+    def create_relations(self, model, user_ids, recipe_ids, average, skew):
+        model.objects.bulk_create(
+            (
+                model(user_id=user_id, recipe_id=recipe_id)
+                for user_id, recipe_id in self.popular_picks(
+                    user_ids, recipe_ids, average, skew
+                )
+            ),
+            batch_size=self.batch_size,
+            ignore_conflicts=True
+        )
+
+    def create_follows(self, user_ids, average, skew):
+        Follow.objects.bulk_create(
+            (
+                Follow(user_id=user_id, author_id=author_id)
+                for user_id, author_id in self.popular_picks(
+                    user_ids, user_ids, average, skew
+                )
+                if author_id != user_id
+            ),
+            batch_size=self.batch_size,
+            ignore_conflicts=True
+        )
@@ -1,6 +1,7 @@
-# Generated by Django 3.2.3 on 2025-05-15 18:14
+# Generated by Django 3.2.3 on 2026-10-18 17:21
 
 from django.conf import settings
+import django.core.validators
 from django.db import migrations, models
 import django.db.models.deletion
 
@@ -15,28 +16,22 @@ class Migration(migrations.Migration):
 
     operations = [
         migrations.CreateModel(
-            name='Dish',
+            name='Favorite',
             fields=[
                 ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
-                ('title', models.CharField(max_length=200, verbose_name='Название')),
-                ('image', models.ImageField(upload_to='dishes/', verbose_name='Картинка')),
-                ('description', models.TextField(verbose_name='Описание')),
-                ('cook_time', models.PositiveIntegerField(verbose_name='Время приготовления (мин)')),
-                ('pub_date', models.DateTimeField(auto_now_add=True, verbose_name='Дата публикации')),
-                ('creator', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recipe_creators', to=settings.AUTH_USER_MODEL, verbose_name='Создатель')),
             ],
             options={
-                'verbose_name': 'Блюдо',
-                'verbose_name_plural': 'Блюда',
-                'ordering': ['-pub_date'],
+                'verbose_name': 'Избранное',
+                'verbose_name_plural': 'Избранное',
+                'abstract': False,
             },
         ),
         migrations.CreateModel(
-            name='Product',
+            name='Ingredient',
             fields=[
                 ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
-                ('name', models.CharField(max_length=200, verbose_name='Название')),
-                ('unit', models.CharField(max_length=50, verbose_name='Единица измерения')),
+                ('name', models.CharField(max_length=128, verbose_name='Название')),
+                ('measurement_unit', models.CharField(max_length=64, verbose_name='Единица измерения')),
             ],
             options={
                 'verbose_name': 'Продукт',
@@ -45,48 +40,77 @@ class Migration(migrations.Migration):
             },
         ),
         migrations.CreateModel(
-            name='DishProduct',
+            name='Recipe',
             fields=[
                 ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
-                ('amount', models.PositiveIntegerField(verbose_name='Количество')),
-                ('dish', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='recipes.dish')),
-                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='recipes.product')),
+                ('name', models.CharField(max_length=256, verbose_name='Название')),
+                ('image', models.ImageField(upload_to='recipes/', verbose_name='Картинка')),
+                ('text', models.TextField(verbose_name='Описание')),
+                ('cooking_time', models.PositiveSmallIntegerField(validators=[django.core.validators.MinValueValidator(1)], verbose_name='Время приготовления (в минутах)')),
+                ('pub_date', models.DateTimeField(auto_now_add=True, verbose_name='Дата публикации')),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recipes', to=settings.AUTH_USER_MODEL, verbose_name='Автор')),
             ],
             options={
-                'verbose_name': 'Ингредиент блюда',
-                'verbose_name_plural': 'Ингредиенты блюда',
-                'unique_together': {('dish', 'product')},
+                'verbose_name': 'Блюдо',
+                'verbose_name_plural': 'Блюда',
+                'ordering': ['-pub_date'],
             },
         ),
-        migrations.AddField(
-            model_name='dish',
-            name='products',
-            field=models.ManyToManyField(through='recipes.DishProduct', to='recipes.Product', verbose_name='Ингредиенты'),
-        ),
         migrations.CreateModel(
             name='ShoppingList',
             fields=[
                 ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
-                ('dish', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='in_shopping_lists', to='recipes.dish', verbose_name='Блюдо')),
-                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_lists', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shoppinglist_recipe_relations', to='recipes.recipe', verbose_name='Блюдо')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shoppinglist_user_relations', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
             ],
             options={
                 'verbose_name': 'Список покупок',
                 'verbose_name_plural': 'Списки покупок',
-                'unique_together': {('user', 'dish')},
+                'abstract': False,
             },
         ),
         migrations.CreateModel(
-            name='Bookmark',
+            name='RecipeIngredient',
             fields=[
                 ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
-                ('dish', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='in_bookmarks', to='recipes.dish', verbose_name='Блюдо')),
-                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bookmarks', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+                ('amount', models.PositiveSmallIntegerField(validators=[django.core.validators.MinValueValidator(1)], verbose_name='Количество')),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ingredient_recipes', to='recipes.ingredient', verbose_name='Продукт')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recipe_ingredients', to='recipes.recipe', verbose_name='Блюдо')),
             ],
             options={
-                'verbose_name': 'Избранное',
-                'verbose_name_plural': 'Избранное',
-                'unique_together': {('user', 'dish')},
+                'verbose_name': 'Продукт блюда',
+                'verbose_name_plural': 'Продукты блюда',
             },
         ),
+        migrations.AddField(
+            model_name='recipe',
+            name='ingredients',
+            field=models.ManyToManyField(related_name='recipes', through='recipes.RecipeIngredient', to='recipes.Ingredient', verbose_name='Ингредиенты'),
+        ),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='unique_ingredient'),
+        ),
+        migrations.AddField(
+            model_name='favorite',
+            name='recipe',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='favorite_recipe_relations', to='recipes.recipe', verbose_name='Блюдо'),
+        ),
+        migrations.AddField(
+            model_name='favorite',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='favorite_user_relations', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь'),
+        ),
+        migrations.AddConstraint(
+            model_name='shoppinglist',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique_user_recipe_shoppinglist'),
+        ),
+        migrations.AddConstraint(
+            model_name='recipeingredient',
+            constraint=models.UniqueConstraint(fields=('recipe', 'ingredient'), name='unique_ingredient_in_recipe'),
+        ),
+        migrations.AddConstraint(
+            model_name='favorite',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique_user_recipe_favorite'),
+        ),
     ]
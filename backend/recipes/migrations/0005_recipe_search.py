@@ -0,0 +1,22 @@
+# Generated by Django 3.2.3 on 2026-10-18 17:35
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+from ._search_index import create_search_index, drop_search_index
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0004_recipe_image_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 3.2.3 on 2026-10-18 17:52
+
+from django.db import migrations, models
+
+from ._search_index import restore_sqlite_triggers
+
+
+def fill_updated_at(apps, schema_editor):
+    # Для существующих рецептов точное время изменения неизвестно.
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Recipe.objects.update(updated_at=models.F('pub_date'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_timelineentry'),
+    ]
+
+    # На SQLite AddField пересоздаёт recipes_recipe вместе с триггерами
+    # полнотекстового поиска, см. _search_index.
+    operations = [
+        migrations.RunPython(
+            migrations.RunPython.noop, restore_sqlite_triggers
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='Дата изменения'),
+        ),
+        migrations.RunPython(fill_updated_at, migrations.RunPython.noop),
+        migrations.RunPython(
+            restore_sqlite_triggers, migrations.RunPython.noop
+        ),
+    ]
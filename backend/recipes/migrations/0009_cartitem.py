@@ -0,0 +1,42 @@
+# Generated by Django 3.2.3 on 2026-10-18 17:58
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+FILL_CART_ITEMS = (
+    'INSERT INTO recipes_cartitem (user_id, ingredient_id, total_amount) '
+    'SELECT s.user_id, ri.ingredient_id, SUM(ri.amount) '
+    'FROM recipes_shoppinglist s '
+    'JOIN recipes_recipeingredient ri ON ri.recipe_id = s.recipe_id '
+    'GROUP BY s.user_id, ri.ingredient_id'
+)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0008_recipe_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CartItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_amount', models.PositiveIntegerField(verbose_name='Количество')),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cart_items', to='recipes.ingredient', verbose_name='Продукт')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cart_items', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Продукт в списке покупок',
+                'verbose_name_plural': 'Продукты в списках покупок',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='cartitem',
+            constraint=models.UniqueConstraint(fields=('user', 'ingredient'), name='unique_cart_item'),
+        ),
+        migrations.RunSQL(FILL_CART_ITEMS, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 3.2.3 on 2026-10-18 18:04
+
+from django.db import migrations, models
+
+from ._search_index import restore_sqlite_triggers
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_cartitem'),
+    ]
+
+    # На SQLite AddField пересоздаёт recipes_recipe вместе с триггерами
+    # полнотекстового поиска, см. _search_index.
+    operations = [
+        migrations.RunPython(
+            migrations.RunPython.noop, restore_sqlite_triggers
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='link_clicks',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Переходы по короткой ссылке'),
+        ),
+        migrations.RunPython(
+            restore_sqlite_triggers, migrations.RunPython.noop
+        ),
+    ]
@@ -0,0 +1,116 @@
+"""Полнотекстовый индекс рецептов для миграций.
+
+На SQLite индекс — таблица FTS5, которую синхронизируют триггеры на
+recipes_recipe. SQLite не умеет менять столбцы на месте, поэтому
+AddField, AlterField и RemoveField пересоздают таблицу и теряют её
+триггеры. Каждая такая миграция вызывает restore_sqlite_triggers после
+пересоздания, а для отката — ещё и перед ним, первой операцией:
+
+    migrations.RunPython(migrations.RunPython.noop, restore_sqlite_triggers),
+    migrations.AddField(...),
+    migrations.RunPython(restore_sqlite_triggers, migrations.RunPython.noop),
+"""
+
+POSTGRESQL_FORWARD = (
+    """
+    CREATE FUNCTION recipes_recipe_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('russian', coalesce(NEW.name, '')), 'A')
+            || setweight(to_tsvector('russian', coalesce(NEW.text, '')), 'B');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER recipes_recipe_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF name, text ON recipes_recipe
+    FOR EACH ROW EXECUTE PROCEDURE recipes_recipe_search_vector_update()
+    """,
+    # Пустое обновление запускает триггер для уже существующих строк.
+    'UPDATE recipes_recipe SET name = name',
+    'CREATE INDEX recipe_search_vector_idx ON recipes_recipe '
+    'USING gin (search_vector)',
+)
+POSTGRESQL_BACKWARD = (
+    'DROP INDEX IF EXISTS recipe_search_vector_idx',
+    'DROP TRIGGER IF EXISTS recipes_recipe_search_vector_trigger '
+    'ON recipes_recipe',
+    'DROP FUNCTION IF EXISTS recipes_recipe_search_vector_update()',
+)
+
+SQLITE_TABLE = """
+    CREATE VIRTUAL TABLE recipes_recipe_fts USING fts5(
+        name, text, content='recipes_recipe', content_rowid='id'
+    )
+"""
+SQLITE_TRIGGERS = (
+    """
+    CREATE TRIGGER recipes_recipe_fts_insert AFTER INSERT ON recipes_recipe
+    BEGIN
+        INSERT INTO recipes_recipe_fts (rowid, name, text)
+        VALUES (new.id, new.name, new.text);
+    END
+    """,
+    """
+    CREATE TRIGGER recipes_recipe_fts_delete AFTER DELETE ON recipes_recipe
+    BEGIN
+        INSERT INTO recipes_recipe_fts (recipes_recipe_fts, rowid, name, text)
+        VALUES ('delete', old.id, old.name, old.text);
+    END
+    """,
+    """
+    CREATE TRIGGER recipes_recipe_fts_update
+    AFTER UPDATE OF name, text ON recipes_recipe
+    BEGIN
+        INSERT INTO recipes_recipe_fts (recipes_recipe_fts, rowid, name, text)
+        VALUES ('delete', old.id, old.name, old.text);
+        INSERT INTO recipes_recipe_fts (rowid, name, text)
+        VALUES (new.id, new.name, new.text);
+    END
+    """,
+)
+SQLITE_DROP_TRIGGERS = (
+    'DROP TRIGGER IF EXISTS recipes_recipe_fts_insert',
+    'DROP TRIGGER IF EXISTS recipes_recipe_fts_delete',
+    'DROP TRIGGER IF EXISTS recipes_recipe_fts_update',
+)
+SQLITE_REBUILD = (
+    "INSERT INTO recipes_recipe_fts (recipes_recipe_fts) VALUES ('rebuild')",
+)
+SQLITE_FORWARD = (SQLITE_TABLE, *SQLITE_TRIGGERS, *SQLITE_REBUILD)
+SQLITE_BACKWARD = (
+    *SQLITE_DROP_TRIGGERS,
+    'DROP TABLE IF EXISTS recipes_recipe_fts',
+)
+
+STATEMENTS = {
+    'postgresql': (POSTGRESQL_FORWARD, POSTGRESQL_BACKWARD),
+    'sqlite': (SQLITE_FORWARD, SQLITE_BACKWARD),
+}
+
+
+def _run(schema_editor, direction):
+    statements = STATEMENTS.get(schema_editor.connection.vendor)
+    if statements:
+        for sql in statements[direction]:
+            schema_editor.execute(sql, params=None)
+
+
+def create_search_index(apps, schema_editor):
+    _run(schema_editor, 0)
+
+
+def drop_search_index(apps, schema_editor):
+    _run(schema_editor, 1)
+
+
+def restore_sqlite_triggers(apps, schema_editor):
+    """Пересоздаёт триггеры FTS5 и заново индексирует рецепты.
+
+    Строки, изменённые без триггеров, попадают в индекс при rebuild.
+    """
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in (*SQLITE_DROP_TRIGGERS, *SQLITE_TRIGGERS, *SQLITE_REBUILD):
+        schema_editor.execute(sql, params=None)
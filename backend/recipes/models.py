@@ -1,4 +1,8 @@
-from django.db import models
+from django.contrib.postgres.search import (
+    SearchQuery, SearchRank, SearchVectorField
+)
+from django.db import connections, models
+from django.db.models.functions import RowNumber
 from django.core.validators import MinValueValidator
 from django.conf import settings
 
@@ -22,6 +26,129 @@ class Ingredient(models.Model):
         return f'{self.name} ({self.measurement_unit})'
 
 
+class Tag(models.Model):
+    name = models.CharField('Название', max_length=32, unique=True)
+    slug = models.SlugField('Слаг', max_length=32, unique=True)
+
+    class Meta:
+        verbose_name = 'Тег'
+        verbose_name_plural = 'Теги'
+        ordering = ['name']
+
+    def __str__(self):
+        return self.name
+
+
+# Конфигурация полнотекстового поиска PostgreSQL и имя FTS5-таблицы
+# для SQLite; обе создаются миграцией 0005_recipe_search.
+SEARCH_CONFIG = 'russian'
+SQLITE_FTS_TABLE = 'recipes_recipe_fts'
+
+
+def _fts5_query(value):
+    """Запрос FTS5: все слова обязательны, каждое ищется как префикс."""
+    return ' '.join(
+        '"{}"*'.format(word.replace('"', '""')) for word in value.split()
+    )
+
+
+def ingredients_prefetch():
+    """Prefetch состава рецепта вместе с продуктами."""
+    return models.Prefetch(
+        'recipe_ingredients',
+        queryset=RecipeIngredient.objects.select_related('ingredient')
+    )
+
+
+class RecipeQuerySet(models.QuerySet):
+
+    def with_related(self):
+        """Подгружает автора, теги и продукты фиксированным числом запросов."""
+        return self.select_related('author').prefetch_related(
+            ingredients_prefetch(), 'tags'
+        )
+
+    def limited_per_author(self, limit):
+        """Не более limit последних рецептов каждого автора одним запросом.
+
+        Django 3.2 не умеет фильтровать по оконным функциям, поэтому
+        ранжированный запрос оборачивается во внешний SELECT.
+        """
+        ranked = self.annotate(row_number=models.Window(
+            expression=RowNumber(),
+            partition_by=models.F('author_id'),
+            order_by=(models.F('pub_date').desc(), models.F('id').desc()),
+        ))
+        sql, params = ranked.query.sql_with_params()
+        return self.model.objects.raw(
+            f'SELECT * FROM ({sql}) ranked WHERE ranked.row_number <= %s '
+            'ORDER BY ranked.author_id, ranked.row_number',
+            (*params, limit)
+        )
+
+    def search(self, value):
+        """Рецепты, подходящие под запрос, от наиболее релевантных.
+
+        На PostgreSQL используется индексированный tsvector, на SQLite —
+        FTS5; на остальных базах выполняется простой поиск подстроки.
+        """
+        vendor = connections[self.db].vendor
+        if vendor == 'postgresql':
+            query = SearchQuery(
+                value, config=SEARCH_CONFIG, search_type='websearch'
+            )
+            matches = self.filter(search_vector=query).annotate(
+                rank=SearchRank(models.F('search_vector'), query)
+            )
+        elif vendor == 'sqlite':
+            query = _fts5_query(value)
+            if not query:
+                return self.none()
+            # Соединение с FTS5-таблицей вместо коррелированного подзапроса:
+            # иначе MATCH выполнялся бы заново для каждой найденной строки.
+            # bm25 тем меньше, чем релевантнее строка; название весит
+            # больше описания.
+            matches = self.extra(
+                tables=[SQLITE_FTS_TABLE],
+                where=[
+                    f'{SQLITE_FTS_TABLE}.rowid = {Recipe._meta.db_table}.id',
+                    f'{SQLITE_FTS_TABLE} MATCH %s',
+                ],
+                params=[query],
+                select={'rank': f'-bm25({SQLITE_FTS_TABLE}, 10.0, 1.0)'},
+            )
+        else:
+            matches = self.filter(
+                models.Q(name__icontains=value)
+                | models.Q(text__icontains=value)
+            ).annotate(rank=models.Value(0.0))
+        return matches.order_by('-rank', '-pub_date', '-id')
+
+    def with_user_flags(self, user):
+        """Аннотирует рецепты флагами is_favorited и is_in_shopping_cart.
+
+        Для анонимного пользователя подзапросы не строятся.
+        """
+        if user.is_anonymous:
+            return self
+        return self.annotate(
+            is_favorited=models.Exists(Favorite.objects.filter(
+                user=user, recipe=models.OuterRef('pk')
+            )),
+            is_in_shopping_cart=models.Exists(ShoppingList.objects.filter(
+                user=user, recipe=models.OuterRef('pk')
+            )),
+        )
+
+
+class RecipeManager(models.Manager.from_queryset(RecipeQuerySet)):
+
+    def get_queryset(self):
+        # Вектор нужен только в SQL. Пока поле отложено, save() его
+        # не перезаписывает и не затирает значение, вычисленное триггером.
+        return super().get_queryset().defer('search_vector')
+
+
 class Recipe(models.Model):
     author = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -31,6 +158,9 @@ class Recipe(models.Model):
     )
     name = models.CharField('Название', max_length=256)
     image = models.ImageField('Картинка', upload_to='recipes/')
+    image_variants = models.JSONField(
+        'Варианты картинки', default=dict, blank=True, editable=False
+    )
     text = models.TextField('Описание')
     ingredients = models.ManyToManyField(
         Ingredient,
@@ -38,16 +168,48 @@ class Recipe(models.Model):
         verbose_name='Ингредиенты',
         related_name='recipes'
     )
+    tags = models.ManyToManyField(
+        Tag,
+        verbose_name='Теги',
+        related_name='recipes',
+        blank=True
+    )
     cooking_time = models.PositiveSmallIntegerField(
         'Время приготовления (в минутах)',
         validators=[MinValueValidator(1)]
     )
     pub_date = models.DateTimeField('Дата публикации', auto_now_add=True)
+    # Меняется при каждом сохранении; основа ETag и Last-Modified.
+    updated_at = models.DateTimeField('Дата изменения', auto_now=True)
+    favorites_count = models.PositiveIntegerField(
+        'В избранном', default=0, editable=False
+    )
+    shopping_carts_count = models.PositiveIntegerField(
+        'В списках покупок', default=0, editable=False
+    )
+    # Пополняется пачками из буфера переходов, см. short_links.
+    link_clicks = models.PositiveIntegerField(
+        'Переходы по короткой ссылке', default=0, editable=False
+    )
+    # Заполняется триггером PostgreSQL из name и text.
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = RecipeManager()
 
     class Meta:
         verbose_name = 'Блюдо'
         verbose_name_plural = 'Блюда'
-        ordering = ['-pub_date']
+        ordering = ['-pub_date', '-id']
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='recipe_pub_date_id_idx'
+            ),
+            models.Index(
+                fields=['-favorites_count', '-pub_date'],
+                name='recipe_popularity_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -122,3 +284,73 @@ class ShoppingList(UserRecipeRelationBase):
     class Meta(UserRecipeRelationBase.Meta):
         verbose_name = 'Список покупок'
         verbose_name_plural = 'Списки покупок'
+
+
+class CartItem(models.Model):
+    """Суммарное количество продукта в списке покупок пользователя.
+
+    Поддерживается модулем recipes.cart в той же транзакции, что и
+    изменения корзины и состава рецептов.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='cart_items',
+        verbose_name='Пользователь'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='cart_items',
+        verbose_name='Продукт'
+    )
+    total_amount = models.PositiveIntegerField('Количество')
+
+    class Meta:
+        verbose_name = 'Продукт в списке покупок'
+        verbose_name_plural = 'Продукты в списках покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_cart_item'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.user} — {self.ingredient}: {self.total_amount}'
+
+
+class TimelineEntry(models.Model):
+    """Рецепт в ленте подписок пользователя, разосланный при публикации."""
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Подписчик'
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Блюдо'
+    )
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        verbose_name = 'Запись ленты подписок'
+        verbose_name_plural = 'Записи ленты подписок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_timeline_entry'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-recipe'],
+                name='timeline_user_pub_date_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.user} — {self.recipe}'
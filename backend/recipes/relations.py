@@ -0,0 +1,47 @@
+"""Массовое добавление и удаление рецептов в избранном и корзине.
+
+Каждая операция — один запрос с RETURNING (PostgreSQL, SQLite 3.35+),
+который возвращает id рецептов, действительно вставленных или удалённых
+этим запросом. Сигналы строк не отправляются: вызывающий код обновляет
+счётчики и итоги корзины по возвращённым id, и параллельный запрос с теми
+же рецептами не учтёт их повторно.
+"""
+from django.db import connection
+
+
+def _table(model):
+    return connection.ops.quote_name(model._meta.db_table)
+
+
+def _execute(sql, params):
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return {row[0] for row in cursor.fetchall()}
+
+
+def link(model, user_id, recipe_ids):
+    """Добавляет рецепты пользователю, возвращает id вставленных."""
+    recipe_ids = sorted(recipe_ids)
+    if not recipe_ids:
+        return set()
+    values = ', '.join(['(%s, %s)'] * len(recipe_ids))
+    return _execute(
+        f'INSERT INTO {_table(model)} (user_id, recipe_id) '
+        f'VALUES {values} '
+        'ON CONFLICT (user_id, recipe_id) DO NOTHING RETURNING recipe_id',
+        [param for pk in recipe_ids for param in (user_id, pk)]
+    )
+
+
+def unlink(model, user_id, recipe_ids):
+    """Удаляет рецепты у пользователя, возвращает id удалённых."""
+    recipe_ids = sorted(recipe_ids)
+    if not recipe_ids:
+        return set()
+    placeholders = ', '.join(['%s'] * len(recipe_ids))
+    return _execute(
+        f'DELETE FROM {_table(model)} '
+        f'WHERE user_id = %s AND recipe_id IN ({placeholders}) '
+        'RETURNING recipe_id',
+        [user_id, *recipe_ids]
+    )
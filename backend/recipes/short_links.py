@@ -0,0 +1,188 @@
+"""Короткие ссылки на рецепты.
+
+Код ссылки — id рецепта в base62, поэтому таблица соответствий не нужна,
+а проверка ссылки сводится к запросу существования по первичному ключу.
+Проверенные id хранятся в LRU-кеше процесса: переходы по горячим ссылкам
+не обращаются к базе. Удаление рецепта сбрасывает его запись сигналом,
+удаления в других процессах подхватываются по истечении
+SHORT_LINK_CACHE_TTL секунд.
+
+Переходы копятся в памяти процесса и записываются в Recipe.link_clicks
+пачками: раз в SHORT_LINK_FLUSH_INTERVAL секунд или по накоплении
+SHORT_LINK_FLUSH_SIZE рецептов, в фоновом потоке.
+"""
+import atexit
+import logging
+import string
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Case, F, IntegerField, Value, When
+from foodgram.background import BackgroundExecutor
+
+from .models import Recipe
+
+logger = logging.getLogger(__name__)
+
+ALPHABET = string.digits + string.ascii_letters
+BASE = len(ALPHABET)
+# Первичный ключ — bigint: 11 знаков base62 хватает на любой id.
+MAX_CODE_LENGTH = 11
+MAX_PK = 2 ** 63 - 1
+FLUSH_BATCH_SIZE = 500
+
+executor = BackgroundExecutor('short-link-clicks')
+
+
+def encode(pk):
+    """Код короткой ссылки на рецепт pk."""
+    code = ''
+    while True:
+        pk, digit = divmod(pk, BASE)
+        code = ALPHABET[digit] + code
+        if not pk:
+            return code
+
+
+def decode(code):
+    """id рецепта по коду или None, если код не может быть выдан."""
+    if not code or len(code) > MAX_CODE_LENGTH or code[0] == '0':
+        return None
+    pk = 0
+    for char in code:
+        digit = ALPHABET.find(char)
+        if digit < 0:
+            return None
+        pk = pk * BASE + digit
+    return pk if pk <= MAX_PK else None
+
+
+class LinkCache:
+    """LRU-кеш id существующих рецептов с ограниченным временем жизни."""
+
+    def __init__(self, size=None, ttl=None):
+        self.size = size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._checked_at = OrderedDict()
+
+    def _ttl(self):
+        return settings.SHORT_LINK_CACHE_TTL if self.ttl is None else self.ttl
+
+    def _size(self):
+        return (
+            settings.SHORT_LINK_CACHE_SIZE if self.size is None else self.size
+        )
+
+    def get(self, pk):
+        """True, если рецепт недавно проверен и есть в кеше."""
+        with self._lock:
+            checked_at = self._checked_at.get(pk)
+            if checked_at is None:
+                return False
+            if time.monotonic() - checked_at > self._ttl():
+                del self._checked_at[pk]
+                return False
+            self._checked_at.move_to_end(pk)
+            return True
+
+    def add(self, pk):
+        with self._lock:
+            self._checked_at[pk] = time.monotonic()
+            self._checked_at.move_to_end(pk)
+            while len(self._checked_at) > self._size():
+                self._checked_at.popitem(last=False)
+
+    def discard(self, pk):
+        with self._lock:
+            self._checked_at.pop(pk, None)
+
+    def clear(self):
+        with self._lock:
+            self._checked_at.clear()
+
+
+link_cache = LinkCache()
+
+
+def recipe_exists(pk):
+    """Есть ли рецепт pk; горячие id проверяются без запроса к базе."""
+    if link_cache.get(pk):
+        return True
+    if not Recipe.objects.filter(pk=pk).exists():
+        return False
+    link_cache.add(pk)
+    return True
+
+
+def resolve(code):
+    """id рецепта по коду короткой ссылки или None."""
+    pk = decode(code)
+    if pk is None or not recipe_exists(pk):
+        return None
+    return pk
+
+
+def _write_clicks(clicks):
+    items = sorted(clicks.items())
+    for start in range(0, len(items), FLUSH_BATCH_SIZE):
+        batch = items[start:start + FLUSH_BATCH_SIZE]
+        # update() не трогает updated_at: счётчик не входит в ETag.
+        Recipe.objects.filter(pk__in=[pk for pk, _ in batch]).update(
+            link_clicks=F('link_clicks') + Case(
+                *(When(pk=pk, then=Value(count)) for pk, count in batch),
+                output_field=IntegerField()
+            )
+        )
+
+
+class ClickBuffer:
+    """Переходы по ссылкам, ещё не записанные в базу."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clicks = Counter()
+        self._flushed_at = time.monotonic()
+        self._scheduled = False
+
+    def add(self, pk):
+        with self._lock:
+            self._clicks[pk] += 1
+            due = not self._scheduled and (
+                len(self._clicks) >= settings.SHORT_LINK_FLUSH_SIZE
+                or time.monotonic() - self._flushed_at
+                >= settings.SHORT_LINK_FLUSH_INTERVAL
+            )
+            if due:
+                self._scheduled = True
+        if due:
+            executor.submit(self._flush_in_background)
+
+    def _flush_in_background(self):
+        try:
+            self.flush()
+        finally:
+            self._scheduled = False
+            close_old_connections()
+
+    def flush(self):
+        """Записывает накопленные переходы; при ошибке они остаются."""
+        with self._lock:
+            clicks, self._clicks = self._clicks, Counter()
+            self._flushed_at = time.monotonic()
+        if not clicks:
+            return
+        try:
+            _write_clicks(clicks)
+        except Exception:
+            logger.exception('Не удалось записать переходы по ссылкам')
+            with self._lock:
+                self._clicks.update(clicks)
+
+
+click_buffer = ClickBuffer()
+# Остаток буфера записывается при штатной остановке воркера.
+atexit.register(click_buffer.flush)
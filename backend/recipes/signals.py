@@ -0,0 +1,118 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import (
+    post_delete, post_save, pre_delete, pre_save
+)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from accounts.models import Follow
+from . import cart
+from .counters import increment
+from .images import discard_image_variants
+from .ingredient_index import ingredient_index
+from .models import Favorite, Ingredient, Recipe, ShoppingList, Tag
+from .short_links import link_cache
+from .tags import invalidate_slug_map
+from .timeline import remove_author, schedule_add_author, schedule_fan_out
+
+User = get_user_model()
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_ingredient_index(**kwargs):
+    # До коммита параллельный запрос перестроил бы индекс по старым данным.
+    transaction.on_commit(ingredient_index.invalidate)
+
+
+@receiver(post_delete, sender=Recipe)
+def forget_short_link(instance, **kwargs):
+    link_cache.discard(instance.pk)
+
+
+@receiver(post_delete, sender=Recipe)
+def delete_image_variants(instance, **kwargs):
+    discard_image_variants(instance.image_variants)
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def invalidate_tag_slug_map(**kwargs):
+    invalidate_slug_map()
+
+
+def _delta(signal, created=False):
+    if signal is post_delete:
+        return -1
+    return 1 if created else 0
+
+
+@receiver(pre_save, sender=User)
+def touch_renamed_author_recipes(instance, update_fields=None, **kwargs):
+    # Имя автора входит в представление рецепта, поэтому его смена
+    # должна сдвинуть updated_at, от которого считаются ETag.
+    if instance.pk is None:
+        return
+    if update_fields is not None and 'username' not in update_fields:
+        return
+    renamed = User.objects.filter(pk=instance.pk).exclude(
+        username=instance.username
+    ).exists()
+    if renamed:
+        Recipe.objects.filter(author_id=instance.pk).update(
+            updated_at=timezone.now()
+        )
+
+
+@receiver((post_save, post_delete), sender=Favorite)
+def update_favorites_count(signal, instance, created=False, **kwargs):
+    delta = _delta(signal, created)
+    if delta:
+        increment(Recipe, instance.recipe_id, 'favorites_count', delta)
+
+
+@receiver((post_save, post_delete), sender=ShoppingList)
+def update_shopping_carts_count(signal, instance, created=False, **kwargs):
+    delta = _delta(signal, created)
+    if delta:
+        increment(Recipe, instance.recipe_id, 'shopping_carts_count', delta)
+
+
+@receiver(post_save, sender=ShoppingList)
+def add_to_cart_totals(instance, created, **kwargs):
+    if created:
+        cart.add_recipes(instance.user_id, [instance.recipe_id])
+
+
+@receiver(pre_delete, sender=ShoppingList)
+def remove_from_cart_totals(instance, **kwargs):
+    # pre_delete: при каскадном удалении рецепта состав ещё не удалён.
+    cart.remove_recipes(instance.user_id, [instance.recipe_id])
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def update_recipes_count(signal, instance, created=False, **kwargs):
+    delta = _delta(signal, created)
+    if delta:
+        increment(User, instance.author_id, 'recipes_count', delta)
+
+
+@receiver((post_save, post_delete), sender=Follow)
+def update_follow_counts(signal, instance, created=False, **kwargs):
+    delta = _delta(signal, created)
+    if delta:
+        increment(User, instance.author_id, 'followers_count', delta)
+        increment(User, instance.user_id, 'following_count', delta)
+
+
+@receiver(post_save, sender=Recipe)
+def fan_out_recipe(instance, created, **kwargs):
+    if created:
+        schedule_fan_out(instance)
+
+
+@receiver((post_save, post_delete), sender=Follow)
+def update_timeline(signal, instance, created=False, **kwargs):
+    if signal is post_delete:
+        remove_author(instance.user_id, instance.author_id)
+    elif created:
+        schedule_add_author(instance)
@@ -0,0 +1,23 @@
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Tag
+
+SLUG_MAP_KEY = 'tags:slug_map'
+
+
+def get_slug_map():
+    """Словарь {slug: id} всех тегов из общего кеша.
+
+    Тегов немного и меняются они редко, поэтому словарь хранится без
+    срока жизни и сбрасывается сигналами при изменении тегов.
+    """
+    slug_map = cache.get(SLUG_MAP_KEY)
+    if slug_map is None:
+        slug_map = dict(Tag.objects.values_list('slug', 'id'))
+        cache.set(SLUG_MAP_KEY, slug_map, None)
+    return slug_map
+
+
+def invalidate_slug_map():
+    transaction.on_commit(lambda: cache.delete(SLUG_MAP_KEY))
@@ -0,0 +1,385 @@
+import io
+import json
+import shutil
+import tempfile
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from PIL import Image
+
+from api.serializers import RecipeWriteSerializer
+
+from . import cart, images, short_links
+from .importers import IngredientImporter, iter_json_array, read_csv
+from .ingredient_index import ingredient_index
+from .models import Ingredient, Recipe, RecipeIngredient, ShoppingList, Tag
+
+User = get_user_model()
+
+
+class IngredientIndexInvalidationTests(TestCase):
+    """Индекс продуктов сбрасывается только после коммита изменений."""
+
+    def setUp(self):
+        ingredient_index.invalidate()
+        ingredient_index.search('')
+
+    def test_signal_invalidates_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Ingredient.objects.create(name='Мука', measurement_unit='г')
+            self.assertTrue(ingredient_index.is_fresh())
+        self.assertFalse(ingredient_index.is_fresh())
+        self.assertEqual(
+            [item['name'] for item in ingredient_index.search('му')],
+            ['Мука']
+        )
+
+    def test_import_invalidates_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            importer = IngredientImporter().run([('Сахар', 'г')])
+            self.assertTrue(ingredient_index.is_fresh())
+        self.assertEqual(importer.inserted, 1)
+        self.assertEqual(
+            [item['name'] for item in ingredient_index.search('сах')],
+            ['Сахар']
+        )
+
+
+class IterJsonArrayTests(SimpleTestCase):
+    """Разбор массива не зависит от того, где порция обрывает значение."""
+
+    def parse(self, text, chunk_size):
+        return list(iter_json_array(io.StringIO(text), chunk_size))
+
+    def test_values_split_across_chunks(self):
+        for text in (
+            '[1.5]',
+            '[1e-3, 2E+2 ,-0.25, 10]',
+            ' [ {"name": "Мука", "units": [1, 2]}, "x,]", true, null ] ',
+            '[]',
+        ):
+            for chunk_size in range(1, len(text) + 1):
+                with self.subTest(text=text, chunk_size=chunk_size):
+                    self.assertEqual(
+                        self.parse(text, chunk_size), json.loads(text)
+                    )
+
+    def test_invalid_arrays(self):
+        for text in ('[1,]', '[1 2]', '[1', '[1.]', '[,1]', '{}', ''):
+            for chunk_size in (1, 3, 64):
+                with self.subTest(text=text, chunk_size=chunk_size):
+                    with self.assertRaises(ValueError):
+                        self.parse(text, chunk_size)
+
+
+class IngredientImporterTests(TestCase):
+    """Подсчёт вставленных, обновлённых и пропущенных строк."""
+
+    def test_counts(self):
+        Ingredient.objects.create(name='Мука', measurement_unit='г')
+        Ingredient.objects.create(name='Соль', measurement_unit='г')
+        rows = read_csv(io.StringIO(
+            'name,measurement_unit\n'
+            'Мука,г\n'
+            'Соль,кг\n'
+            'Сахар,г\n'
+            ',г\n'
+            'только название\n'
+            'Перец,щепотка\n'
+        ))
+        importer = IngredientImporter(batch_size=2).run(rows)
+        self.assertEqual(importer.total, 6)
+        self.assertEqual(importer.inserted, 2)
+        self.assertEqual(importer.updated, 1)
+        self.assertEqual(importer.skipped, 3)
+        self.assertEqual(
+            dict(Ingredient.objects.values_list('name', 'measurement_unit')),
+            {'Мука': 'г', 'Соль': 'кг', 'Сахар': 'г', 'Перец': 'щепотка'}
+        )
+
+
+class ImageVariantsTests(TestCase):
+    """Варианты изображения: нарезка, замена и ссылки на оригинал."""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp(prefix='foodgram-media-')
+        self.addCleanup(shutil.rmtree, media_root)
+        override = override_settings(MEDIA_ROOT=media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+        author = User.objects.create_user(
+            username='author', email='author@example.com',
+            password='password'
+        )
+        self.recipe = Recipe.objects.create(
+            author=author, name='Рецепт', text='Описание', cooking_time=10,
+            image=self.save_image('recipes/original.png', (2000, 1000))
+        )
+
+    def save_image(self, name, size):
+        buffer = io.BytesIO()
+        Image.new('RGB', size, 'red').save(buffer, 'PNG')
+        return default_storage.save(name, ContentFile(buffer.getvalue()))
+
+    def build(self, image_name=None):
+        images.build_image_variants(
+            self.recipe.pk, image_name or self.recipe.image.name
+        )
+        self.recipe.refresh_from_db()
+        return self.recipe.image_variants
+
+    def urls(self):
+        response = self.client.get(
+            reverse('api:recipe-detail', args=[self.recipe.pk])
+        )
+        return {
+            name: url.rpartition('/media/')[2]
+            for name, url in response.data['image_variants'].items()
+        }
+
+    def test_variants_are_built_within_bounds(self):
+        variants = self.build()
+        self.assertEqual(set(variants), set(images.IMAGE_VARIANTS))
+        for name, path in variants.items():
+            with default_storage.open(path) as f, Image.open(f) as image:
+                self.assertEqual(
+                    max(image.size), images.IMAGE_VARIANTS[name]
+                )
+        self.assertEqual(self.urls(), variants)
+
+    def test_original_is_served_until_variants_are_ready(self):
+        self.assertEqual(
+            self.urls(),
+            dict.fromkeys(images.IMAGE_VARIANTS, self.recipe.image.name)
+        )
+
+    def test_replacing_image_deletes_old_variants(self):
+        old_variants = self.build()
+        new_image = io.BytesIO()
+        Image.new('RGB', (100, 100), 'blue').save(new_image, 'PNG')
+        with mock.patch.object(images.executor, 'submit') as submit:
+            with self.captureOnCommitCallbacks(execute=True):
+                RecipeWriteSerializer().update(self.recipe, {
+                    'image': ContentFile(new_image.getvalue(), 'new.png')
+                })
+        submit.assert_called_once()
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_variants, {})
+        for path in old_variants.values():
+            self.assertFalse(default_storage.exists(path))
+
+    def test_variants_of_replaced_image_are_dropped(self):
+        old_name = self.recipe.image.name
+        Recipe.objects.filter(pk=self.recipe.pk).update(
+            image=self.save_image('recipes/new.png', (100, 100))
+        )
+        self.assertEqual(self.build(old_name), {})
+        self.assertEqual(default_storage.listdir('recipes/variants')[1], [])
+
+    def test_deleting_recipe_deletes_variants(self):
+        variants = self.build()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipe.delete()
+        for path in variants.values():
+            self.assertFalse(default_storage.exists(path))
+
+
+class RecipeAdminCompositionTests(TestCase):
+    """Правка состава в админке переносится в итоги корзин."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='password'
+        )
+        cls.buyer = User.objects.create_user(
+            username='buyer', email='buyer@example.com', password='password'
+        )
+        cls.tag = Tag.objects.create(name='Завтрак', slug='breakfast')
+        cls.flour, cls.sugar = (
+            Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in ('Мука', 'Сахар')
+        )
+        cls.recipe = Recipe.objects.create(
+            author=cls.admin, name='Блины', text='Описание',
+            cooking_time=10, image='recipes/image.png'
+        )
+        cls.recipe.tags.set([cls.tag])
+        cls.row = RecipeIngredient.objects.create(
+            recipe=cls.recipe, ingredient=cls.flour, amount=100
+        )
+        ShoppingList.objects.create(user=cls.buyer, recipe=cls.recipe)
+
+    def test_inline_changes_update_cart_totals(self):
+        self.client.force_login(self.admin)
+        prefix = 'recipe_ingredients'
+        response = self.client.post(
+            reverse('admin:recipes_recipe_change', args=[self.recipe.pk]),
+            {
+                'author': self.admin.pk,
+                'name': self.recipe.name,
+                'text': self.recipe.text,
+                'cooking_time': 10,
+                'tags': [self.tag.pk],
+                'image_variants': '{}',
+                f'{prefix}-TOTAL_FORMS': 2,
+                f'{prefix}-INITIAL_FORMS': 1,
+                f'{prefix}-0-id': self.row.pk,
+                f'{prefix}-0-recipe': self.recipe.pk,
+                f'{prefix}-0-ingredient': self.flour.pk,
+                f'{prefix}-0-amount': 150,
+                f'{prefix}-1-recipe': self.recipe.pk,
+                f'{prefix}-1-ingredient': self.sugar.pk,
+                f'{prefix}-1-amount': 20,
+            }
+        )
+        self.assertEqual(response.status_code, 302, getattr(
+            response, 'context_data', {}
+        ).get('errors'))
+        self.assertEqual(
+            cart.recipe_amounts([self.recipe.pk]),
+            {self.flour.pk: 150, self.sugar.pk: 20}
+        )
+        self.assertEqual(cart.find_drift(), [])
+
+
+class AdminChangelistQueriesTests(TestCase):
+    """Число запросов списков админки не зависит от числа строк."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='password'
+        )
+        cls.ingredient = Ingredient.objects.create(
+            name='Мука', measurement_unit='г'
+        )
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def add_rows(self, count):
+        start = User.objects.count()
+        for number in range(start, start + count):
+            author = User.objects.create_user(
+                username=f'author{number}',
+                email=f'author{number}@example.com', password='password'
+            )
+            recipe = Recipe.objects.create(
+                author=author, name=f'Рецепт {number}', text='Описание',
+                cooking_time=10, image='recipes/image.png'
+            )
+            RecipeIngredient.objects.create(
+                recipe=recipe, ingredient=self.ingredient, amount=number
+            )
+            ShoppingList.objects.create(user=self.admin, recipe=recipe)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_changelists(self):
+        for model in ('recipe', 'ingredient', 'shoppinglist'):
+            self.add_rows(1)
+            url = reverse(f'admin:recipes_{model}_changelist')
+            with self.subTest(model=model):
+                few = self.count_queries(url)
+                self.add_rows(5)
+                self.assertEqual(self.count_queries(url), few)
+        url = reverse('admin:accounts_user_changelist')
+        few = self.count_queries(url)
+        self.add_rows(5)
+        self.assertEqual(self.count_queries(url), few)
+
+
+# Фоновая запись переходов шла бы в другом потоке, вне транзакции теста.
+@override_settings(SHORT_LINK_FLUSH_INTERVAL=3600, SHORT_LINK_FLUSH_SIZE=1000)
+class ShortLinkTests(TestCase):
+    """Короткие ссылки: коды, кеш проверенных id и учёт переходов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(
+            username='author', email='author@example.com', password='password'
+        )
+        cls.recipe = Recipe.objects.create(
+            author=author, name='Блины', text='Описание', cooking_time=10,
+            image='recipes/image.png'
+        )
+
+    def setUp(self):
+        short_links.link_cache.clear()
+        self.addCleanup(short_links.click_buffer.flush)
+
+    def test_codes(self):
+        for pk in (1, 61, 62, 12345, short_links.MAX_PK):
+            with self.subTest(pk=pk):
+                self.assertEqual(
+                    short_links.decode(short_links.encode(pk)), pk
+                )
+        for code in ('', '0a', 'a-b', 'z' * 12, 'zzzzzzzzzzz'):
+            with self.subTest(code=code):
+                self.assertIsNone(short_links.decode(code))
+
+    def test_get_link(self):
+        response = self.client.get(
+            reverse('api:recipe-get-link', args=[self.recipe.pk])
+        )
+        self.assertEqual(response.status_code, 200)
+        code = short_links.encode(self.recipe.pk)
+        self.assertTrue(response.json()['short-link'].endswith(f'/s/{code}/'))
+        response = self.client.get(
+            reverse('api:recipe-get-link', args=[self.recipe.pk + 1])
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_hot_link_redirects_without_queries(self):
+        url = reverse(
+            'recipes:short_link', args=[short_links.encode(self.recipe.pk)]
+        )
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+        self.assertRedirects(
+            response, f'/recipes/{self.recipe.pk}/',
+            fetch_redirect_response=False
+        )
+        with self.assertNumQueries(0):
+            self.client.get(url)
+
+    def test_deleted_recipe_leaves_cache(self):
+        code = short_links.encode(self.recipe.pk)
+        self.assertEqual(short_links.resolve(code), self.recipe.pk)
+        self.recipe.delete()
+        self.assertIsNone(short_links.resolve(code))
+
+    @override_settings(SHORT_LINK_CACHE_SIZE=1)
+    def test_cache_evicts_least_recently_used(self):
+        cache = short_links.link_cache
+        cache.add(1)
+        cache.add(2)
+        self.assertFalse(cache.get(1))
+        self.assertTrue(cache.get(2))
+
+    def test_clicks_are_flushed_in_batches(self):
+        url = reverse(
+            'recipes:short_link', args=[short_links.encode(self.recipe.pk)]
+        )
+        for _ in range(3):
+            self.client.get(url)
+        self.client.get(
+            reverse('recipes:short_recipe_redirect', args=[self.recipe.pk])
+        )
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.link_clicks, 0)
+        with self.assertNumQueries(1):
+            short_links.click_buffer.flush()
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.link_clicks, 4)
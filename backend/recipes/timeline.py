@@ -0,0 +1,203 @@
+"""Лента рецептов от авторов, на которых подписан пользователь.
+
+При публикации рецепт в фоне рассылается подписчикам автора
+(fan-out on write) в таблицу TimelineEntry, и лента каждого подписчика
+обрезается до TIMELINE_MAX_LENGTH записей. Рецепты авторов, у которых
+больше TIMELINE_FANOUT_LIMIT подписчиков, не рассылаются, а подмешиваются
+при чтении ленты, чтобы одна публикация не порождала неограниченную
+запись.
+"""
+import logging
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import close_old_connections, connection, models, transaction
+from django.db.models.functions import RowNumber
+
+from accounts.models import Follow
+from foodgram.background import BackgroundExecutor
+from .models import Recipe, TimelineEntry
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+FANOUT_BATCH_SIZE = 1000
+
+# Один поток: рассылки и обрезка лент не конкурируют друг с другом.
+executor = BackgroundExecutor('recipe-timeline')
+
+
+def _run_in_background(func, *args):
+    def run():
+        try:
+            func(*args)
+        except Exception:
+            logger.exception('Ошибка обновления ленты подписок')
+        finally:
+            close_old_connections()
+    transaction.on_commit(lambda: executor.submit(run))
+
+
+def is_fanout_author(author):
+    return author.followers_count <= settings.TIMELINE_FANOUT_LIMIT
+
+
+def trim(user_ids):
+    """Обрезает слишком длинные ленты пользователей user_ids.
+
+    Ленте позволено вырасти на десятую часть сверх предела, чтобы
+    обрезка не запускалась после каждой публикации.
+    """
+    limit = settings.TIMELINE_MAX_LENGTH
+    overflowing = list(
+        TimelineEntry.objects
+        .filter(user_id__in=user_ids)
+        .values('user_id')
+        .annotate(total=models.Count('id'))
+        .filter(total__gt=limit + limit // 10)
+        .values_list('user_id', flat=True)
+    )
+    if not overflowing:
+        return
+    ranked = TimelineEntry.objects.filter(
+        user_id__in=overflowing
+    ).annotate(row_number=models.Window(
+        expression=RowNumber(),
+        partition_by=models.F('user_id'),
+        order_by=(models.F('pub_date').desc(), models.F('recipe_id').desc()),
+    )).values('id', 'row_number')
+    sql, params = ranked.query.sql_with_params()
+    table = connection.ops.quote_name(TimelineEntry._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {table} WHERE id IN ('
+            f'SELECT ranked.id FROM ({sql}) ranked '
+            'WHERE ranked.row_number > %s)',
+            (*params, limit)
+        )
+
+
+def fan_out(recipe_id):
+    recipe = Recipe.objects.select_related('author').filter(
+        pk=recipe_id
+    ).first()
+    if recipe is None or not is_fanout_author(recipe.author):
+        return
+    followers = Follow.objects.filter(
+        author_id=recipe.author_id
+    ).values_list('user_id', flat=True).order_by('user_id')
+    last_id = 0
+    while True:
+        batch = list(followers.filter(user_id__gt=last_id)[:FANOUT_BATCH_SIZE])
+        if not batch:
+            return
+        TimelineEntry.objects.bulk_create(
+            (
+                TimelineEntry(
+                    user_id=user_id, recipe_id=recipe.id,
+                    pub_date=recipe.pub_date
+                )
+                for user_id in batch
+            ),
+            ignore_conflicts=True
+        )
+        trim(batch)
+        last_id = batch[-1]
+
+
+def backfill(user_id, author_ids):
+    """Добавляет в ленту пользователя последние рецепты авторов."""
+    recipes = (
+        Recipe.objects
+        .filter(author_id__in=author_ids)
+        .order_by('-pub_date', '-id')
+        .values_list('id', 'pub_date')[:settings.TIMELINE_MAX_LENGTH]
+    )
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(user_id=user_id, recipe_id=pk, pub_date=pub_date)
+            for pk, pub_date in recipes
+        ),
+        ignore_conflicts=True
+    )
+    trim([user_id])
+
+
+def add_author(user_id, author_id):
+    """Добавляет в ленту рецепты нового автора, если подписка ещё есть.
+
+    Строка подписки блокируется на время вставки: отписка, случившаяся
+    раньше, отменяет заполнение, а более поздняя дождётся коммита, и её
+    remove_author удалит уже вставленные записи.
+    """
+    with transaction.atomic():
+        follow = Follow.objects.select_for_update(
+            of=('self',)
+        ).select_related('author').filter(
+            user_id=user_id, author_id=author_id
+        ).first()
+        if follow is not None and is_fanout_author(follow.author):
+            backfill(user_id, [author_id])
+
+
+def schedule_fan_out(recipe):
+    _run_in_background(fan_out, recipe.pk)
+
+
+def schedule_add_author(follow):
+    _run_in_background(add_author, follow.user_id, follow.author_id)
+
+
+def remove_author(user_id, author_id):
+    TimelineEntry.objects.filter(
+        user_id=user_id, recipe__author_id=author_id
+    ).delete()
+
+
+def rebuild():
+    """Заполняет ленты всех пользователей заново. Возвращает их число."""
+    TimelineEntry.objects.all().delete()
+    authors_by_user = {}
+    for user_id, author_id in Follow.objects.filter(
+        author__followers_count__lte=settings.TIMELINE_FANOUT_LIMIT
+    ).values_list('user_id', 'author_id'):
+        authors_by_user.setdefault(user_id, []).append(author_id)
+    for user_id, author_ids in authors_by_user.items():
+        backfill(user_id, author_ids)
+    return len(authors_by_user)
+
+
+def _after(queryset, position, pk_field):
+    """Записи строго после позиции (pub_date, id) в порядке ленты."""
+    if position is None:
+        return queryset
+    pub_date, pk = position
+    return queryset.filter(pub_date__lte=pub_date).filter(
+        models.Q(pub_date__lt=pub_date) | models.Q(**{f'{pk_field}__lt': pk})
+    )
+
+
+def get_feed(user, position=None, limit=None):
+    """id рецептов страницы ленты подписок, новые первыми.
+
+    position — (pub_date, id) последнего показанного рецепта. Разосланные
+    рецепты читаются по индексу ленты пользователя, рецепты авторов без
+    рассылки — по индексу их публикаций; обе выборки ограничены limit и
+    сливаются, так что страница не зависит от длины ленты.
+    """
+    limit = limit or settings.TIMELINE_MAX_LENGTH
+    entries = _after(
+        TimelineEntry.objects.filter(user=user), position, 'recipe_id'
+    ).order_by('-pub_date', '-recipe_id').values_list(
+        'pub_date', 'recipe_id'
+    )[:limit]
+    pulled_authors = User.objects.filter(
+        authors__user=user,
+        followers_count__gt=settings.TIMELINE_FANOUT_LIMIT
+    ).values('id')
+    pulled = _after(
+        Recipe.objects.filter(author__in=pulled_authors), position, 'id'
+    ).order_by('-pub_date', '-id').values_list('pub_date', 'id')[:limit]
+    page = sorted(set(entries) | set(pulled), reverse=True)[:limit]
+    return [pk for _, pk in page]
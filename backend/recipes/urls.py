@@ -2,7 +2,9 @@ from django.urls import path
 from . import views
 
 app_name = 'recipes'
- 
+
 urlpatterns = [
+    path('s/<str:code>/', views.short_link_redirect, name='short_link'),
+    # Ссылки по id, выданные до появления коротких кодов.
     path('r/<int:pk>/', views.short_recipe_redirect, name='short_recipe_redirect'),
-] 
\ No newline at end of file
+]
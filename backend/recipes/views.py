@@ -1,11 +1,23 @@
 from django.http import Http404
 from django.shortcuts import redirect
-from .models import Recipe
+
+from . import short_links
+
+
+def recipe_redirect(pk):
+    """Переход на страницу рецепта с учётом в счётчике переходов."""
+    short_links.click_buffer.add(pk)
+    return redirect(f'/recipes/{pk}/')
+
+
+def short_link_redirect(request, code):
+    pk = short_links.resolve(code)
+    if pk is None:
+        raise Http404(f'Короткая ссылка {code} не найдена.')
+    return recipe_redirect(pk)
+
 
 def short_recipe_redirect(request, pk):
-    try:
-        recipe = Recipe.objects.get(pk=pk)
-    except Recipe.DoesNotExist:
+    if not short_links.recipe_exists(pk):
         raise Http404(f'Рецепт с id {pk} не найден.')
-    
-    return redirect(f'/recipes/{pk}/')
\ No newline at end of file
+    return recipe_redirect(pk)